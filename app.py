@@ -223,6 +223,21 @@ def get_db_cursor(commit=False, use_realdictcursor=False, use_defaultcursor=Fals
             cursor.close()
             pass
 
+@contextmanager
+def get_db_server_cursor(name="server_cursor", itersize=10000):
+    # a named (server-side) cursor brings rows over itersize at a time, rather than the whole result
+    # at once.  they only live inside a transaction, so autocommit is off until it's closed
+    with get_db_connection() as connection:
+        connection.autocommit = False
+        cursor = connection.cursor(name=name)
+        cursor.itersize = itersize
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            connection.rollback()
+            connection.autocommit = True
+
 s3_client = boto3.client("s3")
 print("made s3_client")
 
@@ -243,7 +258,22 @@ suny_consortium_package_ids = ["P2NFgz7B", "PN3juRC5", "2k4Qs74v", "uwdhDaJ2"]
 
 
 
-app.my_memorycache_dict = {}
+# bounded, so long-running workers don't grow until the dyno restarts.  see /admin/cache for its stats
+from memory_cache import MemoryCache
+memorycache_max_mb = int(os.getenv("MEMORYCACHE_MAX_MB", 1024))
+memorycache_ttl_seconds = int(os.getenv("MEMORYCACHE_TTL_SECONDS", 24 * 60 * 60)) or None
+app.my_memorycache_dict = MemoryCache(max_bytes=memorycache_max_mb * 1024 * 1024, ttl=memorycache_ttl_seconds)
+
+# the tier under it, shared by the workers: a sqlite file per dyno by default, or a redis:// url for
+# every dyno, or "none".  see shared_cache.py
+from shared_cache import shared_cache_from_url
+shared_cache_url = os.getenv("SHARED_CACHE_URL", "sqlite:////tmp/unsub_shared_cache.sqlite")
+shared_cache_max_mb = int(os.getenv("SHARED_CACHE_MAX_MB", 2048))
+try:
+    app.shared_cache = shared_cache_from_url(shared_cache_url, ttl=memorycache_ttl_seconds, max_bytes=shared_cache_max_mb * 1024 * 1024)
+except Exception as e:
+    print("no shared cache, just memorycache.  Error message: ", e)
+    app.shared_cache = None
 
 def build_cache_key(module_name, function_name, *args):
     # just ignoring kwargs for now
@@ -255,10 +285,16 @@ def build_cache_key(module_name, function_name, *args):
     return cache_key
 
 
-def memorycache(func):
+def memorycache(func=None, shared=False):
+    # @memorycache, or @memorycache(shared=True) to look in app.shared_cache too.  only for values
+    # that pickle small: not views onto the memory-mapped common data, say
+    if func is None:
+        return lambda func: memorycache(func, shared=shared)
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         cache_key = build_cache_key(func.__module__, func.__name__, *args)
+        group = "{}.{}".format(func.__module__, func.__name__)
 
         # Return cached version if available
         result = app.my_memorycache_dict.get(cache_key, None)
@@ -267,16 +303,24 @@ def memorycache(func):
             # print("cache hit")
             return result
 
+        if shared and app.shared_cache is not None:
+            result = app.shared_cache.get(cache_key, None)
+            if result is not None:
+                app.my_memorycache_dict.set(cache_key, result, group=group)
+                return result
+
         # print("cache miss on", cache_key)
         # print("cache miss")
 
         # Generate output
         # print("> calling {}.{} with {}".format(func.__module__, func.__name__, args))
-        result = func(*args)
+        result = func(*args, **kwargs)
 
         # Cache output if allowed
         if result is not None:
-            app.my_memorycache_dict[cache_key] = result
+            app.my_memorycache_dict.set(cache_key, result, group=group)
+            if shared and app.shared_cache is not None:
+                app.shared_cache.set(cache_key, result)
 
         # reset_cache(func.__module__, func.__name__, *args)
 
@@ -290,8 +334,9 @@ def reset_cache(module_name, function_name, *args):
     cache_key = build_cache_key(module_name, function_name, *args)
     print("cache_key", cache_key)
 
-    if cache_key in app.my_memorycache_dict:
-        del app.my_memorycache_dict[cache_key]
+    app.my_memorycache_dict.pop(cache_key, None)
+    if app.shared_cache is not None:
+        app.shared_cache.delete(cache_key)
 
     delete_command = "delete from jump_cache_status where cache_call = %s"
     insert_command = "insert into jump_cache_status (cache_call, updated) values (%s, sysdate)"
@@ -299,41 +344,109 @@ def reset_cache(module_name, function_name, *args):
         cursor.execute(delete_command, (cache_key,))
         cursor.execute(insert_command, (cache_key,))
 
+# every worker polls jump_cache_status and evicts what reset_cache wrote there, so a reset reaches
+# the other gunicorn workers and dynos too.  see cache_invalidation.py
+from cache_invalidation import InvalidationBus
+invalidation_bus = InvalidationBus(app.my_memorycache_dict, shared_cache=app.shared_cache)
+cache_invalidation_poll_seconds = int(os.getenv("CACHE_INVALIDATION_POLL_SECONDS", 10))
+
+def invalidatable_cache(func):
+    # kids.cache's @cache, keyed like memorycache so reset_cache(module, function, *args) evicts it everywhere.
+    # backed by app.shared_cache when there is one, so the workers share what they've computed
+    from kids.cache import cache
+    from shared_cache import TieredStore
+    store = TieredStore(app.shared_cache) if app.shared_cache is not None else {}
+    invalidation_bus.register(func.__module__, func.__name__, store)
+    return cache(use=store, key=lambda *args, **kwargs: build_cache_key(func.__module__, func.__name__, *args))(func)
+
+def fetch_cache_status_rows(since):
+    command = "select cache_call, updated from jump_cache_status"
+    with get_db_cursor() as cursor:
+        if since is None:
+            cursor.execute(command)
+        else:
+            cursor.execute(command + " where updated > %s", (since,))
+        rows = cursor.fetchall()
+    return [(row["cache_call"], row["updated"]) for row in rows]
+
+def fetch_cache_status_latest():
+    # now, if nothing has been reset yet, so the first reset after that isn't skipped
+    command = "select coalesce(max(updated), sysdate) as updated from jump_cache_status"
+    rows = []
+    with get_db_cursor() as cursor:
+        cursor.execute(command)
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+    return rows[0]["updated"]
+
+def watch_cache_invalidations():
+    from cache_invalidation import watch_cache_status
+    watch_cache_status(invalidation_bus, fetch_cache_status_rows, cache_invalidation_poll_seconds,
+                       fetch_latest=fetch_cache_status_latest)
+
 cached_consortium_scenario_ids = ["tGUVWRiN", "scenario-QC2kbHfUhj9W", "EcUvEELe", "CBy9gUC3", "6it6ajJd", "GcAsm5CX", "aAFAuovt"]
 
-@memorycache
+# where workers keep the common data versions they memory-map.  Each dyno has its own disk,
+# so the first worker to want a version builds it and the rest map the same file
+common_data_store_dir = os.getenv("COMMON_DATA_STORE_DIR", "/tmp")
+# how often to look for a newly published version of the common data
+common_data_poll_seconds = int(os.getenv("COMMON_DATA_POLL_SECONDS", 600))
+# how long a request waits for the first version before giving up, rather than hanging the worker
+common_data_wait_seconds = int(os.getenv("COMMON_DATA_WAIT_SECONDS", 120))
+
 def fetch_common_package_data():
+    # (version, data): the published version if there is one, else the old json, else from the db
+    try:
+        from common_data_versions import read_manifest
+        from common_data_versions import fetch_common_data_version
+        from common_data_versions import prune_common_data_versions
+        manifest = read_manifest(s3_client, "unsub-cache")
+        if manifest:
+            print("mapping common data version {}".format(manifest["version"]))
+            store = fetch_common_data_version(s3_client, "unsub-cache", manifest, common_data_store_dir)
+            prune_common_data_versions(common_data_store_dir, manifest)
+            return (manifest["version"], store.to_common_data_dict())
+    except Exception as e:
+        print("no common data versions, so trying the json.  Error message: ", e)
+        pass
+
     try:
         print("downloading common_package_data_for_all.json.gz")
         s3_clientobj = s3_client.get_object(Bucket="unsub-cache", Key="common_package_data_for_all.json.gz")
         with gzip.open(s3_clientobj["Body"], 'r') as f:
             data_from_s3 = json.loads(f.read().decode('utf-8'))
-        return data_from_s3
+        return ("json", data_from_s3)
     except Exception as e:
         print("no S3 data, so computing.  Error message: ", e)
         pass
 
     from common_data import gather_common_data
-    return gather_common_data()
-
-common_data_dict = None
-
-def warm_common_data(lst):
-    lst.append(fetch_common_package_data())
-
-# NOTE: we have to do this when app loads for now - return to this later 
-## if there's a different take on dealing with common data
-# if os.getenv('PRELOAD_LARGE_TABLES', False) == 'True':
-if not common_data_dict:
-    import threading
-    import time
-    an_lst = []
-    t = threading.Thread(target=warm_common_data, args=[an_lst])
-    t.daemon = True
-    t.start()
-    while t.is_alive():
-        time.sleep(0.1)
-    common_data_dict = an_lst[0]
-    print("warm_common_data done!")
-else:
-    print("not warming common data cache")
+    return ("gathered", gather_common_data())
+
+from common_data_versions import CommonDataHolder
+common_data = CommonDataHolder()
+
+def get_common_data():
+    """(version, common data dict) in use right now.  Waits if it's still loading, up to COMMON_DATA_WAIT_SECONDS."""
+    return common_data.get(timeout=common_data_wait_seconds)
+
+def warm_common_data():
+    # keeps trying (S3 or the db may be down), and goes on to watch for new versions either way
+    from common_data_versions import load_common_data
+    if load_common_data(common_data, fetch_common_package_data):
+        print("warm_common_data done!", common_data.version)
+
+    from common_data_versions import watch_common_data
+    watch_common_data(common_data, s3_client, "unsub-cache", common_data_store_dir, common_data_poll_seconds)
+
+# loads in the background, so importing app doesn't wait for it: the first request that needs it does.
+# then the same thread swaps in new versions as they're published
+import threading
+warm_common_data_thread = threading.Thread(target=warm_common_data)
+warm_common_data_thread.daemon = True
+warm_common_data_thread.start()
+
+cache_invalidation_thread = threading.Thread(target=watch_cache_invalidations)
+cache_invalidation_thread.daemon = True
+cache_invalidation_thread.start()
@@ -0,0 +1,326 @@
+# coding: utf-8
+
+# Batched least squares fits for the scenario model.
+#
+# scipy.optimize.curve_fit fits one curve per call and isn't safe to share across threads,
+# which meant one fit per journal under a process-wide lock.  This fits every row of a
+# stacked array at once with the same Levenberg-Marquardt method curve_fit uses (MINPACK
+# lmdif: trust region, column scaling, same tolerances and evaluation budget), from the
+# same starting point.  Each row succeeds or fails the same way curve_fit would, and
+# normally lands on the same fit.  The steps come from numpy's QR rather than MINPACK's
+# pivoted one, though, so rounding differs, and on a flat or multi-modal surface a row
+# now and then (about one in a thousand) settles in a different local minimum.
+
+import numpy as np
+import scipy.special
+
+machine_epsilon = np.finfo(float).eps
+dwarf = np.finfo(float).tiny
+default_tolerance = 1.49012e-08
+
+
+def batch_solve(a, b):
+    # solve each a[i] x = b[i], falling back to least squares for the singular ones
+    try:
+        return np.linalg.solve(a, b[..., np.newaxis])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.stack([np.linalg.lstsq(a[i], b[i], rcond=None)[0] for i in range(len(a))])
+
+
+def damped_step(jacobian, fvec, diag, par):
+    # solve min ||J x - f||^2 + par ||D x||^2 for each row, return x and the R of the stacked system
+    num_params = jacobian.shape[2]
+    augmented = np.concatenate([jacobian, np.sqrt(par)[:, np.newaxis, np.newaxis] * (diag[:, :, np.newaxis] * np.eye(num_params))], axis=1)
+    rhs = np.concatenate([fvec, np.zeros((len(fvec), num_params))], axis=1)
+    q, r = np.linalg.qr(augmented)
+    step = batch_solve(r, np.einsum("kmi,km->ki", q, rhs))
+    return step, r
+
+
+def newton_correction(r, diag, step, dxnorm, fp, delta):
+    # lmpar's correction to par, from ||R^-T (D^2 x / ||Dx||)||
+    wa1 = diag * (diag * step) / dxnorm[:, np.newaxis]
+    wa1 = batch_solve(np.transpose(r, (0, 2, 1)), wa1)
+    temp = np.sqrt(np.sum(wa1 ** 2, axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return ((fp / delta) / temp) / temp
+
+
+def lmpar(jacobian, fvec, diag, delta, par):
+    """
+    Vectorized MINPACK lmpar: for each row find par >= 0 and the step x solving
+    min ||J x - f||^2 + par ||D x||^2 with ||D x|| close to delta, or par = 0 if the
+    Gauss-Newton step already fits in the trust region.
+    """
+    num_rows, num_obs, num_params = jacobian.shape
+
+    q, r = np.linalg.qr(jacobian)
+    r_diag = np.abs(np.einsum("kii->ki", r))
+    full_rank = np.all(r_diag > machine_epsilon * np.max(r_diag, axis=1, initial=0, keepdims=True) * num_obs, axis=1)
+
+    # rank deficient rows get the least squares solution instead
+    gauss_newton = np.zeros((num_rows, num_params))
+    if np.any(full_rank):
+        gauss_newton[full_rank] = batch_solve(r[full_rank], np.einsum("kmi,km->ki", q[full_rank], fvec[full_rank]))
+    if not np.all(full_rank):
+        gauss_newton[~full_rank] = np.einsum("kij,kj->ki", np.linalg.pinv(jacobian[~full_rank]), fvec[~full_rank])
+    dxnorm = np.sqrt(np.sum((diag * gauss_newton) ** 2, axis=1))
+    fp = dxnorm - delta
+    use_gauss_newton = fp <= 0.1 * delta
+
+    step = gauss_newton.copy()
+    par = np.where(use_gauss_newton, 0.0, par)
+    active = ~use_gauss_newton
+    if not np.any(active):
+        return step, par
+
+    rows = np.flatnonzero(active)
+    j, f, d, dl = jacobian[rows], fvec[rows], diag[rows], delta[rows]
+    x, dx, fp_rows, p = gauss_newton[rows], dxnorm[rows], fp[rows], par[rows]
+
+    # the newton step gives a lower bound parl when the jacobian isn't rank deficient
+    parl = np.zeros(len(rows))
+    has_lower_bound = full_rank[rows]
+    if np.any(has_lower_bound):
+        lower = newton_correction(r[rows][has_lower_bound], d[has_lower_bound], x[has_lower_bound],
+                                  dx[has_lower_bound], fp_rows[has_lower_bound], dl[has_lower_bound])
+        parl[has_lower_bound] = lower
+
+    # and the gradient gives an upper bound paru
+    gnorm = np.sqrt(np.sum((np.einsum("kmi,km->ki", j, f) / d) ** 2, axis=1))
+    paru = gnorm / dl
+    paru = np.where(paru == 0, dwarf / np.minimum(dl, 0.1), paru)
+
+    p = np.minimum(np.maximum(p, parl), paru)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(p == 0, gnorm / dx, p)
+
+    searching = np.ones(len(rows), dtype=bool)
+    for iteration in range(1, 11):
+        s = np.flatnonzero(searching)
+        if not len(s):
+            break
+        p[s] = np.where(p[s] == 0, np.maximum(dwarf, 0.001 * paru[s]), p[s])
+        x_s, r_s = damped_step(j[s], f[s], d[s], p[s])
+        x[s] = x_s
+        dx_new = np.sqrt(np.sum((d[s] * x_s) ** 2, axis=1))
+        previous_fp = fp_rows[s]
+        fp_new = dx_new - dl[s]
+        fp_rows[s] = fp_new
+
+        finished = (np.abs(fp_new) <= 0.1 * dl[s]) | ((parl[s] == 0) & (fp_new <= previous_fp) & (previous_fp < 0)) | (iteration == 10)
+        searching[s[finished]] = False
+
+        keep = ~finished
+        if not np.any(keep):
+            break
+        k = s[keep]
+        parc = newton_correction(r_s[keep], d[k], x_s[keep], dx_new[keep], fp_new[keep], dl[k])
+        parl[k] = np.where(fp_new[keep] > 0, np.maximum(parl[k], p[k]), parl[k])
+        paru[k] = np.where(fp_new[keep] < 0, np.minimum(paru[k], p[k]), paru[k])
+        p[k] = np.maximum(parl[k], p[k] + parc)
+
+    step[rows] = x
+    par[rows] = p
+    return step, par
+
+
+def forward_difference_jacobian(model, params, fvec, y):
+    # MINPACK fdjac2 with the default epsfcn, so steps match curve_fit's
+    jacobian = np.zeros(fvec.shape + (params.shape[1],))
+    step_size = np.sqrt(machine_epsilon)
+    for j in range(params.shape[1]):
+        h = step_size * np.abs(params[:, j])
+        h = np.where(h == 0, step_size, h)
+        shifted = params.copy()
+        shifted[:, j] += h
+        jacobian[:, :, j] = ((model(shifted) - y) - fvec) / h[:, np.newaxis]
+    return jacobian
+
+
+def levenberg_marquardt(model, x0, y, max_nfev=None, ftol=default_tolerance, xtol=default_tolerance, factor=100.0):
+    """
+    Fit model(params) to y for every row at once, minimizing the sum of squared residuals.
+
+    model takes a (rows, params) array and returns (rows, observations) predictions.
+    Returns the fitted params and a boolean array that is false where curve_fit would
+    have raised "Optimal parameters not found".
+    """
+    y = np.asarray(y, dtype=float)
+    x = np.array(x0, dtype=float)
+    num_rows, num_params = x.shape
+    if max_nfev is None:
+        max_nfev = 200 * (num_params + 1)
+
+    with np.errstate(all="ignore"):
+        fvec = model(x) - y
+        fnorm = np.sqrt(np.sum(fvec ** 2, axis=1))
+    nfev = np.ones(num_rows, dtype=int)
+
+    diag = np.zeros((num_rows, num_params))
+    delta = np.zeros(num_rows)
+    xnorm = np.zeros(num_rows)
+    par = np.zeros(num_rows)
+    first_iteration = np.ones(num_rows, dtype=bool)
+    need_jacobian = np.ones(num_rows, dtype=bool)
+    done = np.zeros(num_rows, dtype=bool)
+    success = np.zeros(num_rows, dtype=bool)
+    jac = np.zeros((num_rows, len(y[0]), num_params))
+    gnorm = np.zeros(num_rows)
+
+    while not np.all(done):
+        rows = np.flatnonzero(~done)
+
+        # new jacobian after each successful step
+        refresh = rows[need_jacobian[rows]]
+        if len(refresh):
+            with np.errstate(all="ignore"):
+                jac[refresh] = forward_difference_jacobian(model, x[refresh], fvec[refresh], y[refresh])
+            nfev[refresh] += num_params
+            column_norms = np.sqrt(np.sum(jac[refresh] ** 2, axis=1))
+
+            starting = first_iteration[refresh]
+            start_rows = refresh[starting]
+            if len(start_rows):
+                diag[start_rows] = np.where(column_norms[starting] == 0, 1.0, column_norms[starting])
+                xnorm[start_rows] = np.sqrt(np.sum((diag[start_rows] * x[start_rows]) ** 2, axis=1))
+                delta[start_rows] = factor * xnorm[start_rows]
+                delta[start_rows] = np.where(delta[start_rows] == 0, factor, delta[start_rows])
+            later_rows = refresh[~starting]
+            diag[later_rows] = np.maximum(diag[later_rows], column_norms[~starting])
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scaled_gradient = np.abs(np.einsum("kmi,km->ki", jac[refresh], fvec[refresh]) / fnorm[refresh][:, np.newaxis]) / column_norms
+            scaled_gradient = np.where(column_norms == 0, 0, scaled_gradient)
+            gnorm[refresh] = np.where(fnorm[refresh] == 0, 0, np.max(np.nan_to_num(scaled_gradient), axis=1))
+            need_jacobian[refresh] = False
+
+            # gtol is 0, so this only stops on an exact zero gradient
+            zero_gradient = refresh[gnorm[refresh] <= 0]
+            done[zero_gradient] = True
+            success[zero_gradient] = True
+            rows = np.flatnonzero(~done)
+            if not len(rows):
+                break
+
+        step, par[rows] = lmpar(jac[rows], fvec[rows], diag[rows], delta[rows], par[rows])
+        step = -step
+        pnorm = np.sqrt(np.sum((diag[rows] * step) ** 2, axis=1))
+        starting = first_iteration[rows]
+        delta[rows] = np.where(starting, np.minimum(delta[rows], pnorm), delta[rows])
+
+        trial = x[rows] + step
+        with np.errstate(all="ignore"):
+            fvec_trial = model(trial) - y[rows]
+            fnorm_trial = np.sqrt(np.sum(fvec_trial ** 2, axis=1))
+        nfev[rows] += 1
+
+        with np.errstate(all="ignore"):
+            actred = np.where(0.1 * fnorm_trial < fnorm[rows], 1 - (fnorm_trial / fnorm[rows]) ** 2, -1.0)
+            temp1 = np.sqrt(np.sum(np.einsum("kmi,ki->km", jac[rows], step) ** 2, axis=1)) / fnorm[rows]
+            temp2 = np.sqrt(par[rows]) * pnorm / fnorm[rows]
+            prered = temp1 ** 2 + temp2 ** 2 / 0.5
+            dirder = -(temp1 ** 2 + temp2 ** 2)
+            ratio = np.where(prered != 0, actred / prered, 0.0)
+
+            # update the trust region
+            shrink = ratio <= 0.25
+            temp = np.where(actred >= 0, 0.5, 0.5 * dirder / (dirder + 0.5 * actred))
+            temp = np.where((0.1 * fnorm_trial >= fnorm[rows]) | (temp < 0.1), 0.1, temp)
+            grow = ~shrink & ((par[rows] == 0) | (ratio >= 0.75))
+            new_delta = np.where(shrink, temp * np.minimum(delta[rows], pnorm / 0.1), np.where(grow, pnorm / 0.5, delta[rows]))
+            new_par = np.where(shrink, par[rows] / temp, np.where(grow, 0.5 * par[rows], par[rows]))
+        delta[rows] = new_delta
+        par[rows] = new_par
+
+        successful = ratio >= 0.0001
+        accepted = rows[successful]
+        x[accepted] = trial[successful]
+        fvec[accepted] = fvec_trial[successful]
+        fnorm[accepted] = fnorm_trial[successful]
+        xnorm[accepted] = np.sqrt(np.sum((diag[accepted] * x[accepted]) ** 2, axis=1))
+        first_iteration[accepted] = False
+        need_jacobian[accepted] = True
+
+        converged = ((np.abs(actred) <= ftol) & (prered <= ftol) & (0.5 * ratio <= 1)) | (delta[rows] <= xtol * xnorm[rows])
+        failed = ~converged & ((nfev[rows] >= max_nfev)
+                               | ((np.abs(actred) <= machine_epsilon) & (prered <= machine_epsilon) & (0.5 * ratio <= 1))
+                               | (delta[rows] <= machine_epsilon * xnorm[rows])
+                               | (gnorm[rows] <= machine_epsilon))
+        failed |= ~converged & ~np.isfinite(fnorm[rows])
+        done[rows[converged | failed]] = True
+        success[rows[converged]] = True
+
+    return x, success
+
+
+def r_squared(y, y_fit):
+    residuals = y - y_fit
+    ss_res = np.sum(residuals ** 2, axis=1) + 0.0001
+    ss_tot = np.sum((y - np.mean(y, axis=1, keepdims=True)) ** 2, axis=1) + 0.0001
+    return 1 - (ss_res / ss_tot)
+
+
+def download_curve(x, params):
+    # b + a * expit(x / c), for each row of params (a, b, c)
+    return params[:, 1:2] + params[:, 0:1] * scipy.special.expit(x[np.newaxis, :] / params[:, 2:3])
+
+
+def fit_download_curves(downloads_by_age):
+    """
+    Fit the logistic download-by-age curve to each row of downloads_by_age.
+
+    Returns y_fit, r_squared and params arrays, plus a fitted flag that is false
+    where the fit didn't converge (those rows have nan in the other arrays).
+    """
+    y = np.asarray(downloads_by_age, dtype=float)
+    x = np.arange(y.shape[1], dtype=float)
+    initial_guess = np.column_stack([np.max(y, axis=1), np.full(len(y), 30.0), np.full(len(y), -1.0)])  # determined empirically
+
+    params, fitted = levenberg_marquardt(lambda params: download_curve(x, params), initial_guess, y)
+    with np.errstate(all="ignore"):
+        y_fit = download_curve(x, params)
+        response_r_squared = r_squared(y, y_fit)
+    y_fit[~fitted] = np.nan
+    params[~fitted] = np.nan
+    response_r_squared[~fitted] = np.nan
+    return y_fit, response_r_squared, params, fitted
+
+
+def fit_num_papers_lines(raw_num_papers_historical_by_year, threshold):
+    """
+    Least squares line through the years that have at least threshold times the most
+    recent year's papers, for each row.
+
+    Returns the fitted values (nan for years left out), r_squared, (intercept, slope) params,
+    the line extrapolated over the next five years, the mask of years used, and a fitted
+    flag that is false where fewer than two years qualified.
+    """
+    y = np.asarray(raw_num_papers_historical_by_year, dtype=float)
+    x = np.arange(y.shape[1], dtype=float)[np.newaxis, :]
+    used = y >= threshold * y[:, -1:]
+    weights = used.astype(float)
+
+    count = np.sum(weights, axis=1)
+    fitted = count >= 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_x = np.sum(weights * x, axis=1) / count
+        mean_y = np.sum(weights * y, axis=1) / count
+        sxx = np.sum(weights * (x - mean_x[:, np.newaxis]) ** 2, axis=1)
+        sxy = np.sum(weights * (x - mean_x[:, np.newaxis]) * (y - mean_y[:, np.newaxis]), axis=1)
+        slope = sxy / sxx
+        intercept = mean_y - slope * mean_x
+
+        y_fit = np.where(used, intercept[:, np.newaxis] + slope[:, np.newaxis] * x, np.nan)
+        residuals = np.where(used, y - y_fit, 0)
+        ss_res = np.sum(residuals ** 2, axis=1) + 0.0001
+        ss_tot = np.sum(weights * (y - mean_y[:, np.newaxis]) ** 2, axis=1) + 0.0001
+        response_r_squared = 1 - (ss_res / ss_tot)
+
+        future_x = np.arange(y.shape[1], 2 * y.shape[1], dtype=float)[np.newaxis, :]
+        y_extrap = intercept[:, np.newaxis] + slope[:, np.newaxis] * future_x
+
+    params = np.column_stack([intercept, slope])
+    for values in [y_fit, response_r_squared, params, y_extrap]:
+        values[~fitted] = np.nan
+    return y_fit, response_r_squared, params, y_extrap, used, fitted
@@ -0,0 +1,29 @@
+# coding: utf-8
+
+import numpy as np
+
+
+def greedy_frontier(cost_subscription_minus_ill, use_subscription, base_cost, base_use_instant):
+    """
+    Every subscription set Scenario.do_wizardly_things can end up with, for all spends at once.
+
+    Takes per-journal arrays already in cpu order.  The greedy walk subscribes everything that's
+    cheaper than ILL first, then the rest one at a time down the list, so breakpoint 0 is just the
+    cheaper-than-ILL journals and breakpoint i adds the i-th of the rest.  base_cost is the cost with
+    nothing subscribed (all ILL) and base_use_instant the instant use with nothing subscribed.
+
+    Returns the position in the input of the journal added at each breakpoint after the first,
+    and the cost, instant use and number of subscribed journals at every breakpoint.
+    """
+    cost_subscription_minus_ill = np.asarray(cost_subscription_minus_ill, dtype=float)
+    use_subscription = np.asarray(use_subscription, dtype=float)
+
+    cheaper_than_ill = cost_subscription_minus_ill < 0
+    added = np.flatnonzero(~cheaper_than_ill)
+
+    start_cost = base_cost + np.sum(cost_subscription_minus_ill[cheaper_than_ill])
+    start_use_instant = base_use_instant + np.sum(use_subscription[cheaper_than_ill])
+    cost = start_cost + np.concatenate([[0.0], np.cumsum(cost_subscription_minus_ill[added])])
+    use_instant = start_use_instant + np.concatenate([[0.0], np.cumsum(use_subscription[added])])
+    num_subscribed = np.sum(cheaper_than_ill) + np.arange(len(added) + 1)
+    return (added, cost, use_instant, num_subscribed)
@@ -0,0 +1,120 @@
+# coding: utf-8
+
+# Evicting cached calls in every worker, not just the one that called reset_cache.
+#
+# reset_cache writes the call it evicted (the memorycache key, json of module, function and args)
+# to jump_cache_status with the time.  Redshift has no LISTEN/NOTIFY, so each worker polls the
+# table for rows newer than the last it saw and drops those calls from its memorycache and from
+# any other cache registered for the function.  A row that commits a little after a poll can be
+# stamped earlier than rows that poll saw, so each poll looks back a bit further and skips the
+# rows it has already done.  A worker that's just started has nothing cached from before it
+# started, so its first poll starts at the newest row instead of replaying the whole table.
+
+import datetime
+import json
+import threading
+
+default_overlap = datetime.timedelta(seconds=60)
+
+
+def parse_cache_call(cache_call):
+    """(module name, function name, args) from a memorycache key."""
+    (module_name, function_name, args) = json.loads(cache_call)
+    return (module_name, function_name, args)
+
+
+class InvalidationBus(object):
+    """
+    Applies the cache calls from jump_cache_status to this process's caches: memory_cache (a
+    MemoryCache, or any dict-like keyed by cache call), the stores registered per function, and
+    shared_cache if there is one.
+    """
+
+    def __init__(self, memory_cache, overlap=default_overlap, shared_cache=None):
+        self.memory_cache = memory_cache
+        self.shared_cache = shared_cache
+        self.overlap = overlap
+        self.lock = threading.Lock()
+        # "module.function" -> dict-like stores keyed by cache call
+        self.stores = {}
+        self.last_updated = None
+        # (cache_call, updated) -> True for the rows inside the overlap that are already done
+        self.done = {}
+        self.polls = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def register(self, module_name, function_name, store):
+        with self.lock:
+            self.stores.setdefault("{}.{}".format(module_name, function_name), []).append(store)
+
+    def invalidate(self, cache_call):
+        """Evicts one cache call from every cache that might have it."""
+        (module_name, function_name, args) = parse_cache_call(cache_call)
+        self.memory_cache.pop(cache_call, None)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(cache_call)
+        for store in self.stores.get("{}.{}".format(module_name, function_name), []):
+            store.pop(cache_call, None)
+        self.invalidations += 1
+
+    def poll(self, fetch_rows, fetch_latest=None):
+        """
+        Evicts the calls in rows that are new since the last poll.  fetch_rows(since) returns
+        (cache_call, updated) rows with updated after since, or all of them when since is None.
+        fetch_latest() returns the newest updated, or None if it can't tell; when it's given, the
+        first poll starts from there rather than from the beginning.  Returns how many calls it
+        evicted.
+        """
+        if self.last_updated is None and fetch_latest is not None:
+            self.polls += 1
+            latest = fetch_latest()
+            if latest is not None:
+                # the rows the next poll looks back over are from before this worker started
+                self.done = dict((row, True) for row in fetch_rows(latest - self.overlap))
+                self.last_updated = latest
+            return 0
+
+        since = self.last_updated - self.overlap if self.last_updated is not None else None
+        rows = fetch_rows(since)
+        self.polls += 1
+
+        num_evicted = 0
+        for (cache_call, updated) in sorted(rows, key=lambda row: row[1]):
+            if (cache_call, updated) in self.done:
+                continue
+            try:
+                self.invalidate(cache_call)
+                num_evicted += 1
+            except ValueError as e:
+                print("couldn't read cache call {}.  Error message: ".format(cache_call), e)
+                self.errors += 1
+            self.done[(cache_call, updated)] = True
+            if self.last_updated is None or updated > self.last_updated:
+                self.last_updated = updated
+
+        if self.last_updated is not None:
+            window_start = self.last_updated - self.overlap
+            self.done = dict((row, True) for row in self.done if row[1] >= window_start)
+        return num_evicted
+
+    def stats(self):
+        return {
+            "polls": self.polls,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+            "last_updated": self.last_updated.isoformat() if self.last_updated is not None else None,
+            "registered": sorted(self.stores),
+        }
+
+
+def watch_cache_status(bus, fetch_rows, interval, stop=None, fetch_latest=None):
+    """Polls every interval seconds until stop is set, for a background thread."""
+    stop = stop or threading.Event()
+    while True:
+        try:
+            bus.poll(fetch_rows, fetch_latest)
+        except Exception as e:
+            print("couldn't poll jump_cache_status.  Error message: ", e)
+        if stop.wait(interval):
+            return
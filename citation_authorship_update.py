@@ -3,6 +3,7 @@ import click
 from psycopg2 import sql
 import datetime
 from app import get_db_cursor
+from scenario import reset_apc_data_cache
 
 # 7 days, as seconds
 UPDATE_AFTER_DEFAULT = 604800
@@ -43,6 +44,8 @@ def update_apc_authorships(package_id):
 		click.echo(cursor.mogrify(cmd, (package_id,)))
 		cursor.execute(cmd, (package_id,))
 
+	reset_apc_data_cache(package_id)
+
 def check_updated(grid_id, table):
 	with get_db_cursor() as cursor:
 		cmd = "select * from {} where grid_id=%s order by updated desc limit 1".format(table)
@@ -1,86 +1,101 @@
 import os
 import argparse
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 import json
 import gzip
 
-from app import get_db_cursor
+from app import get_db_server_cursor
 from app import s3_client
+from app import USE_PAPER_GROWTH
+from scenario_engine import get_download_curves
+from common_data_versions import publish_common_data
 
-def get_embargo_data_from_db():
-    command = "select issn_l, embargo from journal_delayed_oa_active"
-    embargo_rows = None
-    with get_db_cursor() as cursor:
+oa_table_keys = ["with_submitted_with_bronze", "with_submitted_no_bronze", "no_submitted_with_bronze", "no_submitted_no_bronze"]
+
+# rows brought over from the server at a time
+stream_batch_size = 50000
+
+def stream_rows(command, table, stats=None):
+    """
+    The rows of command as dicts, a batch at a time through a server-side cursor, so a big table
+    never has to be in memory whole.  Row count and time go in stats[table].
+    """
+    start_time = time()
+    num_rows = 0
+    with get_db_server_cursor(name="stream_{}".format(table), itersize=stream_batch_size) as cursor:
         cursor.execute(command)
-        embargo_rows = cursor.fetchall()
-    embargo_dict = dict((a["issn_l"], round(a["embargo"])) for a in embargo_rows)
+        columns = None
+        while True:
+            rows = cursor.fetchmany(stream_batch_size)
+            if not rows:
+                break
+            if columns is None:
+                columns = [column[0] for column in cursor.description]
+            for row in rows:
+                yield dict(zip(columns, row))
+            num_rows += len(rows)
+    if stats is not None:
+        stats[table] = {"rows": num_rows, "seconds": time() - start_time}
+
+def get_embargo_data_from_db(stats=None):
+    command = "select issn_l, embargo from journal_delayed_oa_active"
+    embargo_dict = dict((a["issn_l"], round(a["embargo"])) for a in stream_rows(command, "journal_delayed_oa_active", stats))
     return embargo_dict
 
-def get_unpaywall_downloads_from_db():
+def get_unpaywall_downloads_from_db(stats=None):
     command = """
         select issn_l,num_papers_2021,downloads_total,downloads_0y,downloads_1y,downloads_2y,downloads_3y,downloads_4y
         from jump_unpaywall_downloads
         where issn_l in (select distinct issn_l from jump_counter)
     """
-    big_view_rows = None
-    with get_db_cursor() as cursor:
-        cursor.execute(command)
-        big_view_rows = cursor.fetchall()
-    unpaywall_downloads_dict = dict((row["issn_l"], dict(row)) for row in big_view_rows)
+    unpaywall_downloads_dict = dict((row["issn_l"], row) for row in stream_rows(command, "jump_unpaywall_downloads", stats))
     return unpaywall_downloads_dict
 
-def get_num_papers_from_db():
+def get_num_papers_from_db(stats=None):
     command = "select issn_l, year, num_papers from jump_num_papers_oa where year >= 2014"
-    with get_db_cursor() as cursor:
-        cursor.execute(command)
-        rows = cursor.fetchall()
     lookup_dict = defaultdict(dict)
-    for row in rows:
+    for row in stream_rows(command, "jump_num_papers_oa", stats):
         lookup_dict[row["issn_l"]][row["year"]] = row["num_papers"]
     return lookup_dict
 
-def get_oa_data_from_db():
+def get_oa_table_from_db(key, stats=None):
+    # just the columns the model reads; the tables also have updated, venue_id and adjusted
+    command = """select issn_l, fresh_oa_status, year_int, count from jump_oa_{}
+                    where year_int >= 2015
+                        """.format(key)
+    lookup_dict = defaultdict(list)
+    for row in stream_rows(command, "jump_oa_{}".format(key), stats):
+        row['year_int'] = int(row['year_int'])
+        lookup_dict[row["issn_l"]].append(row)
+    return lookup_dict
+
+def get_oa_data_from_db(stats=None):
     oa_dict = {}
-    for submitted in ["with_submitted", "no_submitted"]:
-        for bronze in ["with_bronze", "no_bronze"]:
-            key = "{}_{}".format(submitted, bronze)
-
-            command = """select * from jump_oa_{}  
-                        where year_int >= 2015  
-                            """.format(key)
-
-            with get_db_cursor() as cursor:
-                cursor.execute(command)
-                rows = cursor.fetchall()
-            for x in rows:
-                x['year_int'] = int(x['year_int'])
-            lookup_dict = defaultdict(list)
-            for row in rows:
-                lookup_dict[row["issn_l"]] += [dict(row)]
-            oa_dict[key] = lookup_dict
+    for key in oa_table_keys:
+        oa_dict[key] = get_oa_table_from_db(key, stats)
     return oa_dict
 
-def get_society_data_from_db():
+def get_society_data_from_db(stats=None):
     command = "select issn_l, is_society_journal from jump_society_journals_input where is_society_journal is not null"
-    with get_db_cursor() as cursor:
-        cursor.execute(command)
-        rows = cursor.fetchall()
     lookup_dict = defaultdict(list)
-    for row in rows:
+    for row in stream_rows(command, "jump_society_journals_input", stats):
         lookup_dict[row["issn_l"]] = row["is_society_journal"]
     return lookup_dict
 
-def get_social_networks_data_from_db():
+def get_social_networks_data_from_db(stats=None):
     command = """select issn_l, asn_only_rate::float from jump_mturk_asn_rates
                     """
-    with get_db_cursor() as cursor:
-        cursor.execute(command)
-        rows = cursor.fetchall()
     lookup_dict = {}
-    for row in rows:
+    for row in stream_rows(command, "jump_mturk_asn_rates", stats):
         lookup_dict[row["issn_l"]] = row["asn_only_rate"]
     return lookup_dict
 
+def print_gather_stats(stats):
+    for table, table_stats in sorted(stats.items(), key=lambda item: -item[1]["seconds"]):
+        print("{: <40} {: >10} rows {: >8.1f}s".format(table, table_stats["rows"], table_stats["seconds"]))
+
 def write_json(title, data):
     print("dumping")
     with open(title, 'w') as f:
@@ -88,13 +103,29 @@ def write_json(title, data):
     print("done dumping")
 
 def gather_common_data():
-    my_data = {}
-    my_data["embargo_dict"] = get_embargo_data_from_db()
-    my_data["unpaywall_downloads_dict_raw"] = get_unpaywall_downloads_from_db()
-    my_data["social_networks"] = get_social_networks_data_from_db()
-    my_data["oa"] = get_oa_data_from_db()
-    my_data["society"] = get_society_data_from_db()
-    my_data["num_papers"] = get_num_papers_from_db()
+    # the extracts don't depend on each other, so each runs on its own pooled connection
+    start_time = time()
+    stats = {}
+    extracts = {
+        "embargo_dict": get_embargo_data_from_db,
+        "unpaywall_downloads_dict_raw": get_unpaywall_downloads_from_db,
+        "social_networks": get_social_networks_data_from_db,
+        "society": get_society_data_from_db,
+        "num_papers": get_num_papers_from_db,
+    }
+    with ThreadPoolExecutor(max_workers=len(extracts) + len(oa_table_keys)) as executor:
+        futures = dict((name, executor.submit(extract, stats)) for (name, extract) in extracts.items())
+        oa_futures = dict((key, executor.submit(get_oa_table_from_db, key, stats)) for key in oa_table_keys)
+        my_data = dict((name, future.result()) for (name, future) in futures.items())
+        my_data["oa"] = dict((key, future.result()) for (key, future) in oa_futures.items())
+
+    # global data only, so fit the download curves once here rather than in every scenario
+    fit_start_time = time()
+    my_data["download_curves"] = get_download_curves(my_data["unpaywall_downloads_dict_raw"], my_data["num_papers"], use_paper_growth=USE_PAPER_GROWTH)
+    stats["download_curves"] = {"rows": len(my_data["download_curves"]["curves"]), "seconds": time() - fit_start_time}
+
+    print_gather_stats(stats)
+    print("gathered common data in {:.1f}s".format(time() - start_time))
     return my_data
 
 def upload_common_data():
@@ -106,8 +137,9 @@ def upload_common_data():
     except OSError:
         pass
 
-    with gzip.open('data/common_package_data_for_all.json.gz', 'w') as f:
-        f.write(json.dumps(data, default=str).encode('utf-8'))
+    # json.dump writes as it encodes, so the whole json string is never in memory
+    with gzip.open('data/common_package_data_for_all.json.gz', 'wt', encoding='utf-8') as f:
+        json.dump(data, f, default=str)
 
     print("uploading to S3")
     s3_client.upload_file(
@@ -115,6 +147,9 @@ def upload_common_data():
         Bucket="unsub-cache", 
         Key="common_package_data_for_all.json.gz")
 
+    # the same data as columns, as a new version the workers pick up without a restart
+    publish_common_data(s3_client, "unsub-cache", data, "data")
+
     print("done!")
 
 # heroku local:run python common_data.py --run
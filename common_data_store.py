@@ -0,0 +1,429 @@
+# coding: utf-8
+
+# The common data (everything in common_package_data_for_all that isn't package specific) as one
+# binary file of typed columns over a sorted issn_l index, so processes can memory-map it read-only
+# instead of each parsing the json into its own nested dicts.  The OS page cache keeps one physical
+# copy however many gunicorn workers on the dyno map it.
+#
+# Layout: MAGIC, a little-endian uint64 header length, a json header, then each array aligned to
+# ALIGNMENT bytes.  The header has the dtype, shape and offset of every array, plus the small lookup
+# tables (years, OA statuses, society labels) and the download curve settings.  OA counts are one
+# dense [issn, variant, status, year] array, so the model can slice them rather than loop over rows.
+#
+# CommonDataStore.to_common_data_dict gives the same shape as gather_common_data, with read-only
+# views that build each journal's dict or rows from the columns when they are looked up.
+
+import copy
+import fcntl
+import json
+import os
+from collections import defaultdict
+from collections.abc import Mapping
+
+import numpy as np
+
+MAGIC = b"UNSUBCD1"
+ALIGNMENT = 64
+FORMAT_VERSION = 2
+
+oa_keys = ["with_submitted_with_bronze", "with_submitted_no_bronze", "no_submitted_with_bronze", "no_submitted_no_bronze"]
+unpaywall_columns = ["num_papers_2021", "downloads_total", "downloads_0y", "downloads_1y", "downloads_2y", "downloads_3y", "downloads_4y"]
+
+
+def float_or_nan(value):
+    if value is None:
+        return np.nan
+    return float(value)
+
+
+def nan_to_none(value):
+    if value != value:
+        return None
+    return value
+
+
+def encode_labels(values_by_issn, index):
+    # small sets of strings, like society's YES/NO, as int8 codes into a label list; -1 is missing
+    labels = sorted(set(str(value) for value in values_by_issn.values() if value is not None))
+    codes = np.full(len(index), -1, dtype=np.int8)
+    for issn_l, value in values_by_issn.items():
+        if value is not None:
+            codes[index[issn_l]] = labels.index(str(value))
+    return (codes, labels)
+
+
+def build_arrays(data):
+    """
+    The arrays and header meta for a gather_common_data style dict.  Years that came back from the
+    json as strings are stored as ints.
+    """
+    oa_data = data["oa"]
+    download_curves = data.get("download_curves", None)
+
+    all_issns = set()
+    for name in ["embargo_dict", "unpaywall_downloads_dict_raw", "social_networks", "society", "num_papers"]:
+        all_issns.update(data[name].keys())
+    for key in oa_keys:
+        all_issns.update(oa_data[key].keys())
+    if download_curves:
+        all_issns.update(download_curves["issn_ls"])
+    issn_ls = sorted(all_issns)
+    index = dict((issn_l, position) for position, issn_l in enumerate(issn_ls))
+    num_issns = len(issn_ls)
+
+    arrays = {}
+    meta = {"version": FORMAT_VERSION}
+    width = max([len(issn_l.encode("utf-8")) for issn_l in issn_ls] + [1])
+    arrays["issn_ls"] = np.array([issn_l.encode("utf-8") for issn_l in issn_ls], dtype="S{}".format(width))
+
+    embargo = np.full(num_issns, -1, dtype=np.int32)
+    for issn_l, value in data["embargo_dict"].items():
+        embargo[index[issn_l]] = value
+    arrays["embargo"] = embargo
+    arrays["embargo_present"] = np.zeros(num_issns, dtype=bool)
+    arrays["embargo_present"][[index[issn_l] for issn_l in data["embargo_dict"]]] = True
+
+    unpaywall = np.full((num_issns, len(unpaywall_columns)), np.nan)
+    unpaywall_present = np.zeros(num_issns, dtype=bool)
+    for issn_l, row in data["unpaywall_downloads_dict_raw"].items():
+        unpaywall_present[index[issn_l]] = True
+        unpaywall[index[issn_l]] = [float_or_nan(row.get(column, None)) for column in unpaywall_columns]
+    arrays["unpaywall"] = unpaywall
+    arrays["unpaywall_present"] = unpaywall_present
+    meta["unpaywall_columns"] = unpaywall_columns
+
+    social_networks = np.full(num_issns, np.nan)
+    social_networks_present = np.zeros(num_issns, dtype=bool)
+    for issn_l, value in data["social_networks"].items():
+        social_networks_present[index[issn_l]] = True
+        social_networks[index[issn_l]] = float_or_nan(value)
+    arrays["social_networks"] = social_networks
+    arrays["social_networks_present"] = social_networks_present
+
+    (arrays["society"], meta["society_labels"]) = encode_labels(data["society"], index)
+    arrays["society_present"] = np.zeros(num_issns, dtype=bool)
+    arrays["society_present"][[index[issn_l] for issn_l in data["society"]]] = True
+
+    years = sorted(set(int(year) for papers_by_year in data["num_papers"].values() for year in papers_by_year))
+    num_papers = np.full((num_issns, len(years)), np.nan)
+    num_papers_present = np.zeros(num_issns, dtype=bool)
+    for issn_l, papers_by_year in data["num_papers"].items():
+        num_papers_present[index[issn_l]] = True
+        for year, value in papers_by_year.items():
+            num_papers[index[issn_l], years.index(int(year))] = float_or_nan(value)
+    arrays["num_papers"] = num_papers
+    arrays["num_papers_present"] = num_papers_present
+    meta["num_papers_years"] = years
+
+    # OA counts as one dense int32 array [issn, variant, status, year], the variants in oa_keys order.
+    # -1 where there's no row, so rows with a count of 0 round trip.  Counts are rounded, and when
+    # an issn has two rows for a status and year the last one wins, both as the model reads them
+    statuses = sorted(set(row["fresh_oa_status"] for key in oa_keys for rows in oa_data[key].values() for row in rows))
+    oa_years = sorted(set(round(row["year_int"]) for key in oa_keys for rows in oa_data[key].values() for row in rows))
+    meta["oa_statuses"] = statuses
+    meta["oa_years"] = oa_years
+    status_indexes = dict((status, i) for (i, status) in enumerate(statuses))
+    year_indexes = dict((year, i) for (i, year) in enumerate(oa_years))
+    oa_counts = np.full((num_issns, len(oa_keys), len(statuses), len(oa_years)), -1, dtype=np.int32)
+    oa_present = np.zeros((num_issns, len(oa_keys)), dtype=bool)
+    for variant, key in enumerate(oa_keys):
+        for issn_l, rows in oa_data[key].items():
+            position = index[issn_l]
+            oa_present[position, variant] = True
+            for row in rows:
+                oa_counts[position, variant, status_indexes[row["fresh_oa_status"]], year_indexes[round(row["year_int"])]] = round(row["count"])
+    arrays["oa_counts"] = oa_counts
+    arrays["oa_present"] = oa_present
+
+    if download_curves:
+        curves = download_curves["curves"]
+        y_fit = np.full((num_issns, 5), np.nan)
+        r_squared = np.full(num_issns, np.nan)
+        params = np.full((num_issns, 3), np.nan)
+        fitted = np.zeros(num_issns, dtype=bool)
+        for issn_l, curve in curves.items():
+            fitted[index[issn_l]] = True
+            y_fit[index[issn_l]] = curve["y_fit"]
+            r_squared[index[issn_l]] = curve["r_squared"]
+            params[index[issn_l]] = curve["params"]
+        arrays["curves_y_fit"] = y_fit
+        arrays["curves_r_squared"] = r_squared
+        arrays["curves_params"] = params
+        arrays["curves_fitted"] = fitted
+        arrays["curves_issn_ls_present"] = np.zeros(num_issns, dtype=bool)
+        arrays["curves_issn_ls_present"][[index[issn_l] for issn_l in download_curves["issn_ls"]]] = True
+        meta["download_curves"] = {"num_papers_years": download_curves["num_papers_years"],
+                                   "use_paper_growth": download_curves["use_paper_growth"]}
+
+    return (arrays, meta)
+
+
+def write_common_data_store(data, path, meta=None):
+    """
+    Writes a gather_common_data style dict to path as a common data store, with anything in meta
+    added to the header.  Written to a temp file and renamed, so a process mapping path never sees
+    half a file.
+    """
+    (arrays, store_meta) = build_arrays(data)
+    meta = dict(meta or {}, **store_meta)
+
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        entries[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header = json.dumps({"meta": meta, "arrays": entries}).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    temp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(temp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + entries[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(temp_path, path)
+
+
+class CommonDataStore(object):
+    """
+    A common data store file, memory-mapped read-only.  The arrays are views onto the mapping, so
+    they cost no memory of their own until their pages are read, and then the pages are shared.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mapped = np.memmap(path, dtype=np.uint8, mode="r")
+        if bytes(self.mapped[:len(MAGIC)]) != MAGIC:
+            raise ValueError("{} isn't a common data store".format(path))
+        header_length = int(np.frombuffer(self.mapped, dtype="<u8", count=1, offset=len(MAGIC))[0])
+        header = json.loads(bytes(self.mapped[len(MAGIC) + 8:len(MAGIC) + 8 + header_length]).decode("utf-8"))
+        data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+        self.meta = header["meta"]
+        if self.meta["version"] != FORMAT_VERSION:
+            raise ValueError("{} is common data store version {}, not {}".format(path, self.meta["version"], FORMAT_VERSION))
+        self.arrays = {}
+        for name, entry in header["arrays"].items():
+            self.arrays[name] = np.ndarray(entry["shape"], dtype=np.dtype(entry["dtype"]), buffer=self.mapped,
+                                           offset=data_start + entry["offset"])
+        self.issn_ls = self.arrays["issn_ls"]
+
+    def index_of(self, issn_l):
+        # position of issn_l in the sorted index, or None
+        if not isinstance(issn_l, str):
+            return None
+        key = issn_l.encode("utf-8")
+        position = int(np.searchsorted(self.issn_ls, key))
+        if position < len(self.issn_ls) and self.issn_ls[position] == key:
+            return position
+        return None
+
+    def positions_of(self, issn_ls):
+        """Position in the index of each of issn_ls, -1 for the ones that aren't in it."""
+        keys = np.array([issn_l.encode("utf-8") if isinstance(issn_l, str) else b"" for issn_l in issn_ls], dtype=bytes)
+        if not len(keys) or not len(self.issn_ls):
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.issn_ls, keys), len(self.issn_ls) - 1)
+        return np.where(self.issn_ls[positions] == keys, positions, -1)
+
+    def to_common_data_dict(self):
+        """The same keys and value shapes as gather_common_data, as read-only views onto the store."""
+        response = {
+            "embargo_dict": EmbargoView(self),
+            "unpaywall_downloads_dict_raw": UnpaywallView(self),
+            "social_networks": SocialNetworksView(self),
+            "oa": dict((key, OaView(self, key)) for key in oa_keys),
+            "society": SocietyView(self),
+            "num_papers": NumPapersView(self),
+        }
+        if "download_curves" in self.meta:
+            response["download_curves"] = dict(self.meta["download_curves"])
+            response["download_curves"]["issn_ls"] = IssnListView(self, "curves_issn_ls_present")
+            response["download_curves"]["curves"] = DownloadCurvesView(self)
+        return response
+
+
+class ColumnView(Mapping):
+    """
+    A read-only dict over the issns that have a row in one table of the store.  Subclasses say
+    which mask marks those rows and build the value for a row.
+
+    subset gives the same view narrowed to some issns, with their positions looked up once, so a
+    package's lookups after that are dict gets and don't search the index.
+    """
+    present_name = None
+
+    def __init__(self, store):
+        self.store = store
+        self.present = store.arrays[self.present_name]
+        # issn_l -> position, for a view onto just some issns
+        self.positions = None
+
+    def position(self, issn_l):
+        if self.positions is not None:
+            return self.positions.get(issn_l, None)
+        position = self.store.index_of(issn_l)
+        if position is None or not self.present[position]:
+            return None
+        return position
+
+    def __getitem__(self, issn_l):
+        position = self.position(issn_l)
+        if position is None:
+            raise KeyError(issn_l)
+        return self.value(issn_l, position)
+
+    def __contains__(self, issn_l):
+        return self.position(issn_l) is not None
+
+    def __iter__(self):
+        if self.positions is not None:
+            return iter(self.positions)
+        return (self.store.issn_ls[position].decode("utf-8") for position in np.flatnonzero(self.present))
+
+    def __len__(self):
+        if self.positions is not None:
+            return len(self.positions)
+        return int(np.count_nonzero(self.present))
+
+    def subset(self, issn_ls):
+        """This view, for just the issns in issn_ls that it has."""
+        issn_ls = list(issn_ls)
+        positions = self.store.positions_of(issn_ls)
+        found = positions >= 0
+        found[found] = self.present[positions[found]]
+        response = copy.copy(self)
+        response.positions = dict((issn_ls[i], int(positions[i])) for i in np.flatnonzero(found))
+        return response
+
+    def value(self, issn_l, position):
+        raise NotImplementedError
+
+
+class IssnListView(ColumnView):
+    # just the keys, for lists of issns like download_curves["issn_ls"]
+    def __init__(self, store, present_name):
+        self.present_name = present_name
+        super(IssnListView, self).__init__(store)
+
+    def value(self, issn_l, position):
+        return True
+
+
+class EmbargoView(ColumnView):
+    present_name = "embargo_present"
+
+    def value(self, issn_l, position):
+        return int(self.store.arrays["embargo"][position])
+
+
+class SocialNetworksView(ColumnView):
+    present_name = "social_networks_present"
+
+    def value(self, issn_l, position):
+        return nan_to_none(float(self.store.arrays["social_networks"][position]))
+
+
+class SocietyView(ColumnView):
+    present_name = "society_present"
+
+    def value(self, issn_l, position):
+        code = int(self.store.arrays["society"][position])
+        if code < 0:
+            return None
+        return self.store.meta["society_labels"][code]
+
+
+class UnpaywallView(ColumnView):
+    present_name = "unpaywall_present"
+
+    def value(self, issn_l, position):
+        response = {"issn_l": issn_l}
+        for column, value in zip(self.store.meta["unpaywall_columns"], self.store.arrays["unpaywall"][position].tolist()):
+            response[column] = nan_to_none(value)
+        return response
+
+
+class NumPapersView(ColumnView):
+    present_name = "num_papers_present"
+
+    def value(self, issn_l, position):
+        years = self.store.meta["num_papers_years"]
+        return dict((year, value) for (year, value) in zip(years, self.store.arrays["num_papers"][position].tolist())
+                    if value == value)
+
+
+class OaView(ColumnView):
+    """
+    One variant's slice of the dense OA counts.  As a dict it gives the rows the model reads, but
+    counts_by_year and counts_by_status read the counts straight from the array.
+    """
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        variant = oa_keys.index(key)
+        self.present = store.arrays["oa_present"][:, variant]
+        self.positions = None
+        # [issn, status, year]
+        self.counts = store.arrays["oa_counts"][:, variant]
+        self.statuses = store.meta["oa_statuses"]
+        self.years = store.meta["oa_years"]
+
+    def value(self, issn_l, position):
+        counts = self.counts[position]
+        return [{"issn_l": issn_l, "fresh_oa_status": self.statuses[status], "year_int": self.years[year], "count": int(counts[status, year])}
+                for (status, year) in zip(*np.nonzero(counts >= 0))]
+
+    def counts_by_year(self, issn_ls, years):
+        """
+        (statuses, counts) where counts is an issn x status x year int array of OA paper counts for
+        issn_ls and years, 0 where there's no row.
+        """
+        positions = np.array([-1 if position is None else position for position in map(self.position, issn_ls)], dtype=np.int64)
+        counts = np.zeros((len(issn_ls), len(self.statuses), len(years)), dtype=np.int32)
+        found = positions >= 0
+        for column, year in enumerate(years):
+            if year in self.years:
+                counts[found, :, column] = np.maximum(self.counts[positions[found], :, self.years.index(year)], 0)
+        return (self.statuses, counts)
+
+    def counts_by_status(self, issn_l):
+        """{status: {year: count}} for one issn, for every row it has."""
+        response = defaultdict(dict)
+        for row in self.get(issn_l, []):
+            response[row["fresh_oa_status"]][row["year_int"]] = row["count"]
+        return response
+
+
+class DownloadCurvesView(ColumnView):
+    present_name = "curves_fitted"
+
+    def value(self, issn_l, position):
+        return {"y_fit": self.store.arrays["curves_y_fit"][position].tolist(),
+                "r_squared": float(self.store.arrays["curves_r_squared"][position]),
+                "params": self.store.arrays["curves_params"][position].tolist()}
+
+
+def ensure_local_file(path, build):
+    """
+    Makes path with build(temp_path) unless it's already there.  Behind a file lock, so when the
+    workers on a dyno all want the same file only the first builds it and the rest wait for it.
+    """
+    if os.path.exists(path):
+        return path
+    with open(path + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                temp_path = "{}.{}.tmp".format(path, os.getpid())
+                build(temp_path)
+                os.replace(temp_path, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return path
+
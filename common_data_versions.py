@@ -0,0 +1,282 @@
+# coding: utf-8
+
+# Versions of the common data on S3, so it can be refreshed without restarting dynos.
+#
+# common_data/manifest.json says which version is current: a full snapshot store, and the chain of
+# deltas since it.  A delta is a common data store with just the issns whose rows changed, plus the
+# issns each table dropped in its header.  The builder publishes a delta when not much changed and
+# a fresh snapshot when a lot did, or the chain is long, and writes the manifest last so readers
+# never see a version that isn't all there.
+#
+# Workers build each version on local disk (snapshot, then each delta merged in, once per dyno
+# behind a file lock), map it, and swap it into a CommonDataHolder.  Requests already running keep
+# the version they started with.
+
+import datetime
+import glob
+import json
+import os
+import re
+import threading
+
+from common_data_store import CommonDataStore
+from common_data_store import ensure_local_file
+from common_data_store import oa_keys
+from common_data_store import write_common_data_store
+
+manifest_prefix = "common_data/"
+table_names = ["embargo_dict", "unpaywall_downloads_dict_raw", "social_networks", "society", "num_papers"]
+default_max_deltas = 10
+# past this share of issns changed, a delta isn't worth it
+default_max_delta_fraction = 0.5
+
+
+def new_version_id(now=None):
+    now = now or datetime.datetime.utcnow()
+    return now.strftime("%Y%m%d%H%M%S")
+
+
+def version_path(directory, version):
+    return os.path.join(directory, "common_data_{}.store".format(version))
+
+
+def prune_common_data_versions(directory, manifest):
+    """
+    Deletes the versions built in directory that are older than the manifest's, except its
+    snapshot, which the next delta will be merged onto.  Newer ones are left, in case another
+    worker on the dyno has just built one.  Workers still mapping a deleted version keep reading
+    it: the file goes away when the last of them unmaps it.  Returns the versions it deleted.
+    """
+    keep = set([manifest["version"], manifest["snapshot"]["version"]])
+    pruned = []
+    for path in glob.glob(os.path.join(directory, "common_data_*.store")):
+        match = re.match(r"^common_data_(\d+)\.store$", os.path.basename(path))
+        if not match or match.group(1) in keep or match.group(1) >= manifest["version"]:
+            continue
+        try:
+            os.remove(path)
+            pruned.append(match.group(1))
+        except OSError as e:
+            print("couldn't prune common data version {}.  Error message: ".format(path), e)
+    if pruned:
+        print("pruned common data versions {}".format(sorted(pruned)))
+    return sorted(pruned)
+
+
+def get_download_curve_settings(data):
+    download_curves = data.get("download_curves", None)
+    if not download_curves:
+        return None
+    return {"num_papers_years": list(download_curves["num_papers_years"]), "use_paper_growth": download_curves["use_paper_growth"]}
+
+
+def common_data_tables(data):
+    """The per-issn tables of a common data dict, by name, each an issn_l -> value dict or view."""
+    tables = dict((name, data[name]) for name in table_names)
+    for key in oa_keys:
+        tables["oa.{}".format(key)] = data["oa"][key]
+    download_curves = data.get("download_curves", None)
+    if download_curves:
+        tables["download_curves.curves"] = download_curves["curves"]
+        issn_ls = download_curves["issn_ls"]
+        tables["download_curves.issn_ls"] = issn_ls if hasattr(issn_ls, "keys") else dict.fromkeys(issn_ls, True)
+    return tables
+
+
+def common_data_from_tables(tables, download_curve_settings):
+    data = dict((name, tables.get(name, {})) for name in table_names)
+    data["oa"] = dict((key, tables.get("oa.{}".format(key), {})) for key in oa_keys)
+    if download_curve_settings is not None:
+        data["download_curves"] = dict(download_curve_settings,
+                                       issn_ls=list(tables.get("download_curves.issn_ls", {})),
+                                       curves=tables.get("download_curves.curves", {}))
+    return data
+
+
+def diff_common_data(old, new):
+    """
+    What changed from old to new, as (changed, removed): the new value of every issn whose value
+    is new or different, and the issns that are gone, by table.
+    """
+    old_tables = common_data_tables(old)
+    changed = {}
+    removed = {}
+    for name, new_table in common_data_tables(new).items():
+        old_table = old_tables.get(name, {})
+        changed[name] = dict((issn_l, value) for (issn_l, value) in new_table.items() if old_table.get(issn_l, None) != value)
+        removed[name] = [issn_l for issn_l in old_table if issn_l not in new_table]
+    return (changed, removed)
+
+
+def apply_delta(base, delta, removed):
+    """The common data dict for base with a delta's changed rows and removed issns applied."""
+    tables = dict((name, dict(table)) for (name, table) in common_data_tables(base).items())
+    for name, table in common_data_tables(delta).items():
+        tables.setdefault(name, {}).update(table)
+    for name, issn_ls in removed.items():
+        for issn_l in issn_ls:
+            tables.get(name, {}).pop(issn_l, None)
+    return common_data_from_tables(tables, get_download_curve_settings(delta))
+
+
+def read_manifest(s3_client, bucket, prefix=manifest_prefix):
+    """The current manifest, or None if nothing has been published."""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=prefix + "manifest.json")
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response["Body"].read().decode("utf-8"))
+
+
+def fetch_common_data_version(s3_client, bucket, manifest, directory):
+    """
+    The CommonDataStore for the manifest's version, built on local disk if it isn't there yet:
+    the snapshot downloaded, then each delta merged in turn.
+    """
+    snapshot = manifest["snapshot"]
+    path = version_path(directory, snapshot["version"])
+    ensure_local_file(path, lambda temp_path: s3_client.download_file(Bucket=bucket, Key=snapshot["key"], Filename=temp_path))
+    version = snapshot["version"]
+
+    for delta in manifest["deltas"]:
+        if delta["base_version"] != version:
+            raise ValueError("delta {} is on {}, not {}".format(delta["version"], delta["base_version"], version))
+        base_path = path
+        path = version_path(directory, delta["version"])
+
+        def merge(temp_path, base_path=base_path, delta=delta):
+            delta_path = temp_path + ".delta"
+            s3_client.download_file(Bucket=bucket, Key=delta["key"], Filename=delta_path)
+            try:
+                delta_store = CommonDataStore(delta_path)
+                merged = apply_delta(CommonDataStore(base_path).to_common_data_dict(), delta_store.to_common_data_dict(),
+                                     delta_store.meta["removed"])
+                write_common_data_store(merged, temp_path, meta={"data_version": delta["version"]})
+            finally:
+                os.remove(delta_path)
+
+        ensure_local_file(path, merge)
+        version = delta["version"]
+    return CommonDataStore(path)
+
+
+def publish_common_data(s3_client, bucket, data, directory, prefix=manifest_prefix, version=None,
+                        max_deltas=default_max_deltas, max_delta_fraction=default_max_delta_fraction):
+    """
+    Publishes data as a new version: a delta on the current version when only some issns changed,
+    a full snapshot otherwise.  The new version is left built in directory.  Returns the manifest.
+    """
+    version = version or new_version_id()
+    path = version_path(directory, version)
+    write_common_data_store(data, path, meta={"data_version": version})
+    new_store = CommonDataStore(path)
+    new = new_store.to_common_data_dict()
+
+    manifest = read_manifest(s3_client, bucket, prefix)
+    if manifest and len(manifest["deltas"]) < max_deltas:
+        old = fetch_common_data_version(s3_client, bucket, manifest, directory).to_common_data_dict()
+        if get_download_curve_settings(old) == get_download_curve_settings(new):
+            (changed, removed) = diff_common_data(old, new)
+            changed_issns = set()
+            for name in changed:
+                changed_issns.update(changed[name])
+                changed_issns.update(removed[name])
+            if len(changed_issns) <= max_delta_fraction * len(new_store.issn_ls):
+                print("publishing {} as a delta, {} issns changed".format(version, len(changed_issns)))
+                delta_path = path + ".delta"
+                write_common_data_store(common_data_from_tables(changed, get_download_curve_settings(new)), delta_path,
+                                        meta={"data_version": version, "base_version": manifest["version"], "removed": removed})
+                key = "{}{}.delta.store".format(prefix, version)
+                s3_client.upload_file(Filename=delta_path, Bucket=bucket, Key=key)
+                os.remove(delta_path)
+                manifest = {"version": version,
+                            "snapshot": manifest["snapshot"],
+                            "deltas": manifest["deltas"] + [{"version": version, "base_version": manifest["version"], "key": key}]}
+                s3_client.put_object(Bucket=bucket, Key=prefix + "manifest.json", Body=json.dumps(manifest).encode("utf-8"))
+                return manifest
+
+    print("publishing {} as a snapshot".format(version))
+    key = "{}{}.store".format(prefix, version)
+    s3_client.upload_file(Filename=path, Bucket=bucket, Key=key)
+    manifest = {"version": version, "snapshot": {"version": version, "key": key}, "deltas": []}
+    s3_client.put_object(Bucket=bucket, Key=prefix + "manifest.json", Body=json.dumps(manifest).encode("utf-8"))
+    return manifest
+
+
+class CommonDataNotLoaded(Exception):
+    pass
+
+
+class CommonDataHolder(object):
+    """
+    The common data a process is using, and its version.  A new version is swapped in whole, so
+    whoever has read current keeps one consistent version however long they hold it.
+    """
+
+    def __init__(self):
+        self.current = (None, None)
+        self.loaded = threading.Event()
+        # why the last try at loading the first version failed, for the error get() raises
+        self.last_error = None
+
+    def get(self, timeout=None):
+        """
+        (version, common data dict), waiting up to timeout seconds for the first version to load.
+        Raises CommonDataNotLoaded if it still hasn't.
+        """
+        if not self.loaded.wait(timeout):
+            raise CommonDataNotLoaded("common data not loaded after {} seconds.  Last error: {}".format(
+                timeout, self.last_error))
+        return self.current
+
+    @property
+    def version(self):
+        return self.current[0]
+
+    def swap(self, version, data):
+        self.current = (version, data)
+        self.loaded.set()
+
+
+def refresh_common_data(holder, s3_client, bucket, directory, prefix=manifest_prefix):
+    """Swaps the published version into holder if it isn't the one there already.  Returns whether it did."""
+    manifest = read_manifest(s3_client, bucket, prefix)
+    if manifest is None or manifest["version"] == holder.version:
+        return False
+    store = fetch_common_data_version(s3_client, bucket, manifest, directory)
+    holder.swap(manifest["version"], store.to_common_data_dict())
+    print("common data now version {}".format(manifest["version"]))
+    prune_common_data_versions(directory, manifest)
+    return True
+
+
+def load_common_data(holder, fetch, retry_seconds=5, max_retry_seconds=300, stop=None):
+    """
+    Swaps fetch()'s (version, data) into holder, retrying with exponential backoff until it
+    works or stop is set.  Returns whether it loaded.
+    """
+    stop = stop or threading.Event()
+    delay = retry_seconds
+    while not stop.is_set():
+        try:
+            (version, data) = fetch()
+            holder.swap(version, data)
+            holder.last_error = None
+            return True
+        except Exception as e:
+            holder.last_error = "{}: {}".format(e.__class__.__name__, e)
+            print("couldn't load common data, retrying in {} seconds.  Error message: ".format(delay), e)
+        if stop.wait(delay):
+            break
+        delay = min(delay * 2, max_retry_seconds)
+    return False
+
+
+def watch_common_data(holder, s3_client, bucket, directory, interval, prefix=manifest_prefix, stop=None):
+    """Checks for a new version every interval seconds until stop is set, for a background thread."""
+    stop = stop or threading.Event()
+    while not stop.wait(interval):
+        try:
+            refresh_common_data(holder, s3_client, bucket, directory, prefix)
+        except Exception as e:
+            print("couldn't refresh common data.  Error message: ", e)
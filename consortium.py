@@ -12,11 +12,11 @@ import simplejson as json
 from simplejson import dumps
 from psycopg2 import sql
 from psycopg2.extras import execute_values
-from kids.cache import cache
 
 from app import app
 from app import get_db_cursor
 from app import reset_cache
+from app import invalidatable_cache
 from consortium_journal import ConsortiumJournal
 from package import Package
 from util import elapsed
@@ -30,6 +30,7 @@ from util import cursor_rows_to_dicts
 # team+dev@ourresearch.org
 
 from app import memorycache
+from single_flight import SingleFlight
 
 # NO CACHE FOR NOW @memorycache
 def get_latest_member_institutions_raw(scenario_id):
@@ -47,15 +48,37 @@ def get_latest_member_institutions_raw(scenario_id):
 
     return scenario_members
 
-@cache
+@invalidatable_cache
 def get_consortium_ids():
     # consortium_ids is a materialized view
     with get_db_cursor() as cursor:
         cursor.execute("select * from consortium_ids")
         return cursor.fetchall()
 
+def reset_consortium_caches(consortium_package_id=None, member_package_ids=()):
+    """
+    Evicts the cached consortium lookups for these packages, on every worker and in the shared
+    cache, which outlives restarts.  For scripts that add packages to jump_account_package or
+    members to jump_consortium_members.
+    """
+    reset_cache("consortium", "get_consortium_ids")
+    if consortium_package_id:
+        reset_cache("scenario", "get_consortium_package_ids", consortium_package_id)
+        reset_cache("scenario", "get_parent_consortium_package_id", consortium_package_id)
+    for member_package_id in member_package_ids:
+        reset_cache("scenario", "get_parent_consortium_package_id", member_package_id)
+
+
+# the requests a consortium dashboard makes at once share one load of its computed data
+consortium_data_loads = SingleFlight()
 
 def consortium_get_computed_data(scenario_id):
+    rows = consortium_data_loads.do(scenario_id, lambda: consortium_get_computed_data_from_db(scenario_id))
+    # each caller gets its own row dicts, because callers add to them
+    return [row.copy() for row in rows]
+
+
+def consortium_get_computed_data_from_db(scenario_id):
     start_time = time()
     command = """select 
                     member_package_id, scenario_id, updated, issn_l, usage, cpu, package_id, consortium_name, institution_name, institution_short_name, institution_id, subject, era_subjects, is_society_journal, subscription_cost, ill_cost, use_instant_for_debugging, use_social_networks, use_oa, use_backfile, use_subscription, use_other_delayed, use_ill, perpetual_access_years, baseline_access, use_social_networks_percent, use_green_percent, use_hybrid_percent, use_bronze_percent, use_peer_reviewed_percent, bronze_oa_embargo_months, is_hybrid_2019, downloads, citations, authorships
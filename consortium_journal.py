@@ -32,6 +32,9 @@ from journal import Journal
 
 class ConsortiumJournal(Journal):
     years = list(range(0, 5))
+    # Journal works these out from its scenario's engine, there isn't one here
+    use_default_download_curve = False
+    cpu_rank = None
 
     def __init__(self, issn_l, included_package_ids, all_member_data, is_jisc, package):
         start_time = time()
@@ -42,8 +45,9 @@ class ConsortiumJournal(Journal):
         self.meta_data = self.member_data[0]
         self.subscribed_bulk = False
         self.subscribed_custom = False
-        self.use_default_download_curve = False
+        self.subscription_state = None
         self.my_package = package
+        self._journal_metadata = None
         # print ".",
 
     @cached_property
@@ -7,6 +7,7 @@ from app import db
 from app import logger
 from app import get_db_cursor
 from package_input import PackageInput
+from package_data_version import bump_package_data_version
 from psycopg2.extensions import AsIs
 
 class Counter(db.Model):
@@ -266,6 +267,7 @@ class CounterInput(db.Model, PackageInput):
                 self.sql_delete(cursor, command_delete_report, self.destination_table(), package_id, report_name)
                 self.sql_delete(cursor, command_delete, 'jump_raw_file_upload_object', package_id, self.calculate_file_type_label(report_name))
 
+        bump_package_data_version(package_id)
         from package import Package
         my_package = db.session.query(Package).filter(Package.package_id == package_id).scalar()
         if my_package:
@@ -11,7 +11,7 @@ from app import get_db_cursor
 from saved_scenario import SavedScenario
 from saved_scenario import save_raw_scenario_to_db
 from util import safe_commit
-from consortium import Consortium, get_consortium_ids
+from consortium import Consortium, get_consortium_ids, reset_consortium_caches
 from package import Package
 from saved_scenario import save_raw_member_institutions_included_to_db
 
@@ -220,6 +220,8 @@ def create_consortial_package(institution, pkgid, pkgidprefix, pkgname, currency
 	click.echo("Inserting feeder pkg ids into jump_consortium_members table")
 	assoc_feeder_pkgs(institution, consortium_package_id, feedids)
 
+	reset_consortium_caches(consortium_package_id, feedids)
+
 	click.echo("Recomputing the consortium")
 	recompute_consortium(consortium_package_id)
 
@@ -0,0 +1,37 @@
+# coding: utf-8
+
+# The parts of a Package that a Scenario and its journals read, copied off the ORM object.
+#
+# Scenarios are shared between requests (saved_scenario.scenario_builds), and a Package from
+# Package.query belongs to the db.session of the request that built the scenario, which is
+# closed when that request ends.  Anything still to be loaded from it after that raises
+# DetachedInstanceError in whichever request reads it.  So everything is read here, up front,
+# while the session is still open, and nothing goes back to the ORM object afterwards.
+
+
+class DetachedPackage(object):
+    """A Package's columns, issns and journal metadata, read once and with no session behind them."""
+
+    column_names = ["package_id", "institution_id", "publisher", "package_name", "consortium_package_id",
+                    "is_demo", "big_deal_cost", "big_deal_cost_increase", "currency"]
+
+    def __init__(self, package):
+        for name in self.column_names:
+            setattr(self, name, getattr(package, name))
+        self.unique_issns = list(package.unique_issns)
+        self.journal_metadata = dict(package.journal_metadata)
+        self.journal_metadata_flat = dict(package.journal_metadata_flat)
+
+    @property
+    def is_demo_account(self):
+        return self.package_id.startswith("demo")
+
+    def get_journal_metadata(self, issn):
+        journal_meta = self.journal_metadata_flat.get(issn, None)
+        if not journal_meta:
+            from openalex import MissingJournalMetadata
+            journal_meta = MissingJournalMetadata(issn_l=issn)
+        return journal_meta
+
+    def __repr__(self):
+        return "<{} ({}) {}>".format(self.__class__.__name__, self.package_id, self.package_name)
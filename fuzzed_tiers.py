@@ -0,0 +1,48 @@
+# coding: utf-8
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+fuzzed_labels = np.array(["low", "medium", "high"], dtype=object)
+
+
+def rank_first(values):
+    """
+    Ranks down each column of a journal x metric matrix, like pandas rank(method="first", na_option="keep"):
+    1 for the smallest, ties ranked in row order, nan where the value is nan.
+    """
+    values = np.asarray(values, dtype=float)
+    # a stable sort keeps ties in row order, and puts nans last
+    order = np.argsort(values, axis=0, kind="stable")
+    ranks = np.empty(values.shape)
+    np.put_along_axis(ranks, order, np.arange(1, len(values) + 1, dtype=float)[:, np.newaxis], axis=0)
+    ranks[np.isnan(values)] = np.nan
+    return ranks
+
+
+@lru_cache(maxsize=None)
+def tiers_for_ranks(num_ranked):
+    # ranks are always 1..num_ranked, so which third each falls in only depends on how many there are.
+    # pandas works that out, once per count, so the edges are exactly its own
+    return pd.qcut(np.arange(1, num_ranked + 1), 3, labels=False)
+
+
+def fuzzed_tiers(values):
+    """
+    "low", "medium" or "high" third for each value of a journal x metric matrix, column by column, the
+    same as pandas qcut(3) of the rank("first") values.  Rows with a nan value get nan, and a column
+    with fewer than two values gets "-" all the way down.
+    """
+    ranks = rank_first(values)
+    response = np.full(ranks.shape, np.nan, dtype=object)
+    for column in range(ranks.shape[1]):
+        ranked = ~np.isnan(ranks[:, column])
+        num_ranked = int(np.sum(ranked))
+        if num_ranked < 2:
+            response[:, column] = "-"
+            continue
+        tiers = tiers_for_ranks(num_ranked)
+        response[ranked, column] = fuzzed_labels[tiers[ranks[ranked, column].astype(int) - 1]]
+    return response
@@ -13,6 +13,8 @@ import argparse
 from app import db
 from app import get_db_cursor
 from consortium import Consortium
+from consortium import reset_consortium_caches
+from scenario import reset_apc_data_cache
 from package import Package
 from saved_scenario import SavedScenario
 from saved_scenario import save_raw_scenario_to_db
@@ -102,6 +104,11 @@ def copy_package(old_package_id, new_package_id, new_institution_id):
     print(command)
     with get_db_cursor() as cursor:
         cursor.execute(command)
+        cursor.execute("select consortium_package_id from jump_account_package where package_id = %s", (new_package_id,))
+        rows = cursor.fetchall()
+    # the new package joins the old one's consortium, if it's in one
+    reset_consortium_caches(rows[0]["consortium_package_id"] if rows else None, [new_package_id])
+    reset_apc_data_cache(new_package_id)
 
 
 def copy_institution(old_institution_id, new_institution_id, publisher=None, old_package_ids=None):
@@ -177,6 +184,7 @@ def consortium_package_create(consortium_institution_id, consortium_package_disp
 
     db.session.add(my_scenario)
     safe_commit(db)
+    reset_consortium_caches(consortium_package_id)
     print(("made consortium package {} and scenario {}".format(my_package, my_scenario)))
 
     dict_to_save = my_scenario.to_dict_saved_from_db()
@@ -265,6 +273,8 @@ if __name__ == "__main__":
     # save_raw_member_institutions_included_to_db(consortium_scenario_id, member_package_ids, None)
 
 
+    reset_consortium_caches(consortium_package_id)
+
     # now kick off the computing
     print("recomputing")
     new_consortia = Consortium(consortium_scenario_id)
@@ -11,7 +11,8 @@ from app import get_db_cursor
 from saved_scenario import SavedScenario
 from saved_scenario import save_raw_scenario_to_db
 from util import safe_commit
-from consortium import Consortium, get_consortium_ids
+from consortium import Consortium, get_consortium_ids, reset_consortium_caches
+from scenario import reset_apc_data_cache
 from package import Package
 from saved_scenario import save_raw_member_institutions_included_to_db
 
@@ -153,6 +154,7 @@ def copy_package(old_package_id, new_package_id):
 	""".format(new_package_id=new_package_id, old_package_id=old_package_id)
 	with get_db_cursor() as cursor:
 		cursor.execute(command)
+	reset_apc_data_cache(new_package_id)
 
 # Copy counter, pta and price data for the new feeder packages
 def copy_pkgs_data(pkg_ids, feed_ids):
@@ -226,6 +228,8 @@ def create_consortium(publisher, pkgid, pkgidprefix):
 	click.echo("Inserting feeder pkg ids into jump_consortium_members table")
 	assoc_feeder_pkgs(publisher, consortium_package_id, feedids)
 
+	reset_consortium_caches(consortium_package_id, feedids)
+
 	click.echo("Recomputing the consortium")
 	recompute_consortium(consortium_package_id)
 
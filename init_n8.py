@@ -24,6 +24,8 @@ from saved_scenario import get_latest_scenario_raw
 from n8_uni_result import N8UniResult
 from util import safe_commit
 from util import get_sql_answer
+from package_data_version import bump_package_data_version
+from scenario import reset_apc_data_cache
 from change_subs import issn_to_issnl
 
 # JUSP IDs for which we do not want to re-create their pkgs using the --createpkgs and the package_create() method
@@ -112,6 +114,9 @@ def copy_into_n8_package(old_package_id, new_package_id, copy_counter=True, copy
     print(command)
     with get_db_cursor() as cursor:
         cursor.execute(command)
+    # the package's data was replaced, so its cached data, core list and apc data are stale
+    bump_package_data_version(new_package_id)
+    reset_apc_data_cache(new_package_id)
 
 
 
@@ -0,0 +1,86 @@
+# coding: utf-8
+
+# ISSN -> ISSN-L lookups, from openalex_computed_flat (one row per issn, with its issn_l).
+#
+# Uploads resolve each ISSN column against the journals we know in one resolve() call, dict
+# lookups here instead of scans of a list of ~100k issns.  An ISSN we don't know gets its check
+# digit checked, so normalize_issn can tell a mistyped ISSN (invalid_issn) from one that's just
+# not in OpenAlex (unknown_issn).
+
+import re
+import sys
+
+issn_pattern = re.compile(r"^(\d{4})-?(\d{3}[\dX])$")
+
+
+def clean_issn(issn):
+    """issn as XXXX-XXXX, upper case, without an "issn:" prefix or whitespace; None if it isn't shaped like one."""
+    if not issn:
+        return None
+    issn = re.sub(r"\s", "", issn.replace("issn:", "")).upper()
+    match = issn_pattern.match(issn)
+    if not match:
+        return None
+    return "{}-{}".format(match.group(1), match.group(2))
+
+
+def issn_check_digit(first_seven_digits):
+    """The check digit for the first seven digits of an ISSN: weights 8 down to 2, mod 11, 10 is X."""
+    total = sum((8 - i) * int(digit) for (i, digit) in enumerate(first_seven_digits))
+    check = (11 - total % 11) % 11
+    return "X" if check == 10 else str(check)
+
+
+def is_valid_issn(issn):
+    """Whether issn is shaped like an ISSN and its check digit adds up."""
+    issn = clean_issn(issn)
+    if issn is None:
+        return False
+    digits = issn.replace("-", "")
+    return issn_check_digit(digits[:7]) == digits[7]
+
+
+class IssnResolver(object):
+    """
+    The issns we know and the issn_l of each.  Every issn_l is also its own issn.  Lookups take
+    raw issns, cleaned the way uploads clean them.
+    """
+
+    def __init__(self, issn_to_issn_l):
+        self.issn_to_issn_l = {}
+        for (issn, issn_l) in issn_to_issn_l.items():
+            # lots of issns share an issn_l, so share the string too
+            issn_l = sys.intern(issn_l)
+            self.issn_to_issn_l[issn] = issn_l
+            self.issn_to_issn_l.setdefault(issn_l, issn_l)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """From (issn, issn_l) rows, as from select issn, issn_l from openalex_computed_flat."""
+        return cls(dict((issn, issn_l) for (issn, issn_l) in rows if issn and issn_l))
+
+    def __contains__(self, issn):
+        return issn in self.issn_to_issn_l or clean_issn(issn) in self.issn_to_issn_l
+
+    def __len__(self):
+        return len(self.issn_to_issn_l)
+
+    def issn_l(self, issn, default=None):
+        """The issn_l for issn, or default if we don't know it."""
+        issn_l = self.issn_to_issn_l.get(issn, None)
+        if issn_l is None:
+            issn_l = self.issn_to_issn_l.get(clean_issn(issn), default)
+        return issn_l
+
+    def resolve(self, issns):
+        """The issn_l of each of issns, in order, with None for the ones we don't know."""
+        lookup = self.issn_to_issn_l.get
+        return [lookup(issn, None) or lookup(clean_issn(issn), None) for issn in issns]
+
+    def resolve_dict(self, issns):
+        """issn -> issn_l for the issns we know."""
+        return dict((issn, issn_l) for (issn, issn_l) in zip(issns, self.resolve(issns)) if issn_l is not None)
+
+    @property
+    def issn_ls(self):
+        return set(self.issn_to_issn_l.values())
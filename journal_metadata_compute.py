@@ -0,0 +1,115 @@
+# coding: utf-8
+
+# The columns of openalex_computed for every journal in openalex_journals at once, as DataFrame
+# operations, for recompute_journal_metadata.  The same values it used to work out one
+# JournalMetadata at a time: currently publishing if the last DOI is under a year old (or, with
+# no last DOI row, if it has works in this_year_ish), gold if OA or in DOAJ, a current
+# subscription journal if publishing and not gold, and prices from journalsdb_computed.
+
+import csv
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from journal_metadata_store import parse_issns
+from journal_metadata_store import safer_json_decode
+from util import sql_escape_string
+
+raw_columns = ["issn_l", "issn", "display_name", "is_oa", "is_in_doaj", "publisher", "counts_by_year"]
+last_doi_columns = ["issn_l", "date_last_doi"]
+pricing_columns = ["issn_l", "subscription_price_usd", "subscription_price_gbp", "apc_price_usd", "apc_price_gbp"]
+
+computed_columns = ["created", "issn_l", "issns_string", "title", "publisher", "is_current_subscription_journal",
+                    "is_gold_journal_in_most_recent_year", "is_currently_publishing", "subscription_price_usd",
+                    "subscription_price_gbp", "apc_price_usd", "apc_price_gbp"]
+
+# issn_l -> publisher, where the openalex publisher is wrong
+publisher_overrides = {"2058-5276": "Springer Nature"}
+# issn_ls that are currently publishing whatever the metadata says
+# TODO: Scientific American, take out when fixed in metadata
+always_publishing_issn_ls = ["0036-8733"]
+
+
+def has_works_in_year(counts_by_year, year):
+    """Whether openalex_journals.counts_by_year (json) has any works in year."""
+    if not counts_by_year:
+        return False
+    for row in safer_json_decode(counts_by_year):
+        if row["year"] == year and row["works_count"] > 0:
+            return True
+    return False
+
+
+def compute_journal_metadata(raw_df, last_dois_df, pricing_df, now, year):
+    """
+    The openalex_computed rows, in computed_columns, for raw_df (openalex_journals in
+    raw_columns).  last_dois_df is openalex_date_last_doi and pricing_df is journalsdb_computed;
+    where an issn_l has more than one row in either, the last one counts.  now is the time the
+    recompute started, and year is this_year_ish().  Journals with no issns are left out.
+    """
+    df = raw_df[raw_columns].copy()
+    df["issns"] = df["issn"].map(parse_issns)
+    df = df.loc[df["issns"].map(len) > 0]
+
+    last_dois = last_dois_df[last_doi_columns].drop_duplicates("issn_l", keep="last")
+    pricing = pricing_df[pricing_columns].drop_duplicates("issn_l", keep="last")
+    df = df.merge(last_dois, on="issn_l", how="left", indicator="has_last_doi")
+    df = df.merge(pricing, on="issn_l", how="left")
+    # merges turn missing text into NaN; the per-journal code had None
+    for column in ["display_name", "publisher", "counts_by_year"]:
+        df[column] = df[column].astype(object).where(df[column].notna(), None)
+
+    has_last_doi = (df["has_last_doi"] == "both").to_numpy()
+    date_last_doi = pd.to_datetime(df["date_last_doi"], format="%Y-%m-%d", errors="coerce")
+    recent_last_doi = ((now - date_last_doi).dt.days < 365).to_numpy()
+    without_last_doi = np.flatnonzero(~has_last_doi)
+    works_this_year = np.zeros(len(df), dtype=bool)
+    # counts_by_year is json, so this part is a loop, but only over the journals with no last DOI row
+    counts_by_year = df["counts_by_year"].to_numpy()[without_last_doi]
+    works_this_year[without_last_doi] = [has_works_in_year(counts, year) for counts in counts_by_year]
+
+    is_currently_publishing = np.where(has_last_doi, recent_last_doi, works_this_year)
+    is_currently_publishing |= df["issn_l"].isin(always_publishing_issn_ls).to_numpy()
+    is_gold = (df["is_oa"].eq(True) | df["is_in_doaj"].eq(True)).to_numpy()
+
+    publisher = df["issn_l"].map(publisher_overrides).fillna(df["publisher"]).astype(object)
+    response = pd.DataFrame({
+        "created": now.isoformat(),
+        "issn_l": df["issn_l"].to_numpy(),
+        "issns_string": df["issn"].to_numpy(),
+        "title": [sql_escape_string(title) for title in df["display_name"]],
+        "publisher": [sql_escape_string(value) for value in publisher.where(publisher.notna(), None)],
+        "is_current_subscription_journal": is_currently_publishing & ~is_gold,
+        "is_gold_journal_in_most_recent_year": is_gold,
+        "is_currently_publishing": is_currently_publishing,
+    })
+    for column in pricing_columns[1:]:
+        response[column] = df[column].to_numpy()
+    return response[computed_columns]
+
+
+def write_csv(df, path):
+    """df as a csv for a redshift copy: no header, booleans as true/false and missing values empty."""
+    df = df.copy()
+    for column in df.columns:
+        if df[column].dtype == bool:
+            df[column] = np.where(df[column], "true", "false")
+    df.to_csv(path, header=False, index=False, quoting=csv.QUOTE_MINIMAL, na_rep="")
+    return path
+
+
+class StageReport(object):
+    """How many rows each stage of a recompute handled and how fast."""
+
+    def __init__(self):
+        self.stages = []
+
+    def done(self, name, num_rows, start_time):
+        seconds = max(time() - start_time, 1e-6)
+        self.stages.append((name, num_rows, seconds))
+        print("{}: {} rows in {} seconds ({} rows/second)".format(name, num_rows, round(seconds, 2), int(num_rows / seconds)))
+
+    def summary(self):
+        return [{"stage": name, "rows": num_rows, "seconds": round(seconds, 2), "rows_per_second": int(num_rows / seconds)}
+                for (name, num_rows, seconds) in self.stages]
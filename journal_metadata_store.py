@@ -0,0 +1,224 @@
+# coding: utf-8
+
+# Journal metadata (openalex_computed) as small read-only records, instead of a JournalMetadata
+# ORM object per journal expunged from the session at import.
+#
+# Each record has __slots__ and its issns already parsed, and the publishers (a few thousand
+# strings over ~100k journals) are interned so the records share them.  The store indexes the
+# records by issn_l and by every issn, and keeps is_current_subscription_journal as an array by
+# record position, so a package's journals are filtered in one step.  It can be written to a
+# snapshot file, one list per column, so a process can load it without going to the database.
+
+import ast
+import json
+import os
+import pickle
+import sys
+
+import numpy as np
+
+from jisc_utils import jisc_default_prices
+
+FORMAT_VERSION = 1
+
+columns = ["issn_l", "issns", "title", "publisher", "is_current_subscription_journal",
+           "is_gold_journal_in_most_recent_year", "is_currently_publishing",
+           "subscription_price_usd", "subscription_price_gbp", "apc_price_usd", "apc_price_gbp"]
+
+
+def safer_json_decode(json_str):
+    # some of the openalex json columns are python literals
+    try:
+        return json.loads(json_str)
+    except ValueError:
+        return ast.literal_eval(json_str)
+
+
+def parse_issns(issns_string):
+    """The list of issns in openalex_computed.issns_string."""
+    if not issns_string:
+        return []
+    return safer_json_decode(issns_string)
+
+
+def publisher_code(publisher):
+    """The short name we use for the big publishers, or publisher itself."""
+    if publisher == "Elsevier":
+        return "Elsevier"
+    elif publisher == "Springer Nature":
+        return "SpringerNature"
+    elif publisher == "Wiley":
+        return "Wiley"
+    elif publisher == "SAGE":
+        return "Sage"
+    elif publisher == "Taylor & Francis":
+        return "TaylorFrancis"
+    return publisher
+
+
+class JournalMetadataMethods(object):
+    """
+    What JournalMetadataRecord and the openalex.JournalMetadata model both work out from the
+    openalex_computed columns.  Needs issn_l, issns, title, publisher, the gold flag and the prices.
+    """
+
+    __slots__ = ()
+
+    @property
+    def display_issns(self):
+        return ",".join(self.issns)
+
+    @property
+    def display_issn_l(self):
+        return "issn:{}".format(self.issn_l)
+
+    @property
+    def is_hybrid(self):
+        return not self.is_gold_journal_in_most_recent_year
+
+    @property
+    def publisher_code(self):
+        return publisher_code(self.publisher)
+
+    def get_subscription_price(self, currency="USD", use_high_price_if_unknown=False):
+        response = None
+        if currency == "USD":
+            if self.subscription_price_usd:
+                response = float(self.subscription_price_usd)
+        elif currency == "GBP":
+            if self.subscription_price_gbp:
+                response = float(self.subscription_price_gbp)
+
+        if not response:
+            if use_high_price_if_unknown and currency == "GBP":
+                response = jisc_default_prices(self.publisher_code)
+
+        return response
+
+    def get_apc_price(self, currency="USD"):
+        response = None
+        if currency == "USD":
+            if self.apc_price_usd:
+                response = float(self.apc_price_usd)
+        elif currency == "GBP":
+            if self.apc_price_gbp:
+                response = float(self.apc_price_gbp)
+        return response
+
+    def __repr__(self):
+        return "<{} ({}) '{}' {}>".format(self.__class__.__name__, self.issn_l, self.title, self.publisher)
+
+
+class JournalMetadataRecord(JournalMetadataMethods):
+    """The parts of a JournalMetadata that packages and scenarios read, without the ORM."""
+
+    __slots__ = columns
+
+    def __init__(self, **kwargs):
+        for column in columns:
+            setattr(self, column, kwargs.get(column, None))
+
+
+class JournalMetadataStore(object):
+    """Journal metadata records by issn_l, and by any of their issns."""
+
+    def __init__(self, records, version=None):
+        self.version = version
+        self.by_issn_l = {}
+        self.by_issn = {}
+        for record in records:
+            self.by_issn_l[record.issn_l] = record
+            for issn in record.issns:
+                self.by_issn[issn] = record
+        self.records = list(self.by_issn_l.values())
+        self.positions = dict((record.issn_l, position) for (position, record) in enumerate(self.records))
+        self.is_current = np.array([bool(record.is_current_subscription_journal) for record in self.records], dtype=bool)
+
+    @classmethod
+    def from_rows(cls, rows, version=None):
+        """
+        From openalex_computed rows, with issns_string where the records have issns.  Journals
+        without any issns are left out, like recompute_journal_metadata leaves them out.
+        """
+        records = []
+        for row in rows:
+            values = dict((column, row[column]) for column in columns if column != "issns")
+            values["issns"] = parse_issns(row["issns_string"])
+            if values["publisher"] is not None:
+                values["publisher"] = sys.intern(values["publisher"])
+            if values["issns"]:
+                records.append(JournalMetadataRecord(**values))
+        return cls(records, version=version)
+
+    def __len__(self):
+        return len(self.by_issn_l)
+
+    def __contains__(self, issn_l):
+        return issn_l in self.by_issn_l
+
+    def __iter__(self):
+        return iter(self.by_issn_l)
+
+    def get(self, issn_l, default=None):
+        return self.by_issn_l.get(issn_l, default)
+
+    def get_by_issn(self, issn, default=None):
+        return self.by_issn.get(issn, default)
+
+    def items(self):
+        return self.by_issn_l.items()
+
+    def values(self):
+        return self.by_issn_l.values()
+
+    def positions_of(self, issn_ls):
+        """Position of each of issn_ls in self.records, -1 for the ones that aren't in the store."""
+        lookup = self.positions.get
+        return np.fromiter((lookup(issn_l, -1) for issn_l in issn_ls), dtype=np.int64, count=len(issn_ls))
+
+    def current_subscription_journals(self, issn_ls):
+        """issn_l -> record for those of issn_ls that are current subscription journals."""
+        positions = self.positions_of(issn_ls)
+        positions = positions[positions >= 0]
+        positions = positions[self.is_current[positions]]
+        return dict((self.records[position].issn_l, self.records[position]) for position in positions.tolist())
+
+    def issn_to_issn_l(self):
+        """issn -> issn_l for every issn we have, the same pairs as openalex_computed_flat."""
+        return dict((issn, record.issn_l) for (issn, record) in self.by_issn.items())
+
+    def write_snapshot(self, path):
+        """Writes the store to path, as a list per column.  Atomic, so readers never see half a file."""
+        records = self.records
+        snapshot = {
+            "format": FORMAT_VERSION,
+            "version": self.version,
+            "columns": dict((column, [getattr(record, column) for record in records]) for column in columns),
+        }
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def read_snapshot(cls, path):
+        """The store written to path by write_snapshot, or None if there isn't a readable one."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            print("couldn't read journal metadata snapshot {}.  Error message: ".format(path), e)
+            return None
+        if snapshot.get("format", None) != FORMAT_VERSION:
+            return None
+
+        snapshot_columns = snapshot["columns"]
+        publishers = [sys.intern(publisher) if publisher is not None else None for publisher in snapshot_columns["publisher"]]
+        records = []
+        for (i, publisher) in enumerate(publishers):
+            values = dict((column, snapshot_columns[column][i]) for column in columns)
+            values["publisher"] = publisher
+            records.append(JournalMetadataRecord(**values))
+        return cls(records, version=snapshot["version"])
@@ -19,8 +19,8 @@ class JournalPrice(db.Model):
 
     @cached_property
     def journal_metadata(self):
-        from openalex import MissingJournalMetadata, all_journal_metadata
-        meta = all_journal_metadata.get(self.issn_l)
+        from openalex import MissingJournalMetadata, get_journal_metadata_store
+        meta = get_journal_metadata_store().get(self.issn_l)
         if not meta:
             meta = MissingJournalMetadata(issn_l=self.issn_l)
         return meta
@@ -0,0 +1,166 @@
+# coding: utf-8
+
+# The store behind app.memorycache: an LRU with a memory budget and an optional time to live.
+# Keys are hashed, so a long key (a whole issn list, say) doesn't sit in memory with the entry.
+# Entry sizes are estimated once, when they're stored, by walking the value.
+
+import hashlib
+import sys
+import threading
+import types
+from collections import OrderedDict
+from time import time
+
+import numpy as np
+
+
+def approximate_size(value):
+    """
+    Roughly how many bytes value takes, counting what it refers to: containers and their items,
+    object attributes, and the data of numpy arrays that own it.  Views onto memory-mapped arrays
+    count for nothing, because that memory is the page cache's.
+    """
+    seen = set()
+    total = 0
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+            # shared by everything, not part of the value
+            continue
+        if isinstance(item, np.ndarray):
+            total += sys.getsizeof(item) if item.base is None else 64
+            continue
+        total += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            if hasattr(item, "__dict__"):
+                stack.append(item.__dict__)
+            for name in getattr(type(item), "__slots__", []):
+                if hasattr(item, name):
+                    stack.append(getattr(item, name))
+    return total
+
+
+def hash_key(key):
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+class MemoryCache(object):
+    """
+    A thread-safe LRU dict with a budget in bytes and entries that expire after ttl seconds
+    (never if ttl is None).  The least recently used entries go first when a new one doesn't fit.
+    Counts hits, misses and evictions, for stats().
+    """
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # hashed key -> (value, size, stored at, group)
+        self.entries = OrderedDict()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.too_big = 0
+
+    def remove(self, hashed_key):
+        (value, size, stored, group) = self.entries.pop(hashed_key)
+        self.num_bytes -= size
+
+    def get(self, key, default=None):
+        hashed_key = hash_key(key)
+        with self.lock:
+            entry = self.entries.get(hashed_key, None)
+            if entry is not None and self.ttl is not None and time() - entry[2] > self.ttl:
+                self.remove(hashed_key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self.entries.move_to_end(hashed_key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, group=None):
+        size = approximate_size(value)
+        hashed_key = hash_key(key)
+        with self.lock:
+            if hashed_key in self.entries:
+                self.remove(hashed_key)
+            if size > self.max_bytes:
+                self.too_big += 1
+                return
+            while self.entries and self.num_bytes + size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+            self.entries[hashed_key] = (value, size, time(), group)
+            self.num_bytes += size
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __getitem__(self, key):
+        value = self.get(key, None)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        with self.lock:
+            return hash_key(key) in self.entries
+
+    def __delitem__(self, key):
+        with self.lock:
+            self.remove(hash_key(key))
+
+    def pop(self, key, default=None):
+        with self.lock:
+            hashed_key = hash_key(key)
+            if hashed_key not in self.entries:
+                return default
+            value = self.entries[hashed_key][0]
+            self.remove(hashed_key)
+            return value
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.num_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            by_group = {}
+            for (value, size, stored, group) in self.entries.values():
+                group_stats = by_group.setdefault(group or "other", {"entries": 0, "bytes": 0})
+                group_stats["entries"] += 1
+                group_stats["bytes"] += size
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.num_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / float(lookups), 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "too_big": self.too_big,
+                "by_function": by_group,
+            }
@@ -1,32 +1,36 @@
 # coding: utf-8
-import ast
 import datetime
 import argparse
+import os
+import tempfile
+import threading
 import simplejson as json
 from kids.cache import cache
 from cached_property import cached_property
 from time import time
-from psycopg2 import sql
-from psycopg2.extras import execute_values
+import pandas as pd
+import shortuuid
+from sqlalchemy.sql import text
 from enum import Enum
 
-from simplejson import JSONDecodeError
-
 from app import db
 from app import get_db_cursor
+from app import s3_client
 from util import elapsed
 from util import chunks
-from util import sql_bool
-from util import sql_escape_string
-from journalsdb_pricing import jdb_pricing
-from jisc_utils import jisc_default_prices
-from openalex_date_last_doi import OpenalexDateLastDOI
-
-def safer_json_decode(json_str):
-    try:
-        return json.loads(json_str)
-    except JSONDecodeError:
-        return ast.literal_eval(json_str)
+from util import safe_commit
+from issn_resolver import IssnResolver
+from journal_metadata_store import JournalMetadataMethods
+from journal_metadata_store import JournalMetadataStore
+from journal_metadata_store import columns as journal_metadata_columns
+from journal_metadata_store import safer_json_decode
+from journal_metadata_compute import StageReport
+from journal_metadata_compute import compute_journal_metadata
+from journal_metadata_compute import write_csv
+from journal_metadata_compute import last_doi_columns
+from journal_metadata_compute import pricing_columns
+from journal_metadata_compute import raw_columns
+from journal_metadata_compute import computed_columns
 
 
 class OpenalexDBRaw(db.Model):
@@ -45,7 +49,7 @@ class OpenalexDBRaw(db.Model):
 	def __repr__(self):
 		return "<{} ({}) '{}' {}>".format(self.__class__.__name__, self.issn_l, self.display_name, self.publisher)
 
-class JournalMetadata(db.Model):
+class JournalMetadata(JournalMetadataMethods, db.Model):
 	__tablename__ = "openalex_computed"
 	created = db.Column(db.DateTime)
 	issn_l = db.Column(db.Text, primary_key=True)
@@ -60,161 +64,10 @@ class JournalMetadata(db.Model):
 	apc_price_usd = db.Column(db.Numeric(asdecimal=False))
 	apc_price_gbp = db.Column(db.Numeric(asdecimal=False))
 
-	def __init__(self, journal_raw):
-		self.now = datetime.datetime.utcnow()
-		self.created = self.now.isoformat()
-		for attr in ("issn_l", "publisher"):
-			setattr(self, attr, getattr(journal_raw, attr))
-		self.set_custom_fields()
-		self.issns_string = journal_raw.issn
-		for attr in ("title","is_current_subscription_journal",):
-			setter = getattr(self, "set_{}".format(attr))
-			setter(journal_raw)
-		self.set_subscription_prices()
-		self.set_apc_prices()
-		super(JournalMetadata, self).__init__()
-
 	@cached_property
 	def issns(self):
 		return safer_json_decode(self.issns_string)
 
-	@cached_property
-	def display_issns(self):
-		return ",".join(self.issns)
-
-	@cached_property
-	def display_issn_l(self):
-		return "issn:{}".format(self.issn_l)
-
-	@cached_property
-	def is_hybrid(self):
-		return not self.is_gold_journal_in_most_recent_year
-
-	@cached_property
-	def publisher_code(self):
-		if self.publisher == "Elsevier":
-			return "Elsevier"
-		elif self.publisher == "Springer Nature":
-			return "SpringerNature"
-		elif self.publisher == "Wiley":
-			return "Wiley"
-		elif self.publisher == "SAGE":
-			return "Sage"
-		elif self.publisher == "Taylor & Francis":
-			return "TaylorFrancis"
-		return self.publisher
-
-	def get_insert_list(self):
-		return (
-			self.created,
-			self.issn_l,
-			self.issns_string,
-			sql_escape_string(self.title),
-			sql_escape_string(self.publisher),
-			sql_bool(self.is_current_subscription_journal),
-			sql_bool(self.is_gold_journal_in_most_recent_year),
-			sql_bool(self.is_currently_publishing),
-			self.subscription_price_usd,
-			self.subscription_price_gbp,
-			self.apc_price_usd,
-			self.apc_price_gbp,)
-
-	@classmethod
-	def get_insert_column_names(cls):
-		return ["created",
-				"issn_l",
-				"issns_string",
-				"title",
-				"publisher",
-				"is_current_subscription_journal",
-				"is_gold_journal_in_most_recent_year",
-				"is_currently_publishing",
-				"subscription_price_usd",
-				"subscription_price_gbp",
-				"apc_price_usd",
-				"apc_price_gbp",]
-
-	def set_title(self, journal_raw):
-		self.title = journal_raw.display_name
-
-	def set_is_current_subscription_journal(self, journal_raw):
-		self.set_is_currently_publishing(journal_raw)
-		self.set_is_gold_journal_in_most_recent_year(journal_raw)
-		self.set_subscription_prices()
-
-		self.is_current_subscription_journal = True
-		if not self.is_currently_publishing:
-			self.is_current_subscription_journal = False
-		if self.is_gold_journal_in_most_recent_year:
-			self.is_current_subscription_journal = False
-
-	def set_is_gold_journal_in_most_recent_year(self, journal_raw):
-		self.is_gold_journal_in_most_recent_year = False
-		if journal_raw.is_oa is not None or journal_raw.is_in_doaj is not None:
-			self.is_gold_journal_in_most_recent_year = any([journal_raw.is_oa, journal_raw.is_in_doaj])
-
-	def set_is_currently_publishing(self, journal_raw):
-		self.is_currently_publishing = False
-		match = last_dois_dict.get(self.issn_l)
-		if match:
-			if match.date_last_doi:
-				date_last_doi_as_date = datetime.datetime.strptime(match.date_last_doi, "%Y-%m-%d")
-				if (self.now - date_last_doi_as_date).days < 365:
-					self.is_currently_publishing = True
-		else:
-			if journal_raw.counts_by_year:
-				dois = safer_json_decode(journal_raw.counts_by_year)
-				for row in dois:
-					if row['year'] == this_year_ish() and row['works_count'] > 0:
-						self.is_currently_publishing = True
-		# TODO: hack for Scientific American, take out when fixed in metadata
-		if self.issn_l == '0036-8733':
-			self.is_currently_publishing = True
-
-	def set_subscription_prices(self):
-		jdb = jdb_pricing().get(self.issn_l)
-		if jdb:
-			self.subscription_price_usd = jdb.subscription_price_usd
-			self.subscription_price_gbp = jdb.subscription_price_gbp
-	
-	def set_apc_prices(self):
-		jdb = jdb_pricing().get(self.issn_l)
-		if jdb:
-			self.apc_price_usd = jdb.apc_price_usd
-			self.apc_price_gbp = jdb.apc_price_gbp
-
-	def get_subscription_price(self, currency="USD", use_high_price_if_unknown=False):
-		response = None
-		if currency == "USD":
-			if self.subscription_price_usd:
-				response = float(self.subscription_price_usd)
-		elif currency == "GBP":
-			if self.subscription_price_gbp:
-				response = float(self.subscription_price_gbp)
-
-		if not response:
-			if use_high_price_if_unknown and currency == "GBP":
-				response = jisc_default_prices(self.publisher_code)
-		
-		return response
-
-	def get_apc_price(self, currency="USD"):
-		response = None
-		if currency == "USD":
-			if self.apc_price_usd:
-				response = float(self.apc_price_usd)
-		elif currency == "GBP":
-			if self.apc_price_gbp:
-				response = float(self.apc_price_gbp)
-		return response
-
-	def set_custom_fields(self):
-		if self.issn_l in ['2058-5276']:
-			self.publisher = 'Springer Nature'
-
-	def __repr__(self):
-		return "<{} ({}) '{}' {}>".format(self.__class__.__name__, self.issn_l, self.title, self.publisher)
-
 class JournalConcepts(object):
 	def __init__(self, journal_raw):
 		self.created = datetime.datetime.utcnow().isoformat()
@@ -269,96 +122,193 @@ def this_year_ish():
 		year = current_year
 	return year
 
-def recompute_journal_metadata():
-	journals_raw = OpenalexDBRaw.query.all()
-	print(f"retrieved {len(journals_raw)} records from openalex_journals")
-	last_dois = OpenalexDateLastDOI.query.all()
-	print(f"retrieved {len(last_dois)} records from openalex_date_last_doi")
-	
-	global last_dois_dict
-	last_dois_dict = {}
-	for x in last_dois:
-		last_dois_dict[x.issn_l] = x
-
-	print("making backups and getting tables ready to run")
+def read_table(command, columns):
+	rows = []
 	with get_db_cursor() as cursor:
-		cursor.execute("drop table openalex_computed_bak_yesterday;")
-		cursor.execute("create table openalex_computed_bak_yesterday as (select * from openalex_computed);")
-		cursor.execute("drop table openalex_concepts_bak_yesterday;")
-		cursor.execute("create table openalex_concepts_bak_yesterday as (select * from openalex_concepts);")
+		cursor.execute(command)
+		rows = cursor.fetchall()
+	return pd.DataFrame([tuple(row) for row in rows], columns=columns)
 
-	# do it as its own to force commit
+def copy_to_staging_table(table, df, fields):
+	# a fresh copy of table's structure, loaded with a redshift copy from s3
+	staging_table = "{}_staging".format(table)
 	with get_db_cursor() as cursor:
-		cursor.execute("delete from openalex_computed")
-		cursor.execute("delete from openalex_concepts")
-	print("tables ready for insertion")
+		cursor.execute("drop table if exists {};".format(staging_table))
+		cursor.execute("create table {} (like {});".format(staging_table, table))
+
+	csv_filename = write_csv(df, tempfile.mkstemp()[1])
+	bucket_name = "jump-redshift-staging"
+	object_name = "{}_{}".format(staging_table, shortuuid.uuid())
+	s3_client.upload_file(csv_filename, bucket_name, object_name)
+	s3_object = "s3://{}/{}".format(bucket_name, object_name)
+
+	copy_cmd = text("""
+		copy {table} ({fields}) from '{s3_object}'
+		credentials :creds format as csv
+		timeformat 'auto';
+	""".format(
+		table=staging_table,
+		fields=", ".join(fields),
+		s3_object=s3_object,
+	))
+	aws_creds = "aws_access_key_id={aws_key};aws_secret_access_key={aws_secret}".format(
+		aws_key=os.getenv("AWS_ACCESS_KEY_ID"),
+		aws_secret=os.getenv("AWS_SECRET_ACCESS_KEY")
+	)
+	safe_commit(db)
+	db.session.execute(copy_cmd.bindparams(creds=aws_creds))
+	safe_commit(db)
+	return staging_table
 
-	new_computed_journals = []
-	for journal_raw in journals_raw:
-		new_journal_metadata = JournalMetadata(journal_raw)
-		if new_journal_metadata.issns:
-			new_computed_journals.append(new_journal_metadata)
+def recompute_journal_metadata():
+	stages = StageReport()
+	now = datetime.datetime.utcnow()
 
-	print("now commiting to openalex_computed")
 	start_time = time()
-	insert_values = [j.get_insert_list() for j in new_computed_journals]
-	cols = JournalMetadata.get_insert_column_names()
-
-	with get_db_cursor() as cursor:
-		qry = sql.SQL("INSERT INTO openalex_computed ({}) VALUES %s").format(
-			sql.SQL(', ').join(map(sql.Identifier, cols)))
-		execute_values(cursor, qry, insert_values, page_size=1000)
+	journals_raw = read_table("select {} from openalex_journals".format(", ".join(raw_columns + ["x_concepts"])),
+		raw_columns + ["x_concepts"])
+	stages.done("read openalex_journals", len(journals_raw), start_time)
 
-	print("now refreshing openalex_computed_flat view")
-	with get_db_cursor() as cursor:
-		cursor.execute("refresh materialized view openalex_computed_flat;")
-		cursor.execute("analyze openalex_computed;")
+	start_time = time()
+	last_dois = read_table("select issn_l, date_last_doi from openalex_date_last_doi", last_doi_columns)
+	pricing = read_table("select {} from journalsdb_computed".format(", ".join(pricing_columns)), pricing_columns)
+	stages.done("read openalex_date_last_doi and journalsdb_computed", len(last_dois) + len(pricing), start_time)
 
-	new_computed_concepts = []
-	for journal_raw in journals_raw:
-		new_journal_concept = JournalConcepts(journal_raw)
-		new_computed_concepts.append(new_journal_concept)
+	start_time = time()
+	computed = compute_journal_metadata(journals_raw, last_dois, pricing, now, this_year_ish())
+	stages.done("compute openalex_computed", len(computed), start_time)
 
-	concept_insert_values_tmp = [j.data for j in new_computed_concepts]
+	start_time = time()
 	concept_insert_values = []
-	for index, x in enumerate(concept_insert_values_tmp):
-		if x:
-			concept_insert_values.extend(x)
-	
+	for journal_raw in journals_raw[["issn_l", "x_concepts"]].itertuples(index=False):
+		new_journal_concept = JournalConcepts(journal_raw)
+		if new_journal_concept.data:
+			concept_insert_values.extend(new_journal_concept.data)
 	concept_cols = JournalConcepts.get_insert_column_names()
+	concepts = pd.DataFrame(concept_insert_values, columns=concept_cols)
+	stages.done("compute openalex_concepts", len(concepts), start_time)
 
-	print("now commiting to openalex_concepts")
+	# the live tables stay as they are until the swap, so requests never see them empty
+	start_time = time()
+	computed_staging = copy_to_staging_table("openalex_computed", computed, computed_columns)
+	stages.done("copy to {}".format(computed_staging), len(computed), start_time)
+
+	start_time = time()
+	concepts_staging = copy_to_staging_table("openalex_concepts", concepts, concept_cols)
+	stages.done("copy to {}".format(concepts_staging), len(concepts), start_time)
+
+	print("making backups")
 	with get_db_cursor() as cursor:
-		qry = sql.SQL("INSERT INTO openalex_concepts ({}) VALUES %s").format(
-			sql.SQL(', ').join(map(sql.Identifier, concept_cols)))
-		execute_values(cursor, qry, concept_insert_values, page_size=1000)
+		cursor.execute("drop table if exists openalex_computed_bak_yesterday;")
+		cursor.execute("create table openalex_computed_bak_yesterday as (select * from openalex_computed);")
+		cursor.execute("drop table if exists openalex_concepts_bak_yesterday;")
+		cursor.execute("create table openalex_concepts_bak_yesterday as (select * from openalex_concepts);")
 
-	# print("adding sort key (issn_l) to openalex_concepts")
-	# with get_db_cursor() as cursor:
-	#     cursor.execute("alter table openalex_concepts alter sortkey(issn_l)")
+	# one transaction, so readers see all the old rows or all the new ones.  not a table rename,
+	# because openalex_computed_flat is a materialized view on openalex_computed
+	start_time = time()
+	with get_db_cursor() as cursor:
+		cursor.execute("""begin;
+			delete from openalex_computed;
+			insert into openalex_computed select * from {computed_staging};
+			delete from openalex_concepts;
+			insert into openalex_concepts select * from {concepts_staging};
+			end;""".format(computed_staging=computed_staging, concepts_staging=concepts_staging))
+	stages.done("swap into openalex_computed and openalex_concepts", len(computed) + len(concepts), start_time)
+
+	rows = []
+	with get_db_cursor() as cursor:
+		cursor.execute("select count(*) from openalex_computed")
+		rows = cursor.fetchall()
+	if not rows or rows[0][0] != len(computed):
+		print("openalex_computed doesn't have the {} new rows, so leaving {} and {} to look at".format(
+			len(computed), computed_staging, concepts_staging))
+		return stages.summary()
+
+	start_time = time()
+	with get_db_cursor() as cursor:
+		cursor.execute("refresh materialized view openalex_computed_flat;")
+		cursor.execute("analyze openalex_computed;")
+		cursor.execute("drop table if exists {};".format(computed_staging))
+		cursor.execute("drop table if exists {};".format(concepts_staging))
+	stages.done("refresh openalex_computed_flat", len(computed), start_time)
 
-	print("done writing to db, took {} seconds total".format(elapsed(start_time)))
+	print("done writing to db")
+	return stages.summary()
 
 
 
-print("loading all journal metadata...", end=' ')
-start_time = time()
-all_journal_metadata_list = JournalMetadata.query.all()
-[db.session.expunge(my_journal_metadata) for my_journal_metadata in all_journal_metadata_list]
-all_journal_metadata = dict(list(zip([journal_object.issn_l for journal_object in all_journal_metadata_list], all_journal_metadata_list)))
-all_journal_metadata_flat = {}
-for issn_l, journal_metadata in all_journal_metadata.items():
-    for issn in journal_metadata.issns:
-        all_journal_metadata_flat[issn] = journal_metadata
+# a snapshot of the journal metadata store on local disk, so the next process on the dyno can load it
+# without reading all of openalex_computed
+journal_metadata_snapshot_path = os.getenv("JOURNAL_METADATA_SNAPSHOT", "/tmp/unsub_journal_metadata.pickle")
 
-# load issns from openalex_computed_flat
-with get_db_cursor() as cursor:
-	cursor.execute("select issn from openalex_computed_flat")
-	rows = cursor.fetchall()
+class JournalMetadataNotLoaded(Exception):
+	pass
 
-oa_issns = [w[0] for w in rows]
+journal_metadata_lock = threading.Lock()
+journal_metadata_store = None
+issn_resolver = None
 
-print("loaded all journal metadata in {} seconds.".format(elapsed(start_time)))
+def get_journal_metadata_version():
+	# openalex_computed is rewritten by recompute_journal_metadata, with new created timestamps
+	rows = []
+	with get_db_cursor() as cursor:
+		cursor.execute("select max(created) as created from openalex_computed")
+		rows = cursor.fetchall()
+	if not rows or not rows[0]["created"]:
+		return None
+	return str(rows[0]["created"])
+
+def load_journal_metadata_store():
+	print("loading all journal metadata...", end=' ')
+	start_time = time()
+	version = get_journal_metadata_version()
+	store = JournalMetadataStore.read_snapshot(journal_metadata_snapshot_path)
+	if store is not None and version is not None and store.version == version:
+		print("from snapshot {} in {} seconds.".format(version, elapsed(start_time)))
+		return store
+
+	command = "select issn_l, issns_string, {} from openalex_computed".format(
+		", ".join(column for column in journal_metadata_columns if column not in ("issn_l", "issns")))
+	rows = []
+	with get_db_cursor() as cursor:
+		cursor.execute(command)
+		rows = cursor.fetchall()
+	if not rows:
+		if store is None:
+			# get_db_cursor swallows errors, so no rows may just be a failed read: don't let that be cached
+			raise JournalMetadataNotLoaded("couldn't read openalex_computed and there's no snapshot to use instead")
+		print("couldn't read openalex_computed, so using snapshot {}".format(store.version))
+		return store
+
+	store = JournalMetadataStore.from_rows(rows, version=version)
+	if version is not None:
+		try:
+			store.write_snapshot(journal_metadata_snapshot_path)
+		except OSError as e:
+			print("couldn't write journal metadata snapshot.  Error message: ", e)
+	print("loaded all journal metadata in {} seconds.".format(elapsed(start_time)))
+	return store
+
+def get_journal_metadata_store():
+	"""
+	The journal metadata store, loaded on first use, so importing this module doesn't read it.
+	Raises JournalMetadataNotLoaded if it can't be loaded, and the next call tries again.
+	"""
+	global journal_metadata_store
+	global issn_resolver
+	if journal_metadata_store is None:
+		with journal_metadata_lock:
+			if journal_metadata_store is None:
+				store = load_journal_metadata_store()
+				issn_resolver = IssnResolver(store.issn_to_issn_l())
+				journal_metadata_store = store
+	return journal_metadata_store
+
+def get_issn_resolver():
+	"""Every issn we know and its issn_l, from the same rows as the journal metadata store."""
+	get_journal_metadata_store()
+	return issn_resolver
 
 
 class MissingJournalMetadata(object):
@@ -366,7 +316,7 @@ class MissingJournalMetadata(object):
 		self.issn_l = issn_l
 		# only print below if issn actually not known to openalex
 		# in some cases we call this class with a subset of openalex ISSNs, leading to false positives
-		if issn_l not in oa_issns:
+		if issn_l not in get_issn_resolver():
 			print("MissingJournalMetadata: missing {} from openalex: https://api.openalex.org/venues/issn:{}".format(issn_l, issn_l))
 		super(MissingJournalMetadata, self).__init__()
 
@@ -401,6 +351,35 @@ class MissingJournalMetadata(object):
 	def get_subscription_price(self, currency, use_high_price_if_unknown=False):
 		return None
 
+def benchmark_package_journal_metadata(package_id, repeat=5):
+	# Package.journal_metadata used to be an IN query on openalex_computed with every issn_l in the package
+	from package import Package
+	my_package = Package.query.get(package_id)
+	issn_ls = my_package.unique_issns
+	print("package {} has {} issn_ls".format(package_id, len(issn_ls)))
+
+	query_times = []
+	for i in range(repeat):
+		start_time = time()
+		meta_list = JournalMetadata.query.filter(
+			JournalMetadata.issn_l.in_(issn_ls),
+			JournalMetadata.is_current_subscription_journal).all()
+		[db.session.expunge(my_meta) for my_meta in meta_list]
+		query_times.append(elapsed(start_time, 4))
+
+	store = get_journal_metadata_store()
+	store_times = []
+	for i in range(repeat):
+		start_time = time()
+		journal_metadata = store.current_subscription_journals(issn_ls)
+		store_times.append(elapsed(start_time, 4))
+
+	print("IN query on openalex_computed: {} journals, {} seconds each".format(len(meta_list), query_times))
+	print("journal metadata store: {} journals, {} seconds each".format(len(journal_metadata), store_times))
+	if set(journal_metadata) != set(meta.issn_l for meta in meta_list):
+		print("the store and openalex_computed disagree on {} issn_ls".format(
+			len(set(journal_metadata) ^ set(meta.issn_l for meta in meta_list))))
+
 # python openalex.py --recompute
 # heroku run --size=performance-l python openalex.py --recompute -r heroku
 # heroku local:run python openalex.py --recompute
@@ -408,7 +387,11 @@ if __name__ == "__main__":
 
 	parser = argparse.ArgumentParser()
 	parser.add_argument("--recompute", help="Update journal metadata", action="store_true", default=False)
+	parser.add_argument("--benchmark", help="Time Package.journal_metadata for this package id, from the db and from the store", type=str, default=None)
 	parsed_args = parser.parse_args()
 
 	if parsed_args.recompute:
 		recompute_journal_metadata()
+
+	if parsed_args.benchmark:
+		benchmark_package_journal_metadata(parsed_args.benchmark)
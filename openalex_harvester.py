@@ -0,0 +1,214 @@
+# coding: utf-8
+
+# Harvesting OpenAlex list endpoints (like /sources) with httpx and asyncio.
+#
+# A cursor only gives the next page once this one is in, so one cursor is one page at a time.  To
+# fetch several pages at once the updated date window is split into shards, each with its own
+# cursor, and up to `concurrency` shards are paged at once.  Each page goes to write_batch as one
+# batch, one batch at a time.  Failed requests (network errors, 429s and 5xxs) are retried with
+# exponential backoff.  After each batch is written, the shard's next cursor goes into a
+# checkpoint file, so a run that dies can pick up from the last page it wrote.
+
+import asyncio
+import json
+import os
+import random
+
+import httpx
+
+openalex_api_url = "https://api.openalex.org"
+retry_status_codes = [429, 500, 502, 503, 504]
+
+
+class HarvestError(Exception):
+    pass
+
+
+def date_shards(date_start, date_end, num_shards):
+    """(from, to) updated date filters, as OpenAlex wants them, splitting [date_start, date_end) evenly."""
+    step = (date_end - date_start) / num_shards
+    bounds = [date_start + step * i for i in range(num_shards)] + [date_end]
+    return [(bounds[i].strftime("%Y-%m-%dT%H:%M:%SZ"), bounds[i + 1].strftime("%Y-%m-%dT%H:%M:%SZ"))
+            for i in range(num_shards)]
+
+
+def source_row(record):
+    """The openalex_journals columns for a /sources record."""
+    return {
+        "id": record["id"],
+        "issn_l": record["issn_l"],
+        "issn": str(record["issn"]),
+        "display_name": record["display_name"],
+        "is_oa": record["is_oa"],
+        "is_in_doaj": record["is_in_doaj"],
+        "publisher": record["host_organization_name"],
+        "counts_by_year": str(record["counts_by_year"]),
+        "x_concepts": str(record["x_concepts"]),
+        "updated_date": record["updated_date"],
+    }
+
+
+class Checkpoint(object):
+    """
+    The next cursor of each shard of a run, in a json file.  A shard whose cursor is None is done.
+    Written whole to a temp file and renamed, so a crash never leaves half a checkpoint.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.run = None
+        self.shards = {}
+        self.counts = {}
+
+    def load(self):
+        """Whether there was an unfinished run to resume."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            saved = json.load(f)
+        self.run = saved["run"]
+        self.shards = saved["shards"]
+        self.counts = saved.get("counts", {})
+        return not self.is_done()
+
+    def start(self, run, shard_keys):
+        self.run = run
+        self.shards = dict((shard_key, "*") for shard_key in shard_keys)
+        self.counts = dict((shard_key, 0) for shard_key in shard_keys)
+        self.save()
+
+    def advance(self, shard_key, next_cursor, num_records):
+        self.shards[shard_key] = next_cursor
+        self.counts[shard_key] = self.counts.get(shard_key, 0) + num_records
+        self.save()
+
+    def is_done(self):
+        return all(cursor is None for cursor in self.shards.values())
+
+    def save(self):
+        temp_path = "{}.{}.tmp".format(self.path, os.getpid())
+        with open(temp_path, "w") as f:
+            json.dump({"run": self.run, "shards": self.shards, "counts": self.counts}, f)
+        os.replace(temp_path, self.path)
+
+
+async def get_page(client, url, params, max_retries=5, backoff_seconds=1.0):
+    """The json of one page, retrying network errors, 429s and 5xxs with exponential backoff and jitter."""
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.get(url, params=params)
+        except httpx.TransportError as e:
+            error = "{}: {}".format(e.__class__.__name__, e)
+            retry_after = None
+        else:
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in retry_status_codes:
+                raise HarvestError("{} from {}: {}".format(response.status_code, url, response.text[:200]))
+            error = "status {}".format(response.status_code)
+            retry_after = response.headers.get("Retry-After", None)
+
+        if attempt == max_retries:
+            raise HarvestError("gave up on {} after {} tries, last {}".format(url, attempt + 1, error))
+        if retry_after is not None and retry_after.isdigit():
+            delay = float(retry_after)
+        else:
+            delay = backoff_seconds * (2 ** attempt) * (0.5 + random.random())
+        print("{} from {}, retrying in {} seconds".format(error, url, round(delay, 2)))
+        await asyncio.sleep(delay)
+
+
+class Harvester(object):
+    """
+    Pages through an OpenAlex list endpoint for each shard filter and hands every page's results
+    to write_batch(records), which runs in a thread, one batch at a time.
+    """
+
+    def __init__(self, endpoint, write_batch, checkpoint, base_filter, api_key=None, base_url=openalex_api_url,
+                 concurrency=4, per_page=200, max_retries=5, backoff_seconds=1.0, timeout=30):
+        self.url = "{}/{}".format(base_url.rstrip("/"), endpoint)
+        self.write_batch = write_batch
+        self.checkpoint = checkpoint
+        self.base_filter = base_filter
+        self.api_key = api_key
+        self.concurrency = concurrency
+        self.per_page = per_page
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.num_pages = 0
+        self.num_records = 0
+
+    def params(self, shard_key, cursor):
+        (from_date, to_date) = shard_key.split("|")
+        params = {
+            "filter": "{},from_updated_date:{},to_updated_date:{}".format(self.base_filter, from_date, to_date),
+            "cursor": cursor,
+            "per-page": self.per_page,
+        }
+        if self.api_key:
+            params["api_key"] = self.api_key
+        return params
+
+    async def harvest_shard(self, client, shard_key, semaphore, write_lock):
+        async with semaphore:
+            cursor = self.checkpoint.shards[shard_key]
+            while cursor is not None:
+                page = await get_page(client, self.url, self.params(shard_key, cursor), self.max_retries, self.backoff_seconds)
+                records = page["results"]
+                if records:
+                    async with write_lock:
+                        await asyncio.to_thread(self.write_batch, records)
+                # an empty page ends the cursor even when OpenAlex still sends one
+                cursor = page["meta"].get("next_cursor", None) if records else None
+                self.checkpoint.advance(shard_key, cursor, len(records))
+                self.num_pages += 1
+                self.num_records += len(records)
+                print("{}: {} records, {} in all".format(shard_key, len(records), self.num_records))
+
+    async def run(self, client=None):
+        """Harvests every shard in the checkpoint that isn't done.  Returns the number of records written."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        write_lock = asyncio.Lock()
+        own_client = client is None
+        if own_client:
+            client = httpx.AsyncClient(timeout=self.timeout)
+        try:
+            shard_keys = [shard_key for (shard_key, cursor) in self.checkpoint.shards.items() if cursor is not None]
+            await asyncio.gather(*[self.harvest_shard(client, shard_key, semaphore, write_lock) for shard_key in shard_keys])
+        finally:
+            if own_client:
+                await client.aclose()
+        return self.num_records
+
+
+def shard_keys_for(date_start, date_end, num_shards):
+    return ["{}|{}".format(from_date, to_date) for (from_date, to_date) in date_shards(date_start, date_end, num_shards)]
+
+
+def harvest(endpoint, write_batch, checkpoint_path, base_filter, date_start, date_end, num_shards=8, **kwargs):
+    """
+    Harvests endpoint for things updated in [date_start, date_end).  If the run in
+    checkpoint_path didn't finish, that one is finished first, whatever its dates were, and then
+    this window is harvested, so a crash doesn't lose the window it was working on.
+    """
+    run = "{} {} to {}".format(endpoint, date_start.isoformat(), date_end.isoformat())
+    checkpoint = Checkpoint(checkpoint_path)
+    num_records = 0
+    if checkpoint.load():
+        print("resuming harvest {} with {} shards left".format(
+            checkpoint.run, len([cursor for cursor in checkpoint.shards.values() if cursor is not None])))
+        num_records += run_harvester(endpoint, write_batch, checkpoint, base_filter, **kwargs)
+        if checkpoint.run == run:
+            return num_records
+
+    checkpoint.start(run, shard_keys_for(date_start, date_end, num_shards))
+    num_records += run_harvester(endpoint, write_batch, checkpoint, base_filter, **kwargs)
+    return num_records
+
+
+def run_harvester(endpoint, write_batch, checkpoint, base_filter, **kwargs):
+    harvester = Harvester(endpoint, write_batch, checkpoint, base_filter, **kwargs)
+    num_records = asyncio.run(harvester.run())
+    print("harvested {} records in {} pages for {}".format(num_records, harvester.num_pages, checkpoint.run))
+    return num_records
@@ -1,9 +1,12 @@
+import argparse
 import datetime
+import os
 
-import requests
-from sqlalchemy import update
+from psycopg2.extras import execute_values
 
-from app import db, OPENALEX_API_KEY
+from app import db, get_db_connection, OPENALEX_API_KEY
+from openalex_harvester import harvest
+from openalex_harvester import source_row
 
 
 class OpenalexDBRaw(db.Model):
@@ -20,90 +23,54 @@ class OpenalexDBRaw(db.Model):
 	id = db.Column(db.Text)
 
 
-def create_or_update_sources():
-    count = 0
-    date_start = (datetime.datetime.now() - datetime.timedelta(days=2)).strftime("%Y-%m-%dT00:00:00Z")
-    date_end = (datetime.datetime.now() - datetime.timedelta(days=1)).strftime("%Y-%m-%dT00:00:00Z")
-    cursor = "*"
+# where a harvest keeps its cursors, so an interrupted run picks up where it stopped
+checkpoint_path = os.getenv("OPENALEX_SOURCES_CHECKPOINT", "/tmp/openalex_sources_checkpoint.json")
 
-    # initial run
-    url = f"https://api.openalex.org/sources?filter=issn_l:!null,from_updated_date:{date_start},to_updated_date:{date_end}&api_key={OPENALEX_API_KEY}&cursor={cursor}&per-page=200"
-    response = requests.get(url)
+source_columns = ["id", "issn_l", "issn", "display_name", "is_oa", "is_in_doaj", "publisher", "counts_by_year",
+                  "x_concepts", "updated_date"]
 
-    if response.status_code == 200:
-        for record in response.json()["results"]:
-            create_or_update_record_by_issn_l(record["issn_l"], record)
-            count += 1
-            break
 
-    cursor = response.json()["meta"]["next_cursor"] if "next_cursor" in response.json()["meta"] else None
-
-    # loop through all pages
-    while cursor:
-        url = f"https://api.openalex.org/sources?filter=issn_l:!null,from_updated_date:{date_start},to_updated_date:{date_end}&api_key={OPENALEX_API_KEY}&cursor={cursor}&per-page=200"
-        response = requests.get(url)
-        if response.status_code == 200:
-            for record in response.json()["results"]:
-                create_or_update_record_by_issn_l(record["issn_l"], record)
-                count += 1
-
-            cursor = response.json()["meta"]["next_cursor"] if "next_cursor" in response.json()["meta"] else None
-            print(f"Processed {count} records")
-        db.session.commit()
-
-
-def create_or_update_record_by_issn_l(issn_l, new_data):
-    existing_record = db.session.query(OpenalexDBRaw).filter_by(issn_l=new_data["issn_l"]).first()
-    if not existing_record:
-        print(f"Record with issn_l {issn_l} does not exist. Creating new record.")
-        create_new_record(new_data)
+def upsert_sources(records):
+    # Redshift has no upsert: load the batch into a temp table, then update the issn_ls we have
+    # and insert the rest, in one transaction
+    rows = dict((record["issn_l"], source_row(record)) for record in records if record.get("issn_l"))
+    values = [tuple(row[column] for column in source_columns) for row in rows.values()]
+    if not values:
         return
-
-    stmt = (
-        update(OpenalexDBRaw)
-        .where(OpenalexDBRaw.issn_l == issn_l)
-        .values(
-            id=new_data["id"],
-            issn=str(new_data["issn"]),
-            display_name=new_data["display_name"],
-            is_oa=new_data["is_oa"],
-            is_in_doaj=new_data["is_in_doaj"],
-            publisher=new_data["host_organization_name"],
-            counts_by_year=str(new_data["counts_by_year"]),
-            x_concepts=str(new_data["x_concepts"]),
-            updated_date=new_data["updated_date"]
-        )
-    )
-    try:
-        db.session.execute(stmt)
-        db.session.commit()
-        print(f"All records with issn_l {issn_l} have been updated.")
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error updating records with issn_l {issn_l}: {e}")
-
-
-def create_new_record(new_data):
-    new_record = OpenalexDBRaw(
-        id=new_data["id"],
-        issn_l=new_data["issn_l"],
-        issn=str(new_data["issn"]),
-        display_name=new_data["display_name"],
-        is_oa=new_data["is_oa"],
-        is_in_doaj=new_data["is_in_doaj"],
-        publisher=new_data["host_organization_name"],
-        counts_by_year=str(new_data["counts_by_year"]),
-        x_concepts=str(new_data["x_concepts"]),
-        updated_date=new_data["updated_date"]
-    )
-    try:
-        db.session.add(new_record)
-        db.session.commit()
-        print(f"New record with issn_l {new_data['issn_l']} has been created.")
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error creating new record with issn_l {new_data['issn_l']}: {e}")
+    updates = ", ".join("{column} = openalex_journals_batch.{column}".format(column=column)
+                        for column in source_columns if column != "issn_l")
+    with get_db_connection() as connection:
+        cursor = connection.cursor()
+        try:
+            cursor.execute("create temp table openalex_journals_batch (like openalex_journals);")
+            execute_values(cursor, "insert into openalex_journals_batch ({}) values %s".format(", ".join(source_columns)),
+                           values, page_size=1000)
+            cursor.execute("""begin;
+                update openalex_journals set {updates} from openalex_journals_batch
+                    where openalex_journals.issn_l = openalex_journals_batch.issn_l;
+                insert into openalex_journals ({columns}) select {columns} from openalex_journals_batch
+                    where issn_l not in (select issn_l from openalex_journals);
+                end;""".format(updates=updates, columns=", ".join(source_columns)))
+        except Exception:
+            # the connection goes back to the pool, so don't leave it in a failed transaction
+            cursor.execute("rollback;")
+            raise
+        finally:
+            cursor.execute("drop table if exists openalex_journals_batch;")
+            cursor.close()
+
+
+def create_or_update_sources(concurrency=4, num_shards=8):
+    date_start = (datetime.datetime.now() - datetime.timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
+    date_end = (datetime.datetime.now() - datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return harvest("sources", upsert_sources, checkpoint_path, "issn_l:!null", date_start, date_end,
+                   num_shards=num_shards, api_key=OPENALEX_API_KEY, concurrency=concurrency)
 
 
 if __name__ == "__main__":
-    create_or_update_sources()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", help="How many shards to page at once", type=int, default=4)
+    parser.add_argument("--shards", help="How many pieces to split the updated date window into", type=int, default=8)
+    parsed_args = parser.parse_args()
+
+    create_or_update_sources(concurrency=parsed_args.concurrency, num_shards=parsed_args.shards)
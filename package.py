@@ -19,12 +19,13 @@ from app import s3_client
 from apc_journal import ApcJournal
 from saved_scenario import SavedScenario # used in relationship
 from institution import Institution  # used in relationship
-from scenario import get_core_list_from_db, get_apc_data_from_db
+from scenario import get_core_list_from_db, get_apc_data_from_db, reset_apc_data_cache
+from package_data_version import bump_package_data_version
 from util import get_sql_dict_rows
 from util import safe_commit
 from util import for_sorting
 from util import elapsed
-from openalex import JournalMetadata, MissingJournalMetadata, all_journal_metadata_flat
+from openalex import MissingJournalMetadata, get_journal_metadata_store
 
 
 class Package(db.Model):
@@ -82,11 +83,7 @@ class Package(db.Model):
 
     @cached_property
     def journal_metadata(self):
-        meta_list = JournalMetadata.query.filter(
-            JournalMetadata.issn_l.in_(self.unique_issns),
-            JournalMetadata.is_current_subscription_journal).all()
-        [db.session.expunge(my_meta) for my_meta in meta_list]
-        return dict(list(zip([j.issn_l for j in meta_list], meta_list)))
+        return get_journal_metadata_store().current_subscription_journals(self.unique_issns)
 
     @cached_property
     def journal_metadata_flat(self):
@@ -474,7 +471,7 @@ class Package(db.Model):
             self.apc_data = get_apc_data_from_db(self.package_id)
 
         for issn_l in issn_ls:
-            meta = all_journal_metadata_flat.get(issn_l, None)
+            meta = get_journal_metadata_store().get_by_issn(issn_l, None)
             if meta:
                 if meta.get_apc_price(self.currency):
                     apc_journal = ApcJournal(issn_l, self.apc_data, apc_df_dict, self.currency, self)
@@ -821,6 +818,9 @@ def clone_demo_package(institution):
             """.format(new_package.package_id, DEMO_PACKAGE_ID)
         )
 
+    # the core list is cached by package data version, the apc data by package id
+    bump_package_data_version(new_package.package_id)
+    reset_apc_data_cache(new_package.package_id)
     return new_package
 
 
@@ -0,0 +1,79 @@
+# coding: utf-8
+
+# A version number per package, bumped whenever its data changes: uploads and deletes of counter,
+# price, perpetual access and filter files (PackageInput.load and .delete), and edits to the
+# package itself.  Anything computed from a package's data can be cached under the package id and
+# its version, for as long as it likes: a change means a new key, never a stale hit.
+#
+# Lives in jump_package_data_version, which each process creates if it isn't there the first time
+# it needs it.  Reads and bumps raise when the table can't be used: reading every package as
+# version 0 would serve day-old cached data after uploads, without anyone noticing.
+#
+# Redshift doesn't enforce primary keys and has no upsert, so a bump is an update, or an insert
+# when there was no row, and readers take the max version per package.  Two first bumps at once
+# can both insert 1; the next bump still goes past them.  A package with no row is version 0.
+
+import hashlib
+
+import psycopg2.extras
+import simplejson as json
+
+from app import get_db_connection
+
+create_table_command = """create table if not exists jump_package_data_version (
+    package_id text not null,
+    version bigint not null,
+    updated timestamp not null
+)"""
+table_exists = False
+
+
+def execute(command, values=None, fetch=False):
+    # not get_db_cursor, which prints errors and carries on
+    global table_exists
+    with get_db_connection() as connection:
+        cursor = connection.cursor(cursor_factory=psycopg2.extras.DictCursor)
+        try:
+            if not table_exists:
+                cursor.execute(create_table_command)
+                table_exists = True
+            cursor.execute(command, values)
+            if fetch:
+                return cursor.fetchall()
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+
+def get_package_data_versions(package_ids):
+    """The current data version of each package id, as a dict."""
+    package_ids = tuple(sorted(set(package_ids)))
+    versions = dict((package_id, 0) for package_id in package_ids)
+    if not package_ids:
+        return versions
+
+    command = """select package_id, max(version) as version from jump_package_data_version
+        where package_id in %s group by package_id"""
+    for row in execute(command, (package_ids,), fetch=True):
+        versions[row["package_id"]] = row["version"]
+    return versions
+
+
+def get_package_data_version(package_id):
+    return get_package_data_versions([package_id])[package_id]
+
+
+def bump_package_data_version(package_id):
+    """Gives package_id a new data version, after a change to its data."""
+    update_command = """update jump_package_data_version set version = version + 1, updated = sysdate
+        where package_id = %s"""
+    insert_command = """insert into jump_package_data_version (package_id, version, updated)
+        values (%s, 1, sysdate)"""
+    if execute(update_command, (package_id,)) == 0:
+        execute(insert_command, (package_id,))
+    print("bumped data version for package {}".format(package_id))
+
+
+def versions_cache_key(versions):
+    """A short stand-in for a dict of package id -> data version, for cache keys and ETags."""
+    return hashlib.sha1(json.dumps(sorted(versions.items())).encode("utf-8")).hexdigest()[:16]
@@ -20,11 +20,14 @@ import package
 from app import db, logger
 from app import get_db_cursor
 from app import reset_cache
+from package_data_version import bump_package_data_version
 from consortium import Consortium
 from app import s3_client
 from excel import convert_spreadsheet_to_csv
 from package_file_error_rows import PackageFileErrorRow
 from raw_file_upload_object import RawFileUploadObject
+from issn_resolver import clean_issn
+from issn_resolver import is_valid_issn
 from util import safe_commit
 
 
@@ -83,15 +86,21 @@ class PackageInput:
             return ParseWarning.no_usd_price if warn_if_blank else None
 
     @staticmethod
-    def normalize_issn(issn, warn_if_blank=False):
-        from openalex import oa_issns
+    def normalize_issn(issn, warn_if_blank=False, known_issns=None):
+        # known_issns: the issns of the column already resolved, from normalize_issns
         if issn:
             issn = issn.replace("issn:", "")
             issn = sub(r"\s", "", issn).upper()
             if re.match(r"^\d{4}-?\d{3}(?:X|\d)$", issn):
                 issn = issn.replace("-", "")
                 issn = issn[0:4] + "-" + issn[4:8]
-                if issn not in oa_issns:
+                if known_issns is None:
+                    from openalex import get_issn_resolver
+                    known_issns = get_issn_resolver()
+                if issn not in known_issns:
+                    # a wrong check digit is most likely a typo, not a journal we're missing
+                    if not is_valid_issn(issn):
+                        return ParseWarning.invalid_issn
                     print(f"Missing journal in normalize_issn {issn} from OpenAlex: https://api.openalex.org/venues/issn:{issn}")
                     return ParseWarning.unknown_issn
                 return issn
@@ -102,6 +111,14 @@ class PackageInput:
         else:
             return ParseWarning.no_issn if warn_if_blank else None
 
+    @staticmethod
+    def normalize_issns(issns, warn_if_blank=False):
+        """normalize_issn for each of a column of issns, resolving the lot in one call."""
+        from openalex import get_issn_resolver
+        cleaned_issns = [clean_issn(issn) for issn in issns]
+        known_issns = get_issn_resolver().resolve_dict([issn for issn in cleaned_issns if issn])
+        return [PackageInput.normalize_issn(issn, warn_if_blank, known_issns=known_issns) for issn in issns]
+
     @staticmethod
     def strip_text(txt, warn_if_blank=False):
         if txt is not None:
@@ -253,6 +270,7 @@ class PackageInput:
             cursor.execute("delete from jump_raw_file_upload_object where package_id=%s and file=%s",
                 (package_id, self.file_type_label(),))
 
+        bump_package_data_version(package_id)
         my_package = db.session.query(package.Package).filter(package.Package.package_id == package_id).scalar()
         if my_package:
             self.clear_caches(my_package)
@@ -441,6 +459,16 @@ class PackageInput:
             if set(required_keys).difference(set(normalized_column_names)):
                 raise RuntimeError("Error: missing required columns. Required: {}, Found: {}.".format(required_keys, self.raw_column_names))
 
+            # each issn column is resolved in one go, rather than a cell at a time
+            issn_columns = {}
+            for raw_column_name in self.raw_column_names:
+                normalized_name = self.normalize_column_name(raw_column_name)
+                spec = self.csv_columns().get(normalized_name, None) if normalized_name else None
+                if spec and spec["normalize"] == self.normalize_issn and raw_column_name not in issn_columns:
+                    raw_values = list(set(row.get(raw_column_name, "") for row in row_dicts))
+                    normalized_values = self.normalize_issns(raw_values, spec.get("warn_if_blank", False))
+                    issn_columns[raw_column_name] = dict(zip(raw_values, normalized_values))
+
             for row_no, row in enumerate(row_dicts):
                 absolute_row_no = parsed_to_absolute_line_no[row_no] + header_index + 1
                 normalized_row = {}
@@ -451,7 +479,10 @@ class PackageInput:
                     normalized_name = self.normalize_column_name(raw_column_name)
                     if normalized_name:
                         try:
-                            normalized_value = self.normalize_cell(normalized_name, raw_value)
+                            if raw_column_name in issn_columns:
+                                normalized_value = issn_columns[raw_column_name][raw_value]
+                            else:
+                                normalized_value = self.normalize_cell(normalized_name, raw_value)
                             if normalized_value.__class__.__name__ == "ParseWarning":
                                 parse_warning = normalized_value
                                 # logger.info("parse warning: {} for data {},  {}".format(parse_warning, raw_column_name, row))
@@ -600,6 +631,8 @@ class PackageInput:
             from filter_titles import FilterTitlesInput
             if isinstance(self, FilterTitlesInput):
                 self.update_subscriptions(package_id)
+            # the delete above bumped it too, but before the new rows were in
+            bump_package_data_version(package_id)
         else:
             from collections import OrderedDict
             try:
@@ -649,6 +682,10 @@ class ParseWarning(Enum):
         "label": "unknown_issn",
         "text": "This looks like an ISSN, but it isn't one we recognize."
     }
+    invalid_issn = {
+        "label": "invalid_issn",
+        "text": "This looks like an ISSN, but its check digit is wrong. Is it mistyped?"
+    }
     bundle_issn = {
         "label": "bundle_issn",
         "text": "ISSN represents a bundle of journals, not a single journal."
@@ -1,6 +1,7 @@
 # Cleanup all data in the database for a given package ID
 
 from app import get_db_cursor
+from scenario import reset_apc_data_cache
 
 ids=['package-Tasb867CNn3k',
 'package-8qQnSQDX8jVM',
@@ -72,6 +73,7 @@ def delete_apc(pid):
 	with get_db_cursor() as cursor:
 		cmd = f"delete from jump_apc_authorships where package_id = %s"
 		cursor.execute(cmd, (pid,))
+	reset_apc_data_cache(pid)
 
 for pkg_id in ids:
 	if pkg_exists(pkg_id):
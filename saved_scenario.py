@@ -3,6 +3,7 @@
 from cached_property import cached_property
 import simplejson as json
 import datetime
+import hashlib
 from collections import OrderedDict
 from time import time
 from sqlalchemy import orm
@@ -13,7 +14,11 @@ register_adapter(dict, Json)
 
 from app import db
 from app import get_db_cursor
+from app import get_common_data
 from scenario import Scenario, openalex_export_concepts
+from scenario import get_package_data_versions_for
+from package_data_version import versions_cache_key
+from single_flight import SingleFlight
 from app import DEMO_PACKAGE_ID
 from util import elapsed
 
@@ -88,6 +93,19 @@ def save_feedback_on_member_institutions_included_to_db(consortium_scenario_id,
         cursor.execute(command, {'consortium_scenario_id':consortium_scenario_id, 'scenario_json':scenario_json, 
             'member_package_id':member_package_id, 'member_institution_scenario_id':member_institution_scenario_id, 'ip':ip})
 
+def get_latest_scenario_updated(scenario_id):
+    # when the scenario was last saved, without loading it
+    if scenario_id.startswith("demo"):
+        tablename = "jump_scenario_details_demo"
+    else:
+        tablename = "jump_scenario_details_paid"
+    rows = []
+    with get_db_cursor() as cursor:
+        qry = sql.SQL("select max(updated) as updated from {} where scenario_id=%s").format(sql.Identifier(tablename))
+        cursor.execute(qry, (scenario_id,))
+        rows = cursor.fetchall()
+    return rows[0]["updated"] if rows else None
+
 def get_latest_scenario_raw(scenario_id, exclude_added_via_pushpull=False):
     updated = None
     scenario_data = None
@@ -109,6 +127,8 @@ def get_latest_scenario_raw(scenario_id, exclude_added_via_pushpull=False):
     return (updated, scenario_data)
 
 
+scenario_builds = SingleFlight()
+
 def get_latest_scenario(scenario_id, pkg_id=None, my_jwt=None):
     my_saved_scenario = SavedScenario.query.get(scenario_id)
     if my_saved_scenario:
@@ -136,8 +156,15 @@ def get_latest_scenario(scenario_id, pkg_id=None, my_jwt=None):
         if not "member_added_subrs" in scenario_data:
             scenario_data["member_added_subrs"] = []
 
-    my_scenario = Scenario(package_id, scenario_data, my_jwt=my_jwt)
-    return my_scenario
+    # requests for the same scenario at the same time share one build.  what it's built from is all in
+    # the key, so a save or an upload in between starts a new one
+    build_key = (scenario_id,
+                 package_id,
+                 versions_cache_key(get_package_data_versions_for(package_id)),
+                 get_common_data()[0],
+                 hashlib.sha1(json.dumps(scenario_data, sort_keys=True).encode("utf-8")).hexdigest())
+    my_scenario = scenario_builds.do(build_key, lambda: Scenario(package_id, scenario_data, my_jwt=my_jwt))
+    return my_scenario.copy_for_request()
 
 
 class SavedScenario(db.Model):
@@ -372,9 +399,8 @@ class SavedScenario(db.Model):
         self.set_live_scenario()  # in case not done
 
         if gather_export_concepts:
+            # journals read their subjects from the scenario data, so they see these right away
             self.live_scenario.data['concepts'] = openalex_export_concepts(self.live_scenario.data['concepts'], self.live_scenario.my_package.unique_issns)
-            [setattr(j, 'subject_top_three', self.live_scenario.data['concepts'].get(j.issn_l, {}).get("top_three", "")) for j in self.live_scenario.journals]
-            [setattr(j, 'subjects_all', self.live_scenario.data['concepts'].get(j.issn_l, {}).get("all", "")) for j in self.live_scenario.journals]
 
         response = OrderedDict()
         response["meta"] = self.to_dict_meta()
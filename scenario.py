@@ -1,8 +1,10 @@
 # coding: utf-8
 
 import os
+import copy
 import gzip
 import datetime
+import hashlib
 from cached_property import cached_property
 import numpy as np
 import pandas as pd
@@ -18,8 +20,12 @@ from app import JISC_PACKAGE_ID
 from app import db
 from app import logger
 from app import memorycache
+from app import invalidatable_cache
+from app import reset_cache
 from app import s3_client
-from app import common_data_dict
+from app import get_common_data
+from package_data_version import get_package_data_version
+from package_data_version import get_package_data_versions
 
 from time import time
 from util import elapsed
@@ -29,6 +35,15 @@ from util import get_sql_answer
 
 from journal import Journal
 from assumptions import Assumptions
+from scenario_engine import ScenarioEngine
+from scenario_engine import get_scenario_engine_base
+from subscription_state import SubscriptionState
+from budget_frontier import greedy_frontier
+from subscription_optimizer import optimize_subscriptions
+from fuzzed_tiers import fuzzed_tiers
+from fuzzed_tiers import rank_first
+from common_data_store import ColumnView
+from detached_package import DetachedPackage
 
 def get_clean_package_id(http_request_args):
     if not http_request_args:
@@ -42,8 +57,11 @@ def get_clean_package_id(http_request_args):
 
 def get_fresh_journal_list(scenario, my_jwt):
 
-    from package import Package
-    my_package = Package.query.filter(Package.package_id == scenario.package_id).scalar()
+    my_package = scenario.my_package
+    if scenario.package_id != scenario.package_id_for_db:
+        # a demo package's own row, not the demo package the scenario's data comes from
+        from package import Package
+        my_package = DetachedPackage(Package.query.filter(Package.package_id == scenario.package_id).scalar())
 
     journals_to_exclude = ["0370-2693"]
     issn_ls = list(scenario.data["unpaywall_downloads_dict"].keys())
@@ -80,6 +98,26 @@ class Scenario(object):
     def log_timing(self, message):
         self.timing_messages.append("{: <30} {: >6}s".format(message, elapsed(self.section_time, 2)))
         self.section_time = time()
+
+    def copy_for_request(self):
+        """
+        A copy for one request of a scenario that's shared between requests.  It has its own
+        timing, its own data dict and its own journals, which point back at the copy (journals
+        only hold a weak reference to their scenario).  The engine, the subscription state,
+        the settings and the values in data are shared, and requests only read those.
+        """
+        my_copy = copy.copy(self)
+        my_copy.timing_messages = list(self.timing_messages)
+        my_copy.section_time = time()
+        my_copy.data = dict(self.data)
+        my_copy.journals = [copy.copy(journal) for journal in self.journals]
+        for journal in my_copy.journals:
+            journal.set_scenario(my_copy)
+            journal.set_scenario_data(my_copy.data)
+        # these hold the original's journals
+        for name in ["journals_sorted_cpu", "journals_sorted_use_total"]:
+            my_copy.__dict__.pop(name, None)
+        return my_copy
         
     def __init__(self, package_id, http_request_args=None, my_jwt=None):
         self.timing_messages = []
@@ -92,11 +130,12 @@ class Scenario(object):
         self.log_timing("setup")
 
         from package import Package
-        my_package = Package.query.filter(Package.package_id == self.package_id_for_db).first()
-        my_package.unique_issns
+        package = Package.query.filter(Package.package_id == self.package_id_for_db).first()
+        # scenarios are shared between requests, so nothing here can go back to this request's session
+        my_package = DetachedPackage(package)
         self.publisher_name = my_package.publisher
         self.package_name = my_package.package_name
-        my_institution = my_package.institution
+        my_institution = package.institution
         self.institution_name = my_institution.display_name
         self.institution_short_name = my_institution.old_username
         self.institution_id = my_institution.id
@@ -130,12 +169,14 @@ class Scenario(object):
         [j.set_scenario_data(self.data) for j in self.journals]
         self.log_timing("set data in journals")
 
+        self.set_engine()
+        self.log_timing("set engine in journals")
+
         if http_request_args:
-            for journal in self.journals:
-                if journal.issn_l in http_request_args.get("subrs", []):
-                    journal.set_subscribe_bulk()
-                if journal.issn_l in http_request_args.get("customSubrs", []):
-                    journal.set_subscribe_custom()
+            subrs = set(http_request_args.get("subrs", []))
+            custom_subrs = set(http_request_args.get("customSubrs", []))
+            self.set_subscribed([j for j in self.journals if j.issn_l in subrs], bulk=True)
+            self.set_subscribed([j for j in self.journals if j.issn_l in custom_subrs], custom=True)
         self.log_timing("subscribing to all journals")
 
 
@@ -178,16 +219,47 @@ class Scenario(object):
 
         self.data["unpaywall_downloads_dict"] = clean_dict
 
-        # remove this
-        self.data["perpetual_access"] = get_perpetual_access_from_cache(self.package_id)
+        self.data["perpetual_access"] = get_perpetual_access_from_cache(self.package_id, self.data.get("package_data_versions", {}).get(self.package_id, None))
 
         self.data["concepts"] = openalex_best_concepts(self.my_package.unique_issns)
 
 
+    def set_engine(self):
+        from app import USE_PAPER_GROWTH
+        package_id_for_engine = self.package_id_for_db
+        if self.my_package.is_demo:
+            package_id_for_engine = DEMO_PACKAGE_ID
+        issn_ls = [j.issn_l for j in self.journals]
+        # the settings-independent part is shared with earlier scenarios on the same data
+        base = get_scenario_engine_base(issn_ls, self.data, package_id_for_engine, use_paper_growth=USE_PAPER_GROWTH)
+        self.engine = ScenarioEngine(issn_ls,
+                                     self.data,
+                                     self.settings,
+                                     package_id_for_engine,
+                                     use_paper_growth=USE_PAPER_GROWTH,
+                                     base=base)
+        self.subscription_state = SubscriptionState(self.engine)
+        for index, journal in enumerate(self.journals):
+            journal.set_engine(self.engine, index, self.subscription_state)
+
+    def set_subscribed(self, journals, bulk=None, custom=None):
+        # one update of the scenario totals for the lot, then each journal's own flags
+        self.subscription_state.set_subscribed([j.engine_index for j in journals], bulk=bulk, custom=custom)
+        for journal in journals:
+            journal.set_subscribed_flags(bulk=bulk, custom=custom)
+
+    @property
+    def subscribed_mask(self):
+        # in engine order, the order of self.journals
+        return self.subscription_state.subscribed
+
+    def actual_by_year(self, group, prefix="use"):
+        return self.subscription_state.actual_by_year(group, prefix)
+
     @property
     def has_custom_perpetual_access(self):
         # perpetual_access_rows = get_perpetual_access_from_cache([self.package_id])
-        perpetual_access_rows = get_perpetual_access_from_cache(self.package_id)
+        perpetual_access_rows = get_perpetual_access_from_cache(self.package_id, self.data.get("package_data_versions", {}).get(self.package_id, None))
         if perpetual_access_rows:
             return True
         from app import suny_consortium_package_ids
@@ -199,114 +271,135 @@ class Scenario(object):
 
     @cached_property
     def journals_sorted_cpu(self):
-        self.journals.sort(key=lambda k: for_sorting(k.cpu), reverse=False)
-        return self.journals
+        return sorted(self.journals, key=lambda k: for_sorting(k.cpu), reverse=False)
 
     @cached_property
     def journals_sorted_use_total(self):
-        self.journals.sort(key=lambda k: for_sorting(k.use_total), reverse=True)
-        return self.journals
+        return sorted(self.journals, key=lambda k: for_sorting(k.use_total), reverse=True)
 
-    @cached_property
+    @property
     def subscribed(self):
         return [j for j in self.journals_sorted_cpu if j.subscribed]
 
-    @cached_property
+    @property
+    def num_subscribed(self):
+        return self.subscription_state.num_subscribed
+
+    @property
     def subscribed_bulk(self):
         return [j for j in self.journals_sorted_cpu if j.subscribed_bulk]
 
-    @cached_property
+    @property
     def subscribed_custom(self):
         return [j for j in self.journals_sorted_cpu if j.subscribed_custom]
 
-    def fuzzed_lookup(self, var):
-        df = pd.DataFrame({"issn_l": [j.issn_l for j in self.journals], "lookup_value": [getattr(j, var) for j in self.journals]})
-        df["ranked"] = df.lookup_value.rank(method='first', na_option="keep")
-        if df.dropna().empty:
-            return dict(list(zip(df["issn_l"], ["-"] * len(df))))
-        if (len(df) == 1):
-            return dict(list(zip(df["issn_l"], "-")))
-        return dict(list(zip(df.issn_l, pd.qcut(df.ranked,  3, labels=["low", "medium", "high"]))))
+    # the Journal properties that get low/medium/high *_fuzzed versions
+    fuzzed_metrics = ["subscription_cost", "cost_subscription_minus_ill", "num_citations", "num_authorships",
+                      "use_total", "downloads_total", "cpu"]
+
+    def journal_metric(self, name, journals):
+        # what each journal's property gives, with nan for None
+        rows = [j.engine_index for j in journals]
+        if name != "cpu":
+            return getattr(self.engine, name)[rows]
+        # Journal.cpu rounds with python's round, and rankings of near-ties can depend on it
+        use_paywalled = self.engine.use_paywalled[rows]
+        cost_subscription_minus_ill = self.engine.cost_subscription_minus_ill[rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = (cost_subscription_minus_ill / use_paywalled).tolist()
+        return np.array([round(ratio, 6) if paywalled >= 1 else np.nan
+                         for (ratio, paywalled) in zip(ratios, use_paywalled.tolist())])
+
+    @cached_property
+    def fuzzed_lookups(self):
+        # every metric in one pass.  Ties rank in the order of self.journals, which is engine order
+        issn_ls = [j.issn_l for j in self.journals]
+        values = np.column_stack([self.journal_metric(name, self.journals) for name in self.fuzzed_metrics])
+        tiers = fuzzed_tiers(values)
+        return dict((name, dict(zip(issn_ls, tiers[:, column].tolist()))) for (column, name) in enumerate(self.fuzzed_metrics))
 
     @cached_property
     def cost_subscription_fuzzed_lookup(self):
-        return self.fuzzed_lookup('subscription_cost')
+        return self.fuzzed_lookups['subscription_cost']
 
     @cached_property
     def cost_subscription_minus_ill_fuzzed_lookup(self):
-        return self.fuzzed_lookup('cost_subscription_minus_ill')
+        return self.fuzzed_lookups['cost_subscription_minus_ill']
 
     @cached_property
     def num_citations_fuzzed_lookup(self):
-        return self.fuzzed_lookup('num_citations')
+        return self.fuzzed_lookups['num_citations']
 
     @cached_property
     def num_authorships_fuzzed_lookup(self):
-        return self.fuzzed_lookup('num_authorships')
+        return self.fuzzed_lookups['num_authorships']
 
     @cached_property
     def use_total_fuzzed_lookup(self):
-        return self.fuzzed_lookup('use_total')
+        return self.fuzzed_lookups['use_total']
 
     @cached_property
     def downloads_fuzzed_lookup(self):
-        return self.fuzzed_lookup('downloads_total')
+        return self.fuzzed_lookups['downloads_total']
 
     @cached_property
     def cpu_fuzzed_lookup(self):
-        return self.fuzzed_lookup('cpu')
+        return self.fuzzed_lookups['cpu']
+
+    @cached_property
+    def cpu_rank_lookups(self):
+        issn_ls = [j.issn_l for j in self.journals]
+        values = np.column_stack([self.journal_metric("cpu", self.journals), self.journal_metric("old_school_cpu", self.journals)])
+        ranks = rank_first(values)
+        return (dict(zip(issn_ls, ranks[:, 0].tolist())), dict(zip(issn_ls, ranks[:, 1].tolist())))
 
     @cached_property
     def cpu_rank_lookup(self):
-        df = pd.DataFrame({"issn_l": [j.issn_l for j in self.journals], "lookup_value": [j.cpu for j in self.journals]})
-        df["rank"] = df.lookup_value.rank(method='first', na_option="keep")
-        return dict(list(zip(df.issn_l, df["rank"])))
+        return self.cpu_rank_lookups[0]
 
     @cached_property
     def old_school_cpu_rank_lookup(self):
-        df = pd.DataFrame({"issn_l": [j.issn_l for j in self.journals], "lookup_value": [j.old_school_cpu for j in self.journals]})
-        df["rank"] = df.lookup_value.rank(method='first', na_option="keep")
-        return dict(list(zip(df.issn_l, df["rank"])))
+        return self.cpu_rank_lookups[1]
 
 
     @cached_property
     def use_total_by_year(self):
-        return [np.sum([journal.use_total_by_year[year] for journal in self.journals]) for year in range(0, 5)]
+        return list(np.sum(self.engine.use_total_by_year, axis=0))
 
     @cached_property
     def downloads_total_by_year(self):
-        return [np.sum([journal.downloads_total_by_year[year] for journal in self.journals]) for year in range(0, 5)]
+        return list(np.sum(self.engine.downloads_total_by_year, axis=0))
 
     @cached_property
     def use_total(self):
-        return 1 + np.sum([journal.use_total for journal in self.journals])
+        return 1 + np.sum(self.engine.use_total)
 
     @cached_property
     def downloads_total(self):
-        return np.sum([journal.downloads_total for journal in self.journals])
+        return np.sum(self.engine.downloads_total)
 
-    @cached_property
+    @property
     def downloads_actual_by_year(self):
         use = {}
         for group in use_groups:
-            use[group] = [np.sum([journal.downloads_actual_by_year[group][year] for journal in self.journals]) for year in range(0, 5)]
+            use[group] = self.actual_by_year(group, prefix="downloads")
         return use
 
-    @cached_property
+    @property
     def use_actual_by_year(self):
         use = {}
         for group in use_groups:
-            use[group] = [np.sum([journal.use_actual_by_year[group][year] for journal in self.journals]) for year in range(0, 5)]
+            use[group] = self.actual_by_year(group)
         return use
 
-    @cached_property
+    @property
     def downloads(self):
         use = {}
         for group in use_groups:
             use[group] = round(np.mean(self.downloads_actual_by_year[group]))
         return use
 
-    @cached_property
+    @property
     def use_actual(self):
         use = {}
         for group in use_groups:
@@ -315,7 +408,7 @@ class Scenario(object):
 
     @cached_property
     def use_paywalled(self):
-        response = round(sum([j.use_paywalled for j in self.journals if j.use_paywalled]))
+        response = round(np.sum(self.engine.use_paywalled))
         response = max(0, response)
         response = min(response, self.use_total)
         return response
@@ -328,27 +421,27 @@ class Scenario(object):
 
     @cached_property
     def ill_cost(self):
-        return round(sum([j.ill_cost for j in self.journals]))
+        return round(np.sum(self.engine.ill_cost))
 
     @cached_property
     def subscription_cost(self):
-        return round(sum([j.subscription_cost for j in self.journals]))
+        return round(np.sum(self.engine.subscription_cost))
 
     @cached_property
     def cost_subscription_minus_ill(self):
-        return round(sum([j.cost_subscription_minus_ill for j in self.journals]))
+        return round(np.sum(self.engine.cost_subscription_minus_ill))
 
-    @cached_property
+    @property
     def cost(self):
-        return round(sum([j.cost_actual for j in self.journals]), 2)
+        return round(self.subscription_state.total("subscription_cost") + self.subscription_state.total("ill_cost"), 2)
 
-    @cached_property
+    @property
     def cost_actual_ill(self):
-        return round(sum([j.cost_actual for j in self.journals if not j.subscribed]), 2)
+        return round(self.subscription_state.total("ill_cost"), 2)
 
-    @cached_property
+    @property
     def cost_actual_subscription(self):
-        return round(sum([j.cost_actual for j in self.journals if j.subscribed]), 2)
+        return round(self.subscription_state.total("subscription_cost"), 2)
 
 
     @cached_property
@@ -388,19 +481,23 @@ class Scenario(object):
             response = 1.0  # avoid div 0 errors
         return response
 
-    @cached_property
+    @property
     def cost_saved_percent(self):
         return round(100 * float(self.cost_bigdeal_projected - self.cost) / self.cost_bigdeal_projected, 4)
 
-    @cached_property
+    @property
     def cost_spent_percent(self):
         return round(100 * float(self.cost) / self.cost_bigdeal_projected, 4)
 
     @cached_property
+    def use_free_instant(self):
+        return np.sum(self.engine.use_free_instant)
+
+    @property
     def use_instant(self):
-        return 1 + np.sum([journal.use_instant for journal in self.journals])
+        return 1 + self.use_free_instant + self.subscription_state.total("use_subscription")
 
-    @cached_property
+    @property
     def use_instant_by_year(self):
         return [self.use_actual_by_year["social_networks"][year] +
                 self.use_actual_by_year["backfile"][year] +
@@ -408,13 +505,13 @@ class Scenario(object):
                 self.use_actual_by_year["oa"][year]
                 for year in self.years]
 
-    @cached_property
+    @property
     def use_instant_percent(self):
         if not self.use_total:
             return 0
         return round(100 * float(self.use_instant) / self.use_total, 2)
 
-    @cached_property
+    @property
     def use_instant_percent_by_year(self):
         if not self.use_total:
             return [0 for year in self.years]
@@ -430,18 +527,35 @@ class Scenario(object):
     def do_wizardly_things(self, spend):
         my_max = spend/100.0 * self.cost_bigdeal_projected
 
-        my_spend_so_far = np.sum([j.ill_cost for j in self.journals])
-
-        for journal in self.journals_sorted_cpu:
-            if journal.cost_subscription_minus_ill < 0:
-                my_spend_so_far += journal.cost_subscription_minus_ill
-                journal.set_subscribe_bulk()
-
-        for journal in self.journals_sorted_cpu:
-            my_spend_so_far += journal.cost_subscription_minus_ill
-            if my_spend_so_far > my_max:
-                return
-            journal.set_subscribe_bulk()
+        journals = self.journals_sorted_cpu
+        cost_subscription_minus_ill = self.engine.cost_subscription_minus_ill[[j.engine_index for j in journals]]
+        my_spend_so_far = np.sum(self.engine.ill_cost)
+
+        # subscribe to everything cheaper than ill, then down the cpu list until the spend runs out.
+        # running spend after each journal, in the same order the adding used to happen in
+        cheaper_than_ill = cost_subscription_minus_ill < 0
+        running_spend = np.cumsum(np.concatenate([[my_spend_so_far],
+                                                  cost_subscription_minus_ill[cheaper_than_ill],
+                                                  cost_subscription_minus_ill]))
+        over_budget = np.flatnonzero(running_spend[1 + np.sum(cheaper_than_ill):] > my_max)
+        num_within_budget = over_budget[0] if len(over_budget) else len(journals)
+
+        to_subscribe = [j for (j, cheaper) in zip(journals, cheaper_than_ill) if cheaper] + journals[:num_within_budget]
+        self.set_subscribed(to_subscribe, bulk=True)
+
+    def optimize_subscriptions(self, spend):
+        # the subscriptions with the most instant use for spend percent of the projected big deal cost
+        budget = spend/100.0 * self.cost_bigdeal_projected
+        return optimize_subscriptions(self.engine.cost_subscription_minus_ill,
+                                      self.engine.use_subscription,
+                                      budget,
+                                      base_cost=np.sum(self.engine.ill_cost),
+                                      base_use_instant=1 + self.use_free_instant)
+
+    def do_optimized_things(self, spend):
+        result = self.optimize_subscriptions(spend)
+        self.set_subscribed([j for j in self.journals if result["subscribed"][j.engine_index]], bulk=True)
+        return result
 
     # Scott here: not used AFAICT
     # @cached_property
@@ -450,11 +564,11 @@ class Scenario(object):
 
     @cached_property
     def num_citations(self):
-        return round(np.sum([j.num_citations for j in self.journals]), 4)
+        return round(np.sum(self.engine.num_citations), 4)
 
     @cached_property
     def num_authorships(self):
-        return round(np.sum([j.num_authorships for j in self.journals]), 4)
+        return round(np.sum(self.engine.num_authorships), 4)
 
     @cached_property
     def num_citations_weight_percent(self):
@@ -466,64 +580,64 @@ class Scenario(object):
 
     @cached_property
     def use_social_networks(self):
-        return round(np.sum([j.use_social_networks for j in self.journals]))
+        return round(np.sum(self.engine.use_social_networks))
 
     @cached_property
     def use_oa(self):
-        return round(np.sum([j.use_actual["oa_plus_social_networks"] for j in self.journals]))
+        return round(np.sum(self.engine.use_oa_plus_social_networks))
 
     @cached_property
     def use_backfile(self):
-        return round(np.sum([j.use_actual["backfile"] for j in self.journals]))
+        return round(np.sum(self.engine.use_backfile))
 
-    @cached_property
+    @property
     def use_subscription(self):
-        response = round(np.sum([j.use_actual["subscription"] for j in self.journals]))
+        response = round(self.subscription_state.total("use_subscription"))
         if not response:
             response = 0.0
         return response
 
-    @cached_property
+    @property
     def use_ill(self):
-        return round(np.sum([j.use_actual["ill"] for j in self.journals]))
+        return round(self.subscription_state.total("use_ill"))
 
-    @cached_property
+    @property
     def use_other_delayed(self):
-        return round(np.sum([j.use_actual["other_delayed"] for j in self.journals]))
+        return round(self.subscription_state.total("use_other_delayed"))
 
     @cached_property
     def use_green(self):
-        return round(np.sum([j.use_oa_green for j in self.journals]))
+        return round(np.sum(self.engine.use_oa_green))
 
     @cached_property
     def use_hybrid(self):
-        return round(np.sum([j.use_oa_hybrid for j in self.journals]))
+        return round(np.sum(self.engine.use_oa_hybrid))
 
     @cached_property
     def use_bronze(self):
-        return round(np.sum([j.use_oa_bronze for j in self.journals]))
+        return round(np.sum(self.engine.use_oa_bronze))
 
     @cached_property
     def use_peer_reviewed(self):
-        return round(np.sum([j.use_oa_peer_reviewed for j in self.journals]))
+        return round(np.sum(self.engine.use_oa_peer_reviewed))
 
     @cached_property
     def downloads_counter_multiplier(self):
-        return round(np.mean([j.downloads_counter_multiplier for j in self.journals]), 4)
+        return round(np.mean(self.engine.downloads_counter_multiplier), 4)
 
     @cached_property
     def use_weight_multiplier(self):
-        return round(np.mean([j.use_weight_multiplier for j in self.journals]), 4)
+        return round(np.mean(self.engine.use_weight_multiplier), 4)
 
-    @cached_property
+    @property
     def use_subscription_percent(self):
         return round(float(100)*self.use_subscription/self.use_total, 1)
 
-    @cached_property
+    @property
     def use_ill_percent(self):
         return round(float(100)*self.use_ill/self.use_total, 1)
 
-    @cached_property
+    @property
     def use_free_instant_percent(self):
         return round(self.use_instant_percent - self.use_subscription_percent, 1)
 
@@ -548,7 +662,7 @@ class Scenario(object):
 
     def to_dict_summary_dict(self):
         response = OrderedDict()
-        response["num_journals_subscribed"] =  len(self.subscribed)
+        response["num_journals_subscribed"] = self.num_subscribed
 
         response["cost_scenario_subscription"] = self.cost_actual_subscription
 
@@ -574,6 +688,59 @@ class Scenario(object):
 
         return response
 
+    def to_dict_frontier(self):
+        # cost vs instant access for every spend do_wizardly_things could be given, starting from nothing subscribed
+        journals = self.journals_sorted_cpu
+        rows = [j.engine_index for j in journals]
+        (added, cost, use_instant, num_subscribed) = greedy_frontier(self.engine.cost_subscription_minus_ill[rows],
+                                                                     self.engine.use_subscription[rows],
+                                                                     np.sum(self.engine.ill_cost),
+                                                                     1 + self.use_free_instant)
+        cost_percent = np.round(100 * cost / self.cost_bigdeal_projected, 4)
+        use_instant_percent = np.round(100 * use_instant / self.use_total, 2)
+
+        frontier = []
+        for i, (my_cost, my_cost_percent, my_use_instant_percent, my_num_subscribed) in enumerate(
+                zip(np.round(cost, 2).tolist(), cost_percent.tolist(), use_instant_percent.tolist(), num_subscribed.tolist())):
+            frontier.append({
+                "issn_l": journals[added[i - 1]].issn_l if i else None,
+                "num_journals_subscribed": my_num_subscribed,
+                "cost": my_cost,
+                "cost_percent": my_cost_percent,
+                "use_instant_percent": my_use_instant_percent,
+            })
+
+        response = {
+                "_settings": self.settings.to_dict(),
+                "cost_bigdeal_projected": self.cost_bigdeal_projected,
+                "num_journals_total": len(self.journals),
+                "frontier": frontier,
+            }
+        self.log_timing("to dict")
+        response["_timing"] = self.timing_messages
+        return response
+
+    def to_dict_optimized(self, spend):
+        result = self.optimize_subscriptions(spend)
+        response = {
+                "_settings": self.settings.to_dict(),
+                "spend": spend,
+                "cost_bigdeal_projected": self.cost_bigdeal_projected,
+                "subrs": [j.issn_l for j in self.journals_sorted_cpu if result["subscribed"][j.engine_index]],
+                "num_journals_subscribed": int(np.sum(result["subscribed"])),
+                "cost": round(float(result["cost"]), 2),
+                "cost_percent": round(100 * float(result["cost"]) / self.cost_bigdeal_projected, 4),
+                "use_instant_percent": round(100 * float(result["use_instant"]) / self.use_total, 2),
+                "use_instant_percent_upper_bound": round(100 * float(result["upper_bound"]) / self.use_total, 2),
+                "optimality_gap": float(result["optimality_gap"]),
+                "is_optimal": bool(result["is_optimal"]),
+                "is_feasible": bool(result["is_feasible"]),
+                "method": result["method"],
+            }
+        self.log_timing("optimize subscriptions")
+        response["_timing"] = self.timing_messages
+        return response
+
     def to_dict(self):
         response = {
                 "_settings": self.settings.to_dict(),
@@ -589,12 +756,12 @@ class Scenario(object):
         return "<{} (n={})>".format(self.__class__.__name__, len(self.journals))
 
 
-@cache
+@invalidatable_cache
 def get_parent_consortium_package_id(package_id):
     q = """select consortium_package_id from jump_account_package where package_id = '{}'""".format(package_id)
     return get_sql_answer(db, q)
 
-@cache
+@invalidatable_cache
 def get_consortium_package_ids(package_id):
     command = "select package_id from jump_account_package where consortium_package_id=%s"
     rows = None
@@ -640,7 +807,7 @@ def get_counter_totals_from_db(package_id):
                 counter_dict[row["issn_l"]] += row.get("total")
     return counter_dict
 
-# don't cache because called after loading to get fresh data
+# not cached itself: get_package_specific_scenario_data caches it under the package data version
 def get_package_specific_scenario_data_from_db(package_id):
     timing = []
     section_time = time()
@@ -700,7 +867,12 @@ def get_package_specific_scenario_data_from_db(package_id):
 
     return data
 
-@cache
+# a new upload or delete bumps the package's data version, so this never serves data from before it
+@memorycache(shared=True)
+def get_package_specific_scenario_data(package_id, package_data_version):
+    return get_package_specific_scenario_data_from_db(package_id)
+
+@invalidatable_cache
 def get_apc_data_from_db(input_package_id):
     if input_package_id == DEMO_PACKAGE_ID or input_package_id.startswith("demo"):
         input_package_id = DEMO_PACKAGE_ID
@@ -716,9 +888,22 @@ def get_apc_data_from_db(input_package_id):
 
     return rows
 
+def reset_apc_data_cache(package_id):
+    """After jump_apc_authorships changes for package_id: evicts its apc data, and its consortium's, which includes it."""
+    reset_cache("scenario", "get_apc_data_from_db", package_id)
+    consortium_package_id = get_parent_consortium_package_id(package_id)
+    if consortium_package_id:
+        reset_cache("scenario", "get_apc_data_from_db", consortium_package_id)
+
+
 
+def get_perpetual_access_from_cache(package_id, package_data_version=None):
+    if package_data_version is None:
+        package_data_version = get_package_data_version(package_id)
+    return get_perpetual_access_for_version(package_id, package_data_version)
 
-def get_perpetual_access_from_cache(package_id):
+@memorycache(shared=True)
+def get_perpetual_access_for_version(package_id, package_data_version):
     command = "select * from jump_perpetual_access where package_id=%s"
     with get_db_cursor() as cursor:
         cursor.execute(command, (package_id,))
@@ -727,8 +912,13 @@ def get_perpetual_access_from_cache(package_id):
     return package_dict
 
 
-@cache
-def get_core_list_from_db(input_package_id):
+def get_core_list_from_db(input_package_id, package_data_version=None):
+    if package_data_version is None:
+        package_data_version = get_package_data_version(input_package_id)
+    return get_core_list_for_version(input_package_id, package_data_version)
+
+@memorycache(shared=True)
+def get_core_list_for_version(input_package_id, package_data_version):
     command = "select issn_l, baseline_access from jump_core_journals where package_id=%s"
     with get_db_cursor() as cursor:
         cursor.execute(command, (input_package_id,))
@@ -783,19 +973,33 @@ def openalex_export_concepts(concepts, issns):
 
 def include_keys(dictionary, keys):
     """Filters a dict by only including certain keys."""
-    key_set = set(keys) & set(dictionary.keys())
-    return {key: dictionary[key] for key in key_set}
+    if isinstance(dictionary, ColumnView):
+        return dictionary.subset(set(keys))
+    return {key: dictionary[key] for key in set(keys) if key in dictionary}
 
-def get_embargo_data_from_json(issns):
+def get_embargo_data_from_json(common_data_dict, issns):
     return include_keys(common_data_dict['embargo_dict'], issns)
 
-def get_unpaywall_downloads_from_json(issns):
+def get_unpaywall_downloads_from_json(common_data_dict, issns):
     return include_keys(common_data_dict['unpaywall_downloads_dict_raw'], issns)
 
-def get_num_papers_from_json(issns):
+def get_num_papers_from_json(common_data_dict, issns):
     return include_keys(common_data_dict['num_papers'], issns)
 
-def get_oa_data_from_json(issns):
+def get_download_curves_from_json(common_data_dict, issns):
+    # older common data files don't have the curves, so scenarios fit them themselves
+    download_curves = common_data_dict.get("download_curves", None)
+    if not download_curves:
+        return None
+    response = dict(download_curves)
+    if isinstance(download_curves["issn_ls"], ColumnView):
+        response["issn_ls"] = list(download_curves["issn_ls"].subset(issns))
+    else:
+        response["issn_ls"] = list(set(download_curves["issn_ls"]) & set(issns))
+    response["curves"] = include_keys(download_curves["curves"], issns)
+    return response
+
+def get_oa_data_from_json(common_data_dict, issns):
     oa_dict = {}
     for submitted in ["with_submitted", "no_submitted"]:
         for bronze in ["with_bronze", "no_bronze"]:
@@ -803,10 +1007,10 @@ def get_oa_data_from_json(issns):
             oa_dict[key] = include_keys(common_data_dict['oa'][key], issns)
     return oa_dict
 
-def get_society_data_from_json(issns):
+def get_society_data_from_json(common_data_dict, issns):
     return include_keys(common_data_dict['society'], issns)
 
-def get_social_networks_data_from_json(issns):
+def get_social_networks_data_from_json(common_data_dict, issns):
     return include_keys(common_data_dict['social_networks'], issns)
 
 # not cached on purpose, because components are cached to save space
@@ -834,23 +1038,43 @@ def get_common_package_data_specific(package_id):
         my_data["member_package_ids"] = [package_id]
     my_timing.log_timing("get_consortium_package_ids")
 
+    # one query for all the versions, then each member's data is cached under its version
+    my_data["package_data_versions"] = get_package_data_versions(my_data["member_package_ids"] + [package_id])
+    my_timing.log_timing("get_package_data_versions")
+
     for member_package_id in my_data["member_package_ids"]:
-        my_data[member_package_id] = get_package_specific_scenario_data_from_db(member_package_id)
-        my_timing.log_timing("get_package_specific_scenario_data_from_db")
+        my_data[member_package_id] = get_package_specific_scenario_data(member_package_id, my_data["package_data_versions"][member_package_id])
+        my_timing.log_timing("get_package_specific_scenario_data")
 
-    my_data["core_list"] = get_core_list_from_db(package_id)
+    my_data["core_list"] = get_core_list_from_db(package_id, my_data["package_data_versions"][package_id])
     my_timing.log_timing("get_core_list_from_db")
 
     return (my_data, my_timing)
 
-@memorycache
+def get_package_data_versions_for(package_id):
+    # the data versions of a package and its consortium members: what its scenarios are computed from
+    package_ids = (get_consortium_package_ids(package_id) or []) + [package_id]
+    return get_package_data_versions(package_ids)
+
+def get_issns_cache_key(issns):
+    # a short stand-in for the whole issn list in the memorycache key
+    return hashlib.sha1("\n".join(sorted(set(issns))).encode("utf-8")).hexdigest()[:16]
+
 def get_common_package_data_for(issns = None):
+    issns = tuple(sorted(set(issns)))
+    # the version is in the key, so a newly published version of the common data isn't served from the cache
+    (common_data_version, common_data_dict) = get_common_data()
+    return get_common_package_data_for_issns(common_data_version, get_issns_cache_key(issns), issns=issns, common_data_dict=common_data_dict)
+
+# memorycache keys on the positional args only, so the issns and the data go in as kwargs
+@memorycache
+def get_common_package_data_for_issns(common_data_version, issns_cache_key, issns=None, common_data_dict=None):
     my_data = {}
-    issns = tuple(issns)
-    my_data["embargo_dict"] = get_embargo_data_from_json(issns)
-    my_data["unpaywall_downloads_dict_raw"] = get_unpaywall_downloads_from_json(issns)
-    my_data["social_networks"] = get_social_networks_data_from_json(issns)
-    my_data["oa"] = get_oa_data_from_json(issns)
-    my_data["society"] = get_society_data_from_json(issns)
-    my_data["num_papers"] = get_num_papers_from_json(issns)
+    my_data["embargo_dict"] = get_embargo_data_from_json(common_data_dict, issns)
+    my_data["unpaywall_downloads_dict_raw"] = get_unpaywall_downloads_from_json(common_data_dict, issns)
+    my_data["social_networks"] = get_social_networks_data_from_json(common_data_dict, issns)
+    my_data["oa"] = get_oa_data_from_json(common_data_dict, issns)
+    my_data["society"] = get_society_data_from_json(common_data_dict, issns)
+    my_data["num_papers"] = get_num_papers_from_json(common_data_dict, issns)
+    my_data["download_curves"] = get_download_curves_from_json(common_data_dict, issns)
     return my_data
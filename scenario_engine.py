@@ -0,0 +1,918 @@
+# coding: utf-8
+
+import datetime
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from cached_property import cached_property
+from cached_property import threaded_cached_property
+
+from batch_curve_fit import fit_download_curves
+from batch_curve_fit import fit_num_papers_lines
+from common_data_store import OaView
+
+# from future of OA paper, modified to be just elsevier, all colours
+default_download_by_age = [0.371269, 0.137739, 0.095896, 0.072885, 0.058849]
+default_download_older_than_five_years = 1.0 - sum(default_download_by_age)
+
+
+def get_perpetual_access_years(perpetual_access_row, candidate_years):
+    # if two dates, that is the perpetual access range
+    # if a start date and no end date, then has perpetual access till the model says it doesn't
+    # if no start date, then no perpetual access
+    start_date = perpetual_access_row["start_date"]
+    end_date = perpetual_access_row["end_date"]
+
+    if not start_date:
+        start_date = datetime.datetime(1850, 1, 1)  # far in the past
+    if not end_date:
+        end_date = datetime.datetime(2042, 1, 2)  # far in the future, let's really hope we have universal OA by then
+
+    try:
+        start_date = start_date.isoformat()
+    except:
+        pass
+    try:
+        end_date = end_date.isoformat()
+    except:
+        pass
+
+    response = []
+    for year in candidate_years:
+        working_date = datetime.datetime(year, 1, 2).isoformat()  # use January 2nd
+        if working_date > start_date and working_date < end_date:
+            response.append(year)
+    return response
+
+
+def lookup_by_year(my_dict, years):
+    # the year is a string key alas, depending on whether it came from the cache or the db
+    if my_dict and isinstance(list(my_dict.keys())[0], int):
+        return [my_dict.get(year, 0) for year in years]
+    return [my_dict.get(str(year), 0) for year in years]
+
+
+def get_num_papers_years(now, use_paper_growth=False):
+    historical_years = list(range(now.year - 5, now.year))
+    if use_paper_growth:
+        return historical_years
+    return [year - 1 for year in historical_years]
+
+
+def get_download_curve_inputs(issn_ls, unpaywall_downloads_dict, num_papers_dict, num_papers_years):
+    # the only inputs to the download curve fits, which don't depend on the package
+    downloads_by_age = np.zeros((len(issn_ls), 5))
+    papers_2021 = np.zeros(len(issn_ls))
+    raw_num_papers_historical_by_year = np.zeros((len(issn_ls), 5))
+    for index, issn_l in enumerate(issn_ls):
+        row = unpaywall_downloads_dict.get(issn_l, None) or {}
+        downloads_by_age[index] = [row.get("downloads_{}y".format(age), 0) or 0 for age in range(0, 5)]
+        papers_2021[index] = row.get("num_papers_2021", 0) or 0
+        if issn_l in num_papers_dict:
+            raw_num_papers_historical_by_year[index] = lookup_by_year(num_papers_dict[issn_l], num_papers_years)
+        else:
+            raw_num_papers_historical_by_year[index] = papers_2021[index]
+    return (downloads_by_age, papers_2021, raw_num_papers_historical_by_year)
+
+
+def fit_download_curves_for_papers(downloads_by_age, raw_num_papers_historical_by_year):
+    # although the curve fit is on downloads, download number probably off if there are some years with no papers,
+    # so only fit the journals with papers in every year
+    num_journals = len(downloads_by_age)
+    y_fit = np.full((num_journals, 5), np.nan)
+    r_squared = np.full(num_journals, np.nan)
+    params = np.full((num_journals, 3), np.nan)
+    fitted = np.zeros(num_journals, dtype=bool)
+    rows = np.flatnonzero(np.all(raw_num_papers_historical_by_year != 0, axis=1))
+    if len(rows):
+        (y_fit[rows], r_squared[rows], params[rows], fitted[rows]) = fit_download_curves(downloads_by_age[rows])
+    return (y_fit, r_squared, params, fitted)
+
+
+def get_download_curves(unpaywall_downloads_dict, num_papers_dict, now=None, use_paper_growth=False):
+    """
+    Download curve fits for every issn_l in unpaywall_downloads_dict, for the common data.
+
+    Curves are before counter correction, so a scenario only has to scale them by its
+    package's counter multiplier.  num_papers_years records the paper years the fits saw,
+    so scenarios in a later year know to refit.
+    """
+    now = now or datetime.datetime.utcnow()
+    num_papers_years = get_num_papers_years(now, use_paper_growth)
+    issn_ls = list(unpaywall_downloads_dict.keys())
+    (downloads_by_age, papers_2021, raw_num_papers_historical_by_year) = get_download_curve_inputs(
+        issn_ls, unpaywall_downloads_dict, num_papers_dict, num_papers_years)
+    (y_fit, r_squared, params, fitted) = fit_download_curves_for_papers(downloads_by_age, raw_num_papers_historical_by_year)
+
+    curves = {}
+    for index in np.flatnonzero(fitted):
+        curves[issn_ls[index]] = {"y_fit": y_fit[index].tolist(),
+                                  "r_squared": r_squared[index].item(),
+                                  "params": params[index].tolist()}
+    return {"num_papers_years": num_papers_years,
+            "use_paper_growth": use_paper_growth,
+            "issn_ls": issn_ls,
+            "curves": curves}
+
+
+class ScenarioEngineBase(object):
+    """
+    The part of the per-journal model that doesn't depend on the scenario's settings.
+
+    Papers, download curves, counter multipliers, citations, perpetual access and the historical
+    OA counts only change when the package's data does, so one base can back every ScenarioEngine
+    built on that data whatever the settings.  get_scenario_engine_base keeps them across requests.
+    """
+    years = list(range(0, 5))
+
+    def __init__(self, issn_ls, scenario_data, package_id_for_db, now=None, use_paper_growth=False):
+        self.issn_ls = list(issn_ls)
+        self.package_id_for_db = package_id_for_db
+        self.now = now or datetime.datetime.utcnow()
+        self.use_paper_growth = use_paper_growth
+        self.index_by_issn_l = dict((issn_l, index) for index, issn_l in enumerate(self.issn_ls))
+        self.oa_historical_by_lookup = {}
+        self.oa_lock = threading.Lock()
+        self.load_inputs(scenario_data)
+
+    def __len__(self):
+        return len(self.issn_ls)
+
+    @cached_property
+    def historical_years_by_year(self):
+        return list(range(self.now.year - 5, self.now.year))
+
+    @cached_property
+    def num_papers_years(self):
+        return get_num_papers_years(self.now, self.use_paper_growth)
+
+    @cached_property
+    def year_by_perpetual_access_years(self):
+        return list(range(self.now.year - 10, self.now.year))
+
+    def load_inputs(self, scenario_data):
+        num_journals = len(self.issn_ls)
+        shape = (num_journals, len(self.years))
+
+        self.downloads_total_before_counter_correction_raw = np.zeros(num_journals)
+        self.downloads_counter_multiplier = np.zeros(num_journals)
+        self.num_citations_historical_by_year = np.zeros(shape)
+        self.num_authorships_historical_by_year = np.zeros(shape)
+        self.bronze_oa_embargo_months = np.full(num_journals, np.nan)
+        self.social_network_multiplier_if_included = np.zeros(num_journals)
+        self.perpetual_access_years = [[] for issn_l in self.issn_ls]
+        self.perpetual_access_mask = np.zeros((num_journals, len(self.year_by_perpetual_access_years)), dtype=bool)
+
+        package_data = scenario_data.get(self.package_id_for_db, None)
+        historical_years = self.historical_years_by_year
+        (self.downloads_by_age_before_counter_correction, self.papers_2021, self.raw_num_papers_historical_by_year) = get_download_curve_inputs(
+            self.issn_ls, scenario_data["unpaywall_downloads_dict"], scenario_data["num_papers"], self.num_papers_years)
+        self.precomputed_download_curves = scenario_data.get("download_curves", None)
+        # the rows are only aggregated for the OA settings some scenario asks for
+        self.oa_lookups = scenario_data["oa"]
+
+        for index, issn_l in enumerate(self.issn_ls):
+            row = scenario_data["unpaywall_downloads_dict"].get(issn_l, None) or {}
+
+            self.downloads_total_before_counter_correction_raw[index] = row.get("downloads_total", 0.0) or 0.0
+
+            try:
+                counter_for_this_journal = package_data["counter_dict"][issn_l]
+                self.downloads_counter_multiplier[index] = float(counter_for_this_journal) / max(1.0, row.get("downloads_total", 0.0))
+            except:
+                self.downloads_counter_multiplier[index] = float(0)
+
+            if package_data is not None:
+                self.num_citations_historical_by_year[index] = lookup_by_year(package_data.get("citation_dict", {}).get(issn_l, {}), historical_years)
+                self.num_authorships_historical_by_year[index] = lookup_by_year(package_data.get("authorship_dict", {}).get(issn_l, {}), historical_years)
+
+            embargo = scenario_data["embargo_dict"].get(issn_l, None)
+            if embargo is not None:
+                self.bronze_oa_embargo_months[index] = embargo
+
+            self.social_network_multiplier_if_included[index] = scenario_data["social_networks"].get(issn_l, 0.06) or 0.0
+
+            if issn_l in scenario_data["perpetual_access"]:
+                years_with_access = get_perpetual_access_years(scenario_data["perpetual_access"][issn_l], self.year_by_perpetual_access_years)
+                self.perpetual_access_years[index] = years_with_access
+                for year in years_with_access:
+                    self.perpetual_access_mask[index, self.year_by_perpetual_access_years.index(year)] = True
+
+    def oa_historical_by_year(self, lookup_key):
+        """
+        Historical OA paper counts from one of the common data's OA lookups ("with_submitted_with_bronze"
+        and so on), as (green, hybrid, bronze, all statuses) journal x year arrays.
+        """
+        with self.oa_lock:
+            if lookup_key not in self.oa_historical_by_lookup:
+                self.oa_historical_by_lookup[lookup_key] = self.aggregate_oa_rows(self.oa_lookups[lookup_key])
+            return self.oa_historical_by_lookup[lookup_key]
+
+    def aggregate_oa_rows(self, oa_lookup):
+        historical_years = self.historical_years_by_year
+        shape = (len(self), len(self.years))
+        if isinstance(oa_lookup, OaView):
+            # the common data store has them counted already, so it's just slicing
+            (statuses, counts) = oa_lookup.counts_by_year(self.issn_ls, historical_years)
+            counts = counts.astype(float)
+            by_status = [counts[:, statuses.index(oa_status)] if oa_status in statuses else np.zeros(shape)
+                         for oa_status in ["green", "hybrid", "bronze"]]
+            return (by_status[0], by_status[1], by_status[2], np.sum(counts, axis=1))
+
+        num_by_status = dict((oa_status, np.zeros(shape)) for oa_status in ["green", "hybrid", "bronze"])
+        num_all = np.zeros(shape)
+        for index, issn_l in enumerate(self.issn_ls):
+            oa_counts = {}
+            for oa_row in oa_lookup.get(issn_l, []):
+                oa_counts[(oa_row["fresh_oa_status"], round(oa_row["year_int"]))] = round(oa_row["count"])
+            for (oa_status, year), count in oa_counts.items():
+                if year in historical_years:
+                    year_index = historical_years.index(year)
+                    if oa_status in num_by_status:
+                        num_by_status[oa_status][index, year_index] = count
+                    num_all[index, year_index] += count
+        return (num_by_status["green"], num_by_status["hybrid"], num_by_status["bronze"], num_all)
+
+
+    def row_mean(self, values, decimals=4):
+        return np.round(np.mean(values, axis=1), decimals)
+
+    # papers
+
+    @threaded_cached_property
+    def num_papers_curve_fit(self):
+        threshold = 0.25
+        if self.use_paper_growth:
+            threshold = 0.1
+        return fit_num_papers_lines(self.raw_num_papers_historical_by_year, threshold)
+
+    def curve_fit_for_num_papers(self, index):
+        (y_fit, r_squared, params, y_extrap, used, fitted) = self.num_papers_curve_fit
+        if not fitted[index]:
+            return {}
+        return {"y_fit": y_fit[index][used[index]].tolist(),
+                "x": np.flatnonzero(used[index]).tolist(),
+                "r_squared": r_squared[index].item(),
+                "params": params[index].tolist(),
+                "y_extrap": y_extrap[index].tolist(),
+                "input_y": self.raw_num_papers_historical_by_year[index][used[index]].tolist()}
+
+    @cached_property
+    def use_default_num_papers_curve(self):
+        if not self.use_paper_growth:
+            return np.ones(len(self), dtype=bool)
+        # make sure it includes at least 4 years and the most recent year
+        raw = self.raw_num_papers_historical_by_year
+        num_nonzero_paper_years = np.sum(raw >= 0.1 * raw[:, 4:5], axis=1)
+        (y_fit, r_squared, params, y_extrap, used, fitted) = self.num_papers_curve_fit
+        with np.errstate(invalid="ignore"):
+            good_fit = fitted & (r_squared >= -0.1)
+        return ~((num_nonzero_paper_years >= 4) & (self.papers_2021 != 0) & good_fit)
+
+    @cached_property
+    def num_papers_by_year(self):
+        response = np.repeat(self.papers_2021[:, np.newaxis], len(self.years), axis=1)
+        for index in np.flatnonzero(~self.use_default_num_papers_curve):
+            # only let it drop down below 25% of the most recent year
+            floor = int(round(self.papers_2021[index] * 0.5))
+            response[index] = [max(floor, num) for num in self.num_papers_curve_fit[3][index]]
+        return response
+
+    @cached_property
+    def num_papers(self):
+        return np.rint(np.mean(self.num_papers_by_year, axis=1))
+
+    @cached_property
+    def num_papers_growth_from_2018_by_year(self):
+        return np.round(self.num_papers_by_year / (self.num_papers_by_year[:, 4:5] + 1), 4)
+
+    @cached_property
+    def growth_scaling_downloads(self):
+        return self.num_papers_growth_from_2018_by_year
+
+    @cached_property
+    def growth_scaling_oa_downloads(self):
+        return self.growth_scaling_downloads
+
+    # downloads
+
+    @threaded_cached_property
+    def download_curve_fit(self):
+        # use the fits from the common data when they were made from the same paper years,
+        # and only fit the journals it doesn't have
+        precomputed = self.precomputed_download_curves
+        if not precomputed or precomputed["num_papers_years"] != self.num_papers_years or precomputed["use_paper_growth"] != self.use_paper_growth:
+            return fit_download_curves_for_papers(self.downloads_by_age_before_counter_correction, self.raw_num_papers_historical_by_year)
+
+        y_fit = np.full((len(self), 5), np.nan)
+        r_squared = np.full(len(self), np.nan)
+        params = np.full((len(self), 3), np.nan)
+        fitted = np.zeros(len(self), dtype=bool)
+        known_issn_ls = set(precomputed["issn_ls"])
+        missing = []
+        for index, issn_l in enumerate(self.issn_ls):
+            if issn_l in precomputed["curves"]:
+                curve = precomputed["curves"][issn_l]
+                y_fit[index] = curve["y_fit"]
+                r_squared[index] = curve["r_squared"]
+                params[index] = curve["params"]
+                fitted[index] = True
+            elif issn_l not in known_issn_ls:
+                missing.append(index)
+        if missing:
+            (y_fit[missing], r_squared[missing], params[missing], fitted[missing]) = fit_download_curves_for_papers(
+                self.downloads_by_age_before_counter_correction[missing], self.raw_num_papers_historical_by_year[missing])
+        return (y_fit, r_squared, params, fitted)
+
+    def curve_fit_for_downloads(self, index):
+        (y_fit, r_squared, params, fitted) = self.download_curve_fit
+        if not fitted[index]:
+            return {}
+        return {"y_fit": y_fit[index].tolist(),
+                "r_squared": r_squared[index].item(),
+                "params": params[index].tolist(),
+                "input_y": self.downloads_by_age_before_counter_correction[index].tolist()}
+
+    @cached_property
+    def use_default_download_curve(self):
+        (y_fit, r_squared, params, fitted) = self.download_curve_fit
+        with np.errstate(invalid="ignore"):
+            return ~(fitted & (r_squared >= 0.75))
+
+    @cached_property
+    def downloads_by_age(self):
+        default_curve = np.sum(self.downloads_by_age_before_counter_correction, axis=1)[:, np.newaxis] * np.array(default_download_by_age)
+        curve_to_use = np.where(self.use_default_download_curve[:, np.newaxis], default_curve, self.download_curve_fit[0])
+        return np.maximum(curve_to_use * self.downloads_counter_multiplier[:, np.newaxis], 0.0)
+
+    @cached_property
+    def raw_downloads_by_age(self):
+        return self.downloads_by_age_before_counter_correction * self.downloads_counter_multiplier[:, np.newaxis]
+
+    @cached_property
+    def downloads_scaled_by_counter_by_year(self):
+        # TODO is flat right now
+        scaled = np.maximum(1.0, self.downloads_total_before_counter_correction_raw) * self.downloads_counter_multiplier
+        return np.repeat(scaled[:, np.newaxis], len(self.years), axis=1)
+
+    @cached_property
+    def downloads_total_by_year(self):
+        return self.downloads_scaled_by_counter_by_year * self.growth_scaling_downloads
+
+    @cached_property
+    def downloads_total(self):
+        return self.row_mean(self.downloads_total_by_year)
+
+    @cached_property
+    def downloads_total_older_than_five_years(self):
+        return np.where(self.use_default_download_curve,
+                        default_download_older_than_five_years * self.downloads_total,
+                        self.downloads_total - np.sum(self.downloads_by_age, axis=1))
+
+    @cached_property
+    def downloads_per_paper_by_age(self):
+        num_papers = self.num_papers[:, np.newaxis]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(num_papers != 0, self.downloads_by_age / num_papers, 0.0)
+
+    # obs x pub matrices, journal x obs year x pub year
+
+    @cached_property
+    def obs_years(self):
+        return list(range(self.now.year, self.now.year + 5))
+
+    @cached_property
+    def pub_years(self):
+        return list(range(self.now.year - 10, self.now.year + 5))
+
+    @cached_property
+    def age_by_obs_pub(self):
+        # index into by_age for each cell: 0-4 by age, 5-9 the older-than-five-years share, 10 nothing
+        ages = np.array(self.obs_years)[:, np.newaxis] - np.array(self.pub_years)[np.newaxis, :]
+        return np.where((ages >= 0) & (ages <= 9), ages, 10)
+
+    def obs_pub_matrix(self, by_age, by_age_old, growth_scaling):
+        by_any_age = np.concatenate([np.rint(by_age),
+                                     np.repeat(np.rint(by_age_old)[:, np.newaxis], 5, axis=1),
+                                     np.zeros((len(self), 1))], axis=1)
+        cells = by_any_age[:, self.age_by_obs_pub] * growth_scaling[:, :, np.newaxis]
+        return np.rint(cells).astype(np.int64)
+
+    def sum_obs_pub_matrix_by_obs(self, my_obs_pub_matrix):
+        return np.sum(my_obs_pub_matrix, axis=2)
+
+    @cached_property
+    def downloads_obs_pub(self):
+        return self.obs_pub_matrix(self.downloads_by_age,
+                                   self.downloads_total_older_than_five_years/5.0,
+                                   self.growth_scaling_downloads)
+
+    @cached_property
+    def perpetual_access_pub_mask(self):
+        # journal x pub year, true where the pub year is a perpetual access year
+        response = np.zeros((len(self), len(self.pub_years)), dtype=bool)
+        response[:, :len(self.year_by_perpetual_access_years)] = self.perpetual_access_mask
+        return response
+
+    @cached_property
+    def perpetual_access_half_pub_mask(self):
+        # the pub year right after a perpetual access year counts for half
+        response = np.zeros(self.perpetual_access_pub_mask.shape, dtype=bool)
+        response[:, 1:] = self.perpetual_access_pub_mask[:, :-1]
+        return response & ~self.perpetual_access_pub_mask
+
+    # usage
+
+    @cached_property
+    def num_citations(self):
+        return self.row_mean(self.num_citations_historical_by_year)
+
+    @cached_property
+    def num_authorships(self):
+        return self.row_mean(self.num_authorships_historical_by_year)
+
+
+
+class ScenarioEngine(object):
+    """
+    Computes the per-journal model for every journal in a scenario at once.
+
+    Values are (journals x years) numpy arrays, or (journals,) arrays for the
+    averages, with one row per issn_l in the order given to the constructor.
+    Property names match the Journal properties they back.
+
+    Everything that doesn't depend on the settings comes from a ScenarioEngineBase, built here
+    unless one is passed in; only the settings-dependent stage below is computed per engine.
+    """
+    years = list(range(0, 5))
+
+    def __init__(self, issn_ls, scenario_data, settings, package_id_for_db, now=None, use_paper_growth=False, base=None):
+        if base is None:
+            base = ScenarioEngineBase(issn_ls, scenario_data, package_id_for_db, now=now, use_paper_growth=use_paper_growth)
+        self.base = base
+        self.issn_ls = base.issn_ls
+        self.settings = settings
+        self.package_id_for_db = package_id_for_db
+        self.now = base.now
+        self.use_paper_growth = base.use_paper_growth
+        self.index_by_issn_l = base.index_by_issn_l
+        self.load_inputs(scenario_data)
+
+    def __getattr__(self, name):
+        # only called for names not set here, which are the settings-independent ones
+        if name == "base":
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def __len__(self):
+        return len(self.issn_ls)
+
+    def load_inputs(self, scenario_data):
+        if self.settings.include_submitted_version:
+            submitted = "with_submitted"
+        else:
+            submitted = "no_submitted"
+        if self.settings.include_bronze:
+            bronze = "with_bronze"
+        else:
+            bronze = "no_bronze"
+        (self.num_green_historical_by_year,
+         self.num_hybrid_historical_by_year,
+         self.num_bronze_historical_by_year) = self.base.oa_historical_by_year("{}_{}".format(submitted, bronze))[:3]
+        self.num_peer_reviewed_historical_by_year = self.base.oa_historical_by_year("no_submitted_{}".format(bronze))[3]
+
+        if self.settings.include_social_networks:
+            self.downloads_social_network_multiplier = self.base.social_network_multiplier_if_included
+        else:
+            self.downloads_social_network_multiplier = np.zeros(len(self))
+
+        # prices are uploaded separately from the rest of the package's data, so they are read every time
+        content_fee_multiplier = 1 + self.settings.cost_content_fee_percent/float(100)
+        self.cost_first_year_including_content_fee = np.full(len(self), np.nan)
+        for index, issn_l in enumerate(self.issn_ls):
+            price = scenario_data["prices"].get(issn_l, None)
+            if price is not None:
+                self.cost_first_year_including_content_fee[index] = float(price) * content_fee_multiplier
+
+
+    # backfile
+
+    @cached_property
+    def oa_obs_pub(self):
+        by_age_old = self.downloads_total_older_than_five_years/5.0
+        newest = self.downloads_by_age[:, 4]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            by_age_old = np.where(newest != 0, by_age_old * (self.downloads_oa_by_age[:, 4] / newest), by_age_old)
+        return self.obs_pub_matrix(self.downloads_oa_by_age, by_age_old, self.growth_scaling_oa_downloads)
+
+    @cached_property
+    def backfile_obs_pub(self):
+        # modelling subscription ending, so no backfile beyond perpetual access years
+        not_oa = self.downloads_obs_pub - self.oa_obs_pub
+        full = self.perpetual_access_pub_mask[:, np.newaxis, :]
+        half = self.perpetual_access_half_pub_mask[:, np.newaxis, :]
+        value = np.where(full, not_oa, np.where(half, 0.5 * not_oa, 0))
+        return np.rint(np.maximum(value, 0)).astype(np.int64)
+
+    @cached_property
+    def downloads_backfile_by_year(self):
+        return np.minimum(self.sum_obs_pub_matrix_by_obs(self.backfile_obs_pub),
+                          self.downloads_total_by_year - self.downloads_oa_by_year)
+
+    @cached_property
+    def downloads_backfile(self):
+        return self.row_mean(self.downloads_backfile_by_year)
+
+    # oa
+
+    @cached_property
+    def raw_num_oa_historical_by_year(self):
+        return self.num_green_historical_by_year + self.num_bronze_historical_by_year + self.num_hybrid_historical_by_year
+
+    @cached_property
+    def proportion_oa_historical_by_year(self):
+        raw_num_papers = self.raw_num_papers_historical_by_year
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(raw_num_papers != 0, self.raw_num_oa_historical_by_year / raw_num_papers, np.nan)
+
+    @cached_property
+    def num_oa_historical_by_year(self):
+        oa_proportion_reversed = self.proportion_oa_historical_by_year[:, ::-1]
+        has_proportion = ~np.isnan(oa_proportion_reversed) & (oa_proportion_reversed != 0)
+        num_scaled_by_num_papers = np.where(has_proportion, oa_proportion_reversed * self.num_papers_by_year, 0)
+        return np.rint(np.minimum(self.num_papers_by_year, num_scaled_by_num_papers)).astype(np.int64)
+
+    @cached_property
+    def num_hybrid_by_year(self):
+        return np.minimum(self.num_papers_by_year, self.num_hybrid_historical_by_year[:, ::-1])
+
+    @cached_property
+    def num_bronze_by_year(self):
+        return np.minimum(self.num_papers_by_year - self.num_hybrid_by_year, self.num_bronze_historical_by_year[:, ::-1])
+
+    @cached_property
+    def num_green_by_year(self):
+        return np.minimum(self.num_papers_by_year - self.num_hybrid_by_year - self.num_bronze_by_year,
+                          self.num_green_historical_by_year[:, ::-1])
+
+    @cached_property
+    def downloads_oa_by_age(self):
+        response = self.downloads_per_paper_by_age * self.num_oa_historical_by_year
+        embargo = self.bronze_oa_embargo_months[:, np.newaxis]
+        has_embargo = ~np.isnan(embargo) & (embargo != 0)
+        with np.errstate(invalid="ignore"):
+            past_embargo = has_embargo & (np.array(self.years)[np.newaxis, :] * 12 >= embargo)
+        return np.where(past_embargo, self.downloads_by_age, response)
+
+    @cached_property
+    def downloads_oa_by_year(self):
+        return self.sum_obs_pub_matrix_by_obs(self.oa_obs_pub)
+
+    @cached_property
+    def downloads_oa_bronze_by_age(self):
+        return self.downloads_per_paper_by_age * self.num_bronze_by_year
+
+    @cached_property
+    def downloads_oa_green_by_age(self):
+        return self.downloads_per_paper_by_age * self.num_green_by_year
+
+    @cached_property
+    def downloads_oa_hybrid_by_age(self):
+        return self.downloads_per_paper_by_age * self.num_hybrid_by_year
+
+    @cached_property
+    def downloads_oa_peer_reviewed_by_age(self):
+        num_for_convolving = np.minimum(self.num_papers_by_year, self.num_peer_reviewed_historical_by_year[:, ::-1])
+        return self.downloads_per_paper_by_age * num_for_convolving
+
+    def downloads_oa_type_older(self, by_age):
+        return (self.downloads_total_older_than_five_years/5.0) * (by_age[:, 4] / (self.downloads_by_age[:, 4] + 1))
+
+    @cached_property
+    def downloads_oa_bronze_older(self):
+        return self.downloads_oa_type_older(self.downloads_oa_bronze_by_age)
+
+    @cached_property
+    def downloads_oa_green_older(self):
+        return self.downloads_oa_type_older(self.downloads_oa_green_by_age)
+
+    @cached_property
+    def downloads_oa_hybrid_older(self):
+        return self.downloads_oa_type_older(self.downloads_oa_hybrid_by_age)
+
+    @cached_property
+    def downloads_oa_peer_reviewed_older(self):
+        return self.downloads_oa_type_older(self.downloads_oa_peer_reviewed_by_age)
+
+    @cached_property
+    def oa_bronze_obs_pub(self):
+        return self.obs_pub_matrix(self.downloads_oa_bronze_by_age, self.downloads_oa_bronze_older, self.growth_scaling_oa_downloads)
+
+    @cached_property
+    def oa_green_obs_pub(self):
+        return self.obs_pub_matrix(self.downloads_oa_green_by_age, self.downloads_oa_green_older, self.growth_scaling_oa_downloads)
+
+    @cached_property
+    def oa_hybrid_obs_pub(self):
+        return self.obs_pub_matrix(self.downloads_oa_hybrid_by_age, self.downloads_oa_hybrid_older, self.growth_scaling_oa_downloads)
+
+    @cached_property
+    def oa_peer_reviewed_obs_pub(self):
+        return self.obs_pub_matrix(self.downloads_oa_peer_reviewed_by_age, self.downloads_oa_peer_reviewed_older, self.growth_scaling_oa_downloads)
+
+    @cached_property
+    def downloads_oa_bronze_by_year(self):
+        return self.sum_obs_pub_matrix_by_obs(self.oa_bronze_obs_pub)
+
+    @cached_property
+    def downloads_oa_green_by_year(self):
+        return self.sum_obs_pub_matrix_by_obs(self.oa_green_obs_pub)
+
+    @cached_property
+    def downloads_oa_hybrid_by_year(self):
+        return self.sum_obs_pub_matrix_by_obs(self.oa_hybrid_obs_pub)
+
+    @cached_property
+    def downloads_oa_peer_reviewed_by_year(self):
+        return self.sum_obs_pub_matrix_by_obs(self.oa_peer_reviewed_obs_pub)
+
+    @cached_property
+    def downloads_oa_bronze(self):
+        return self.row_mean(self.downloads_oa_bronze_by_year)
+
+    @cached_property
+    def downloads_oa_green(self):
+        return self.row_mean(self.downloads_oa_green_by_year)
+
+    @cached_property
+    def downloads_oa_hybrid(self):
+        return self.row_mean(self.downloads_oa_hybrid_by_year)
+
+    @cached_property
+    def downloads_oa_peer_reviewed(self):
+        return self.row_mean(self.downloads_oa_peer_reviewed_by_year)
+
+    @cached_property
+    def use_oa_bronze(self):
+        return np.round(self.downloads_oa_bronze * self.use_weight_multiplier, 4)
+
+    @cached_property
+    def use_oa_green(self):
+        return np.round(self.downloads_oa_green * self.use_weight_multiplier, 4)
+
+    @cached_property
+    def use_oa_hybrid(self):
+        return np.round(self.downloads_oa_hybrid * self.use_weight_multiplier, 4)
+
+    @cached_property
+    def use_oa_peer_reviewed(self):
+        return np.round(self.downloads_oa_peer_reviewed * self.use_weight_multiplier, 4)
+
+    # social networks
+
+    @cached_property
+    def downloads_social_networks_by_year(self):
+        downloads_total_by_year = self.downloads_total_by_year
+        social_network = downloads_total_by_year * self.downloads_social_network_multiplier[:, np.newaxis]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            overlap_with_backfile = (social_network * self.downloads_backfile_by_year) / downloads_total_by_year
+        response = np.where(social_network != 0, social_network - overlap_with_backfile, social_network)
+        response = np.minimum(response, downloads_total_by_year - self.downloads_oa_by_year)
+        return np.maximum(response, 0)
+
+    @cached_property
+    def downloads_social_networks(self):
+        return self.row_mean(self.downloads_social_networks_by_year)
+
+    @cached_property
+    def downloads_oa_plus_social_networks_by_year(self):
+        return self.downloads_oa_by_year + self.downloads_social_networks_by_year
+
+    # paywalled
+
+    @cached_property
+    def downloads_paywalled_by_year(self):
+        scaled = self.downloads_total_by_year - (self.downloads_backfile_by_year + self.downloads_oa_by_year + self.downloads_social_networks_by_year)
+        return np.maximum(0, scaled)
+
+    @cached_property
+    def downloads_paywalled(self):
+        return self.row_mean(self.downloads_paywalled_by_year)
+
+    @cached_property
+    def downloads_subscription_by_year(self):
+        return self.downloads_paywalled_by_year
+
+    @cached_property
+    def downloads_subscription(self):
+        return self.downloads_paywalled
+
+    @cached_property
+    def downloads_ill_by_year(self):
+        return self.settings.ill_request_percent_of_delayed/float(100) * self.downloads_paywalled_by_year
+
+    @cached_property
+    def downloads_ill(self):
+        return self.row_mean(self.downloads_ill_by_year)
+
+    @cached_property
+    def downloads_other_delayed_by_year(self):
+        return self.downloads_paywalled_by_year - self.downloads_ill_by_year
+
+    @cached_property
+    def downloads_other_delayed(self):
+        return self.row_mean(self.downloads_other_delayed_by_year)
+
+    # usage
+
+    @cached_property
+    def use_addition_from_weights(self):
+        # using the average on purpose... by year too rough
+        weights_addition = float(self.settings.weight_citation) * self.num_citations
+        weights_addition += float(self.settings.weight_authorship) * self.num_authorships
+        has_weights = (self.num_citations != 0) | (self.num_authorships != 0)
+        return np.where(has_weights, np.round(weights_addition, 4), 0)
+
+    @cached_property
+    def use_total_by_year(self):
+        return self.downloads_total_by_year + self.use_addition_from_weights[:, np.newaxis] * self.growth_scaling_downloads
+
+    @cached_property
+    def use_total(self):
+        response = self.row_mean(self.use_total_by_year)
+        return np.where(response == 0, 0.0001, response)
+
+    @cached_property
+    def use_weight_multiplier(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.downloads_total != 0, self.use_total / self.downloads_total, 1.0)
+
+    @cached_property
+    def use_oa_by_year(self):
+        response = np.maximum(0, self.downloads_oa_by_year * self.use_weight_multiplier[:, np.newaxis])
+        return np.minimum(response, self.use_total_by_year)
+
+    @cached_property
+    def use_oa(self):
+        return np.round(np.minimum(np.mean(self.use_oa_by_year, axis=1), self.use_total), 4)
+
+    @cached_property
+    def use_oa_percent_by_year(self):
+        return np.minimum(100, np.round(100.0*(self.use_oa_by_year/(1.0+self.use_total_by_year)), 1))
+
+    @cached_property
+    def use_social_networks_by_year(self):
+        response = np.maximum(0, np.round(self.downloads_social_networks_by_year * self.use_weight_multiplier[:, np.newaxis], 4))
+        response = np.minimum(response, self.use_total_by_year - self.use_oa_by_year)
+        return np.maximum(response, 0)
+
+    @cached_property
+    def use_social_networks(self):
+        return np.minimum(np.mean(self.use_social_networks_by_year, axis=1), self.use_total - self.use_oa)
+
+    @cached_property
+    def use_oa_plus_social_networks_by_year(self):
+        return self.use_oa_by_year + self.use_social_networks_by_year
+
+    @cached_property
+    def use_oa_plus_social_networks(self):
+        return self.use_oa + self.use_social_networks
+
+    @cached_property
+    def use_backfile_by_year(self):
+        response = np.maximum(0, np.round(self.downloads_backfile_by_year * self.use_weight_multiplier[:, np.newaxis], 4))
+        return np.minimum(response, self.use_total_by_year - self.use_oa_by_year)
+
+    @cached_property
+    def use_backfile(self):
+        response = np.minimum(np.mean(self.use_backfile_by_year, axis=1), self.use_total - self.use_oa - self.use_social_networks)
+        return np.round(response, 4)
+
+    @cached_property
+    def use_free_instant_by_year(self):
+        return self.use_oa_plus_social_networks_by_year + self.use_backfile_by_year
+
+    @cached_property
+    def use_free_instant(self):
+        return self.use_oa_plus_social_networks + self.use_backfile
+
+    @cached_property
+    def use_paywalled_by_year(self):
+        return np.maximum(0, self.use_total_by_year - self.use_free_instant_by_year)
+
+    @cached_property
+    def use_paywalled(self):
+        return np.maximum(0, self.use_total - self.use_free_instant)
+
+    @cached_property
+    def use_subscription_by_year(self):
+        return self.use_paywalled_by_year
+
+    @cached_property
+    def use_subscription(self):
+        return self.use_paywalled
+
+    @cached_property
+    def use_ill_by_year(self):
+        return self.settings.ill_request_percent_of_delayed/float(100) * self.use_paywalled_by_year
+
+    @cached_property
+    def use_ill(self):
+        return self.settings.ill_request_percent_of_delayed/float(100) * self.use_paywalled
+
+    @cached_property
+    def use_other_delayed_by_year(self):
+        return self.use_paywalled_by_year - self.use_ill_by_year
+
+    @cached_property
+    def use_other_delayed(self):
+        return self.use_paywalled - self.use_ill
+
+    # costs
+
+    @cached_property
+    def subscription_cost_by_year(self):
+        increase = (1 + self.settings.cost_alacart_increase/float(100)) ** np.array(self.years)
+        return np.rint(increase[np.newaxis, :] * self.cost_first_year_including_content_fee[:, np.newaxis])
+
+    @cached_property
+    def subscription_cost(self):
+        return self.row_mean(self.subscription_cost_by_year)
+
+    @cached_property
+    def ill_cost_by_year(self):
+        return np.round(self.downloads_ill_by_year * self.settings.cost_ill, 4)
+
+    @cached_property
+    def ill_cost(self):
+        return self.row_mean(self.ill_cost_by_year)
+
+    @cached_property
+    def cost_subscription_minus_ill_by_year(self):
+        return self.subscription_cost_by_year - self.ill_cost_by_year
+
+    @cached_property
+    def cost_subscription_minus_ill(self):
+        return np.round(self.subscription_cost - self.ill_cost, 4)
+
+    @cached_property
+    def cpu(self):
+        use_paywalled = self.use_paywalled
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(use_paywalled >= 1, np.round(self.cost_subscription_minus_ill / use_paywalled, 6), np.nan)
+
+    @cached_property
+    def old_school_cpu(self):
+        downloads_total = self.downloads_total
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(downloads_total >= 1, np.round(self.subscription_cost / downloads_total, 6), np.nan)
+
+
+# bases by package, shared across requests and users.  Small on purpose: a base holds a few MB
+# of arrays, and the references to the common data it was built from
+max_cached_engine_bases = 20
+engine_base_cache = OrderedDict()
+engine_base_cache_lock = threading.Lock()
+
+
+def get_engine_base_key(issn_ls, scenario_data, package_id_for_db, now, use_paper_growth):
+    # the package's own data (counter, citations, authorships) is cached under its package data
+    # version, and a consortium's under its members', so the versions stand in for it
+    versions = tuple(sorted(scenario_data.get("package_data_versions", {}).items()))
+    issn_digest = hashlib.sha1("\n".join(issn_ls).encode("utf-8")).hexdigest()
+    return (package_id_for_db, now.year, use_paper_growth, versions, issn_digest)
+
+
+def get_engine_base_sources(scenario_data):
+    # the common data and perpetual access come out of the memory cache, so the same objects mean
+    # the same data.  unpaywall_downloads_dict is rebuilt every request, but from the rows in
+    # unpaywall_downloads_dict_raw
+    unpaywall_name = "unpaywall_downloads_dict_raw" if "unpaywall_downloads_dict_raw" in scenario_data else "unpaywall_downloads_dict"
+    return tuple(scenario_data.get(name, None) for name in
+                 [unpaywall_name, "num_papers", "download_curves", "oa", "embargo_dict", "social_networks",
+                  "perpetual_access"])
+
+
+def get_scenario_engine_base(issn_ls, scenario_data, package_id_for_db, now=None, use_paper_growth=False):
+    """
+    The ScenarioEngineBase for this data, reusing the one from an earlier request when nothing it
+    depends on has changed, so a change of settings doesn't redo the curve fits and OA counts.
+    """
+    now = now or datetime.datetime.utcnow()
+    key = get_engine_base_key(issn_ls, scenario_data, package_id_for_db, now, use_paper_growth)
+    sources = get_engine_base_sources(scenario_data)
+    with engine_base_cache_lock:
+        cached = engine_base_cache.get(key, None)
+        if cached is not None and all(a is b for (a, b) in zip(cached[0], sources)):
+            engine_base_cache.move_to_end(key)
+            return cached[1]
+
+    base = ScenarioEngineBase(issn_ls, scenario_data, package_id_for_db, now=now, use_paper_growth=use_paper_growth)
+    with engine_base_cache_lock:
+        engine_base_cache[key] = (sources, base)
+        engine_base_cache.move_to_end(key)
+        while len(engine_base_cache) > max_cached_engine_bases:
+            engine_base_cache.popitem(last=False)
+    return base
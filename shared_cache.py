@@ -0,0 +1,220 @@
+# coding: utf-8
+
+# A second cache tier, shared by the workers, under memorycache and invalidatable_cache.
+#
+# Each gunicorn worker has its own memorycache, so a request on a cold worker recomputes what
+# another worker just did.  Values that miss there are looked up here before being computed, and
+# computed values are stored in both.  Two backends: a SQLite file, shared by the workers of a
+# dyno, and a Redis (or anything that speaks redis-py's get/set/delete), shared by every dyno.
+#
+# Values are pickled and zlib'd.  Only this app writes the store, so unpickling it is no worse
+# than trusting our own disk.  A broken or missing store is a miss, never an error.
+
+import os
+import pickle
+import sqlite3
+import threading
+import zlib
+from time import time
+
+from memory_cache import hash_key
+
+key_prefix = "unsub:"
+
+
+def dumps(value):
+    return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def loads(data):
+    return pickle.loads(zlib.decompress(data))
+
+
+class SharedCache(object):
+    """
+    get/set/delete by cache key, counting hits, misses and errors.  Subclasses store the
+    serialized bytes under the hashed key.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.errors = 0
+        self.bytes_written = 0
+
+    def get(self, key, default=None):
+        try:
+            data = self.get_bytes(key_prefix + hash_key(key))
+            if data is None:
+                self.misses += 1
+                return default
+            value = loads(data)
+        except Exception as e:
+            print("shared cache get failed, so it's a miss.  Error message: ", e)
+            self.errors += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            data = dumps(value)
+            self.set_bytes(key_prefix + hash_key(key), data)
+        except Exception as e:
+            print("shared cache set failed.  Error message: ", e)
+            self.errors += 1
+            return
+        self.sets += 1
+        self.bytes_written += len(data)
+
+    def delete(self, key):
+        try:
+            self.delete_bytes(key_prefix + hash_key(key))
+        except Exception as e:
+            print("shared cache delete failed.  Error message: ", e)
+            self.errors += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.__class__.__name__,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / float(lookups), 4) if lookups else None,
+            "sets": self.sets,
+            "bytes_written": self.bytes_written,
+            "errors": self.errors,
+        }
+
+
+class SqliteSharedCache(SharedCache):
+    """
+    A SQLite file that every process on the host can open.  WAL mode, so readers don't wait on
+    the writer.  Past max_bytes the oldest entries go, checked every prune_every sets.
+    """
+
+    def __init__(self, path, ttl=None, max_bytes=None, prune_every=100):
+        super(SqliteSharedCache, self).__init__(ttl)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self.local = threading.local()
+        with self.connection() as connection:
+            connection.execute("create table if not exists cache (key text primary key, value blob, stored real)")
+            connection.execute("create index if not exists cache_stored on cache (stored)")
+
+    def connection(self):
+        # one per thread, and a new one after a fork: sqlite connections can't cross either
+        if getattr(self.local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("pragma journal_mode=wal")
+            connection.execute("pragma synchronous=normal")
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+        return self.local.connection
+
+    def get_bytes(self, hashed_key):
+        row = self.connection().execute("select value, stored from cache where key = ?", (hashed_key,)).fetchone()
+        if row is None:
+            return None
+        if self.ttl is not None and time() - row[1] > self.ttl:
+            self.delete_bytes(hashed_key)
+            return None
+        return row[0]
+
+    def set_bytes(self, hashed_key, data):
+        self.connection().execute("insert or replace into cache (key, value, stored) values (?, ?, ?)",
+                                  (hashed_key, sqlite3.Binary(data), time()))
+        if self.prune_every and (self.sets + 1) % self.prune_every == 0:
+            self.prune()
+
+    def delete_bytes(self, hashed_key):
+        self.connection().execute("delete from cache where key = ?", (hashed_key,))
+
+    def prune(self):
+        connection = self.connection()
+        if self.ttl is not None:
+            connection.execute("delete from cache where stored < ?", (time() - self.ttl,))
+        if self.max_bytes is not None:
+            (num_bytes,) = connection.execute("select coalesce(sum(length(value)), 0) from cache").fetchone()
+            if num_bytes > self.max_bytes:
+                # the oldest half, so this isn't needed again right away
+                connection.execute("delete from cache where key in (select key from cache order by stored limit (select count(*) / 2 from cache))")
+
+    def clear(self):
+        self.connection().execute("delete from cache")
+
+
+class RedisSharedCache(SharedCache):
+    """A Redis, through a redis-py style client.  Redis does the expiry and, with maxmemory set, the eviction."""
+
+    def __init__(self, client, ttl=None):
+        super(RedisSharedCache, self).__init__(ttl)
+        self.client = client
+
+    def get_bytes(self, hashed_key):
+        return self.client.get(hashed_key)
+
+    def set_bytes(self, hashed_key, data):
+        if self.ttl is None:
+            self.client.set(hashed_key, data)
+        else:
+            self.client.set(hashed_key, data, ex=int(self.ttl))
+
+    def delete_bytes(self, hashed_key):
+        self.client.delete(hashed_key)
+
+
+def shared_cache_from_url(url, ttl=None, max_bytes=None):
+    """
+    The SharedCache a url names: sqlite:///path/to/file, redis://..., or None for none.  The redis
+    package is only needed for redis urls.
+    """
+    if not url or url == "none":
+        return None
+    if url.startswith("sqlite:///"):
+        return SqliteSharedCache(url[len("sqlite:///"):], ttl=ttl, max_bytes=max_bytes)
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        import redis
+        return RedisSharedCache(redis.Redis.from_url(url), ttl=ttl)
+    raise ValueError("unknown shared cache url {}".format(url))
+
+
+class TieredStore(object):
+    """
+    A kids.cache store that looks in a local dict first and then in the shared cache, and
+    stores in both.  pop removes from both.
+    """
+
+    def __init__(self, shared_cache):
+        self.local = {}
+        self.shared_cache = shared_cache
+
+    def __getitem__(self, key):
+        try:
+            return self.local[key]
+        except KeyError:
+            pass
+        missing = object()
+        value = self.shared_cache.get(key, missing)
+        if value is missing:
+            raise KeyError(key)
+        self.local[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.local[key] = value
+        self.shared_cache.set(key, value)
+
+    def pop(self, key, default=None):
+        self.shared_cache.delete(key)
+        return self.local.pop(key, default)
+
+    def clear(self):
+        self.local.clear()
+
+    def __len__(self):
+        return len(self.local)
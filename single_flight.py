@@ -0,0 +1,75 @@
+# coding: utf-8
+
+# Request coalescing: concurrent calls for the same key share one computation.
+#
+# A consortium dashboard asks for /journals, /summary and /member-institutions of the same scenario
+# at once, and each used to build its own Scenario.  With SingleFlight.do the first caller for a key
+# computes it and the others wait for that and get the same result (or the same exception).
+# Nothing is kept once the call is done: that's what the caches are for.
+
+import threading
+
+
+class Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.num_waiters = 0
+
+
+class SingleFlight(object):
+    """One in-progress call per key, shared by whoever asks for that key while it runs."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.num_calls = 0
+        self.num_executions = 0
+        self.num_coalesced = 0
+        self.num_errors = 0
+
+    def do(self, key, func):
+        """func()'s result, computed by this caller or shared from the caller already computing key."""
+        with self.lock:
+            self.num_calls += 1
+            call = self.in_flight.get(key, None)
+            if call is None:
+                call = Call()
+                self.in_flight[key] = call
+                is_leader = True
+                self.num_executions += 1
+            else:
+                call.num_waiters += 1
+                is_leader = False
+                self.num_coalesced += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            with self.lock:
+                self.num_errors += 1
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": self.num_calls,
+                "executions": self.num_executions,
+                "coalesced": self.num_coalesced,
+                "coalesced_rate": round(self.num_coalesced / float(self.num_calls), 4) if self.num_calls else None,
+                "errors": self.num_errors,
+                "in_flight": len(self.in_flight),
+            }
@@ -0,0 +1,256 @@
+# coding: utf-8
+
+# Picks the subscriptions that give the most instant use for a budget, as a 0/1 knapsack:
+# each journal's weight is what subscribing adds to the scenario cost (cost_subscription_minus_ill)
+# and its value the use it makes instant (use_subscription).
+#
+# Journals cheaper than ILL are always worth taking.  The rest are sorted by use per dollar, and
+# the usual reduction tests against the LP relaxation fix most of them, so only a small core near
+# the break item has to be searched, by an exact DP over whole-dollar costs when that's small
+# enough and by branch and bound with a time limit when it isn't.  Either way the answer comes
+# with an upper bound, so the optimality gap is known.
+
+from bisect import bisect_right
+from time import time
+
+import numpy as np
+
+default_time_limit = 1.5
+default_max_dp_cells = 10 * 1000 * 1000
+
+
+def lp_bound(weight_prefix, value_prefix, ratios, start, capacity):
+    # LP relaxation value of items start... (in ratio order) with this much capacity
+    num_items = len(ratios)
+    end = bisect_right(weight_prefix, weight_prefix[start] + capacity) - 1
+    if end >= num_items:
+        return value_prefix[num_items] - value_prefix[start]
+    return value_prefix[end] - value_prefix[start] + (weight_prefix[start] + capacity - weight_prefix[end]) * ratios[end]
+
+
+def greedy_fill(weights, values, capacity):
+    # in the order given, take each item that still fits
+    chosen = np.zeros(len(weights), dtype=bool)
+    for i in range(len(weights)):
+        if weights[i] <= capacity:
+            chosen[i] = True
+            capacity -= weights[i]
+    return chosen
+
+
+def knapsack_dp(weights, values, capacity, round_up=True):
+    """
+    Exact 0/1 knapsack over whole-dollar costs.  Rounding each cost up means the answer is always
+    within the real budget; rounding down instead gives an upper bound on the real optimum.
+    Returns the choice and its value.
+    """
+    if round_up:
+        int_weights = np.ceil(weights - 1e-9).astype(int)
+    else:
+        int_weights = np.floor(weights).astype(int)
+    int_capacity = int(np.floor(capacity + 1e-9))
+    best = np.zeros(int_capacity + 1)
+    took = np.zeros((len(weights), int_capacity + 1), dtype=bool)
+    for i in range(len(weights)):
+        w = int_weights[i]
+        if w > int_capacity:
+            continue
+        with_item = best[:len(best) - w] + values[i]
+        improved = with_item > best[w:]
+        took[i, w:] = improved
+        best[w:] = np.where(improved, with_item, best[w:])
+
+    chosen = np.zeros(len(weights), dtype=bool)
+    remaining = int(np.argmax(best))
+    for i in range(len(weights) - 1, -1, -1):
+        if took[i, remaining]:
+            chosen[i] = True
+            remaining -= int_weights[i]
+    return (chosen, np.max(best))
+
+
+def knapsack_branch_and_bound(weights, values, capacity, value_to_beat, deadline):
+    """
+    Depth-first branch and bound with LP relaxation bounds, for items already in ratio order.
+    Only looks for choices worth more than value_to_beat.  Returns the best such choice found
+    (None if none), an upper bound on the optimum, and whether the search finished.
+    """
+    num_items = len(weights)
+    weight_prefix = np.concatenate([[0.0], np.cumsum(weights)]).tolist()
+    value_prefix = np.concatenate([[0.0], np.cumsum(values)]).tolist()
+    weights_list = weights.tolist()
+    values_list = values.tolist()
+    ratios_list = (values / weights).tolist()
+
+    best_value = value_to_beat
+    best_taken = None
+
+    # taken items are a linked list of (item, rest) so pushing a node doesn't copy them
+    stack = [(0, float(capacity), 0.0, None)]
+    num_nodes = 0
+    while stack:
+        num_nodes += 1
+        if num_nodes % 1000 == 0 and time() > deadline:
+            open_bounds = [value + lp_bound(weight_prefix, value_prefix, ratios_list, k, c) for (k, c, value, taken) in stack]
+            return (best_taken, max([best_value] + open_bounds), False)
+
+        (k, c, value, taken) = stack.pop()
+        if value > best_value:
+            best_value = value
+            best_taken = []
+            node = taken
+            while node is not None:
+                best_taken.append(node[0])
+                node = node[1]
+        if k >= num_items:
+            continue
+        if value + lp_bound(weight_prefix, value_prefix, ratios_list, k, c) <= best_value:
+            continue
+        stack.append((k + 1, c, value, taken))
+        if weights_list[k] <= c:
+            stack.append((k + 1, c - weights_list[k], value + values_list[k], (k, taken)))
+
+    return (best_taken, best_value, True)
+
+
+def optimize_subscriptions(cost_subscription_minus_ill, use_subscription, budget, base_cost=0.0, base_use_instant=0.0,
+                           time_limit=default_time_limit, max_dp_cells=default_max_dp_cells):
+    """
+    Choose journals to subscribe to that maximize instant use with cost at most budget.
+
+    base_cost is the scenario cost with nothing subscribed (all ILL), base_use_instant the instant
+    use with nothing subscribed.  Returns a dict with the boolean "subscribed" array, the resulting
+    "cost" and "use_instant", an "upper_bound" on the best possible use_instant, the relative
+    "optimality_gap" between them, and which "method" solved the undecided core.  When even the
+    journals that save money don't bring the cost under budget, "is_feasible" is false and those
+    are all that's subscribed.
+    """
+    start_time = time()
+    weights_all = np.asarray(cost_subscription_minus_ill, dtype=float)
+    values_all = np.maximum(np.asarray(use_subscription, dtype=float), 0.0)
+    subscribed = np.zeros(len(weights_all), dtype=bool)
+
+    # cheaper than ILL: take them all.  No use: leave them.
+    subscribed[weights_all <= 0] = True
+    capacity = budget - base_cost - np.sum(weights_all[subscribed])
+    candidates = np.flatnonzero((weights_all > 0) & (values_all > 0))
+
+    def response(method, upper_bound_subscription, is_optimal, is_feasible=True):
+        use_instant = base_use_instant + np.sum(values_all[subscribed])
+        upper_bound = max(use_instant, base_use_instant + np.sum(values_all[weights_all <= 0]) + upper_bound_subscription)
+        if is_optimal:
+            upper_bound = use_instant
+        return {
+            "subscribed": subscribed,
+            "cost": base_cost + np.sum(weights_all[subscribed]),
+            "use_instant": use_instant,
+            "upper_bound": upper_bound,
+            "optimality_gap": (upper_bound - use_instant) / upper_bound if upper_bound else 0.0,
+            "is_optimal": is_optimal,
+            "is_feasible": is_feasible,
+            "method": method,
+            "num_candidates": len(candidates),
+            "seconds": time() - start_time,
+        }
+
+    if capacity < 0:
+        return response("infeasible", 0.0, True, is_feasible=False)
+    if not len(candidates):
+        return response("trivial", 0.0, True)
+
+    # ratio order, best use per dollar first
+    order = candidates[np.argsort(-values_all[candidates] / weights_all[candidates], kind="stable")]
+    weights = weights_all[order]
+    values = values_all[order]
+    ratios = values / weights
+    weight_prefix = np.concatenate([[0.0], np.cumsum(weights)])
+    value_prefix = np.concatenate([[0.0], np.cumsum(values)])
+
+    # break item: the first that doesn't fit when filling in ratio order
+    break_item = int(np.searchsorted(weight_prefix, capacity, side="right")) - 1
+    if break_item >= len(weights):
+        subscribed[order] = True
+        return response("trivial", np.sum(values), True)
+    upper_bound = value_prefix[break_item] + (capacity - weight_prefix[break_item]) * ratios[break_item]
+
+    greedy = greedy_fill(weights, values, capacity)
+    lower_bound = np.sum(values[greedy])
+
+    # reduction: fix each item to its LP value when flipping it can't beat the greedy answer.
+    # ratios padded so looking up the fractional item past the end gives 0
+    padded_ratios = np.concatenate([ratios, [0.0]])
+    items = np.arange(len(weights))
+    fixed_in = np.zeros(len(weights), dtype=bool)
+    fixed_out = np.zeros(len(weights), dtype=bool)
+
+    before = items < break_item
+    # LP bound without item j, for j that the LP takes
+    shifted_capacity = capacity + weights
+    end = np.searchsorted(weight_prefix, shifted_capacity, side="right") - 1
+    end = np.minimum(end, len(weights))
+    without_item = value_prefix[end] - values + (shifted_capacity - weight_prefix[end]) * padded_ratios[end]
+    fixed_in[before & (without_item <= lower_bound)] = True
+
+    after = items > break_item
+    # LP bound forcing item j in, for j that the LP leaves out
+    reduced_capacity = capacity - weights
+    end = np.searchsorted(weight_prefix, np.maximum(reduced_capacity, 0), side="right") - 1
+    end = np.minimum(end, len(weights))
+    with_item = values + value_prefix[end] + (np.maximum(reduced_capacity, 0) - weight_prefix[end]) * padded_ratios[end]
+    fixed_out[after & ((reduced_capacity < 0) | (with_item <= lower_bound))] = True
+
+    core = np.flatnonzero(~fixed_in & ~fixed_out)
+    core_capacity = capacity - np.sum(weights[fixed_in])
+
+    # anything better than greedy takes every fixed_in item and none of the fixed_out ones,
+    # so only the core is left to search
+    chosen = greedy
+    if core_capacity < 0:
+        method = "reduction"
+        is_optimal = True
+    elif not len(core):
+        method = "reduction"
+        is_optimal = True
+        if np.sum(values[fixed_in]) > lower_bound:
+            chosen = fixed_in
+    else:
+        core_weights = weights[core]
+        core_values = values[core]
+        value_to_beat = lower_bound - np.sum(values[fixed_in])
+        dp_capacity = min(core_capacity, np.sum(np.ceil(core_weights)))
+        core_choice = np.zeros(len(core), dtype=bool)
+        core_upper_bound = None
+        is_optimal = False
+        method = "branch_and_bound"
+        if 2 * len(core) * (dp_capacity + 1) <= max_dp_cells:
+            # exact for the costs rounded up to whole dollars, and the same with them rounded down bounds the real optimum
+            method = "dp"
+            (dp_choice, dp_value) = knapsack_dp(core_weights, core_values, dp_capacity)
+            (relaxed_choice, core_upper_bound) = knapsack_dp(core_weights, core_values, core_capacity, round_up=False)
+            core_upper_bound = max(core_upper_bound, value_to_beat)
+            if dp_value > value_to_beat:
+                core_choice = dp_choice
+                value_to_beat = dp_value
+            is_optimal = value_to_beat >= core_upper_bound
+
+        if not is_optimal:
+            # cents can matter, so search the real costs for anything better
+            if method == "dp":
+                method = "dp+branch_and_bound"
+            (core_taken, search_upper_bound, is_optimal) = knapsack_branch_and_bound(
+                core_weights, core_values, core_capacity, value_to_beat, start_time + time_limit)
+            if core_taken is not None:
+                core_choice = np.zeros(len(core), dtype=bool)
+                core_choice[core_taken] = True
+            if core_upper_bound is None:
+                core_upper_bound = search_upper_bound
+            core_upper_bound = min(core_upper_bound, search_upper_bound)
+        upper_bound = min(upper_bound, np.sum(values[fixed_in]) + core_upper_bound)
+
+        candidate = fixed_in.copy()
+        candidate[core] = core_choice
+        if np.sum(values[candidate]) > lower_bound:
+            chosen = candidate
+
+    subscribed[order[chosen]] = True
+    return response(method, upper_bound, is_optimal)
@@ -0,0 +1,70 @@
+# coding: utf-8
+
+import numpy as np
+
+
+class SubscriptionState(object):
+    """
+    Which journals of a scenario are subscribed, with running totals of everything that depends on it.
+
+    Rows are in ScenarioEngine order.  Subscribing or unsubscribing a journal moves its row between
+    the subscribed and unsubscribed totals, so a toggle costs the same however big the scenario is
+    and k toggles at once cost O(k).
+    """
+
+    # journal values that count for the scenario only when subscribed, or only when not
+    if_subscribed = ["subscription_cost", "subscription_cost_by_year", "use_subscription",
+                     "use_subscription_by_year", "downloads_subscription_by_year"]
+    if_not_subscribed = ["ill_cost", "ill_cost_by_year", "use_ill", "use_other_delayed",
+                         "use_ill_by_year", "use_other_delayed_by_year",
+                         "downloads_ill_by_year", "downloads_other_delayed_by_year"]
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.subscribed_bulk = np.zeros(len(engine), dtype=bool)
+        self.subscribed_custom = np.zeros(len(engine), dtype=bool)
+        self.num_subscribed = 0
+        self.totals = {}
+        for name in self.if_subscribed:
+            self.totals[name] = 0 * np.sum(getattr(engine, name), axis=0)
+        for name in self.if_not_subscribed:
+            self.totals[name] = np.sum(getattr(engine, name), axis=0)
+
+    @property
+    def subscribed(self):
+        return self.subscribed_bulk | self.subscribed_custom
+
+    def set_subscribed(self, indexes, bulk=None, custom=None):
+        # bulk and custom are True/False to set that flag on all the rows in indexes, None to leave it alone
+        indexes = np.unique(np.asarray(indexes, dtype=int))
+        if not len(indexes):
+            return
+        was_subscribed = self.subscribed_bulk[indexes] | self.subscribed_custom[indexes]
+        if bulk is not None:
+            self.subscribed_bulk[indexes] = bulk
+        if custom is not None:
+            self.subscribed_custom[indexes] = custom
+        now_subscribed = self.subscribed_bulk[indexes] | self.subscribed_custom[indexes]
+
+        self.move(indexes[now_subscribed & ~was_subscribed], 1)
+        self.move(indexes[was_subscribed & ~now_subscribed], -1)
+
+    def move(self, rows, direction):
+        # direction 1 moves rows into the subscribed totals, -1 moves them out
+        if not len(rows):
+            return
+        for name in self.if_subscribed:
+            self.totals[name] = self.totals[name] + direction * np.sum(getattr(self.engine, name)[rows], axis=0)
+        for name in self.if_not_subscribed:
+            self.totals[name] = self.totals[name] - direction * np.sum(getattr(self.engine, name)[rows], axis=0)
+        self.num_subscribed += direction * len(rows)
+
+    def total(self, name):
+        return self.totals[name]
+
+    def actual_by_year(self, group, prefix="use"):
+        name = "{}_{}_by_year".format(prefix, group)
+        if name not in self.totals:
+            # counts whatever the subscription state, so it never changes
+            self.totals[name] = np.sum(getattr(self.engine, name), axis=0)
+        return list(self.totals[name])
@@ -0,0 +1,86 @@
+import warnings
+
+import numpy as np
+import pytest
+import scipy.special
+from scipy.optimize import curve_fit
+
+from batch_curve_fit import fit_download_curves
+from batch_curve_fit import fit_num_papers_lines
+
+
+downloads_by_age = np.array([
+    [400.0, 150.0, 100.0, 80.0, 60.0],
+    [14.178, 4.939, 0.88, 0.261, 0.05],
+    [87.49, 31.423, 6.467, 1.31, 0.193],
+    [7.705, 8.803, 5.199, 5.28, 2.296],
+    [3.0, 0.0, 1.0, 0.0, 0.0],
+    [0.0, 0.0, 0.0, 0.0, 0.0],
+    [1200.0, 1100.0, 1000.0, 950.0, 900.0],
+])
+
+
+def scipy_download_curve(y):
+    def func(x, a, b, c):
+        return b + a * scipy.special.expit(x / c)
+
+    x = np.arange(5)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            pars, pcov = curve_fit(func, x, y, (float(np.max(y)), 30.0, -1.0))
+        except RuntimeError:
+            return None
+        return func(x, *pars)
+
+
+def r_squared(y, y_fit):
+    return 1 - (np.sum((y - y_fit) ** 2) + 0.0001) / (np.sum((y - np.mean(y)) ** 2) + 0.0001)
+
+
+def test_download_curves_match_curve_fit():
+    y_fit, fit_r_squared, params, fitted = fit_download_curves(downloads_by_age)
+    for index, y in enumerate(downloads_by_age):
+        expected = scipy_download_curve(y)
+        assert fitted[index] == (expected is not None)
+        if expected is not None:
+            assert y_fit[index] == pytest.approx(expected, rel=1e-4, abs=1e-4)
+            assert fit_r_squared[index] == pytest.approx(r_squared(y, expected), abs=1e-4)
+            assert (fit_r_squared[index] >= 0.75) == (r_squared(y, expected) >= 0.75)
+
+
+def test_num_papers_lines():
+    raw = np.array([
+        [100, 110, 120, 130, 140],
+        [100, 0, 100, 100, 100],
+        [0, 0, 0, 0, 100],
+        [0, 0, 0, 0, 0],
+    ], dtype=float)
+    y_fit, fit_r_squared, params, y_extrap, used, fitted = fit_num_papers_lines(raw, 0.25)
+
+    assert fitted.tolist() == [True, True, False, True]
+    assert params[0] == pytest.approx([100, 10])
+    assert y_extrap[0] == pytest.approx([150, 160, 170, 180, 190])
+    assert used[1].tolist() == [True, False, True, True, True]
+    assert np.isnan(y_fit[1, 1])
+    assert params[1] == pytest.approx(np.polyfit([0, 2, 3, 4], [100, 100, 100, 100], 1)[::-1], abs=1e-9)
+    assert np.isnan(y_extrap[2]).all()
+    assert y_extrap[3].tolist() == [0, 0, 0, 0, 0]
+
+
+def test_download_curves_match_curve_fit_in_bulk():
+    # usage-like rows: the same accept/reject as curve_fit on every row, and the same fit on all
+    # but the odd row that settles in a different local minimum
+    rng = np.random.default_rng(0)
+    scale = rng.lognormal(3, 2, (1000, 1))
+    decay = rng.uniform(0.2, 1, (1000, 1))
+    rows = np.round(scale * decay ** np.arange(5) * rng.uniform(0.7, 1.3, (1000, 5)), 3)
+
+    y_fit, fit_r_squared, params, fitted = fit_download_curves(rows)
+    mismatched = 0
+    for index, y in enumerate(rows):
+        expected = scipy_download_curve(y)
+        assert fitted[index] == (expected is not None)
+        if expected is not None and not np.allclose(y_fit[index], expected, rtol=1e-3, atol=1e-3):
+            mismatched += 1
+    assert mismatched <= 5
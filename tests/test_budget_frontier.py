@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from budget_frontier import greedy_frontier
+
+
+def test_greedy_frontier():
+    cost_subscription_minus_ill = [-50.0, 100.0, -10.0, 300.0, 200.0]
+    use_subscription = [5.0, 20.0, 1.0, 40.0, 10.0]
+    (added, cost, use_instant, num_subscribed) = greedy_frontier(cost_subscription_minus_ill, use_subscription, 1000.0, 100.0)
+
+    # the cheaper-than-ill journals come for free, then the rest in the order given
+    assert added.tolist() == [1, 3, 4]
+    assert num_subscribed.tolist() == [2, 3, 4, 5]
+    assert cost.tolist() == [940.0, 1040.0, 1340.0, 1540.0]
+    assert use_instant.tolist() == [106.0, 126.0, 166.0, 176.0]
+
+
+def test_greedy_frontier_matches_subscribing_one_at_a_time():
+    rnd = np.random.RandomState(0)
+    cost_subscription_minus_ill = rnd.normal(100, 200, 50)
+    use_subscription = rnd.uniform(0, 100, 50)
+    (added, cost, use_instant, num_subscribed) = greedy_frontier(cost_subscription_minus_ill, use_subscription, 5000.0, 10.0)
+
+    subscribed = cost_subscription_minus_ill < 0
+    for i in range(len(cost)):
+        if i:
+            subscribed[added[i - 1]] = True
+        assert num_subscribed[i] == np.sum(subscribed)
+        assert cost[i] == pytest.approx(5000.0 + np.sum(cost_subscription_minus_ill[subscribed]))
+        assert use_instant[i] == pytest.approx(10.0 + np.sum(use_subscription[subscribed]))
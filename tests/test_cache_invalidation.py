@@ -0,0 +1,123 @@
+import datetime
+import json
+
+from cache_invalidation import InvalidationBus
+from memory_cache import MemoryCache
+
+
+def cache_call(module_name, function_name, *args):
+    # what app.build_cache_key writes to jump_cache_status
+    return json.dumps((module_name, function_name, args))
+
+
+class CacheStatusTable(object):
+    # jump_cache_status, as reset_cache writes it and the poller reads it
+    def __init__(self):
+        self.rows = {}
+        self.now = datetime.datetime(2026, 1, 1)
+
+    def reset(self, cache_call, seconds_ago=0):
+        self.rows[cache_call] = self.now - datetime.timedelta(seconds=seconds_ago)
+
+    def tick(self, seconds):
+        self.now += datetime.timedelta(seconds=seconds)
+
+    def fetch_rows(self, since):
+        return [(call, updated) for (call, updated) in self.rows.items() if since is None or updated > since]
+
+
+def test_poll_evicts_from_every_cache():
+    memory_cache = MemoryCache(max_bytes=10 ** 6)
+    store = {}
+    bus = InvalidationBus(memory_cache)
+    bus.register("scenario", "get_core_list_from_db", store)
+
+    core_call = cache_call("scenario", "get_core_list_from_db", "package-a")
+    other_call = cache_call("scenario", "get_core_list_from_db", "package-b")
+    computed_call = cache_call("consortium", "consortium_get_computed_data", "scenario-a")
+    store[core_call] = {"0000-0000": True}
+    store[other_call] = {"1111-1111": True}
+    memory_cache[computed_call] = [1, 2, 3]
+
+    table = CacheStatusTable()
+    table.reset(core_call)
+    table.reset(computed_call)
+    assert bus.poll(table.fetch_rows) == 2
+    assert core_call not in store
+    assert other_call in store
+    assert computed_call not in memory_cache
+    assert bus.last_updated == table.now
+
+
+def test_rows_are_evicted_once():
+    memory_cache = MemoryCache(max_bytes=10 ** 6)
+    bus = InvalidationBus(memory_cache, overlap=datetime.timedelta(seconds=60))
+    table = CacheStatusTable()
+    call = cache_call("consortium", "consortium_get_computed_data", "scenario-a")
+    table.reset(call)
+    assert bus.poll(table.fetch_rows) == 1
+
+    # recomputed after the reset, so the next polls leave it be
+    memory_cache[call] = "fresh"
+    table.tick(10)
+    assert bus.poll(table.fetch_rows) == 0
+    assert memory_cache[call] == "fresh"
+
+    # a row stamped before the last poll, but committed after it, is still seen
+    late_call = cache_call("consortium", "consortium_get_computed_data", "scenario-b")
+    memory_cache[late_call] = "stale"
+    table.reset(late_call, seconds_ago=15)
+    assert bus.poll(table.fetch_rows) == 1
+    assert late_call not in memory_cache
+
+    # and a second reset of the same call is a new row
+    table.tick(5)
+    table.reset(call)
+    assert bus.poll(table.fetch_rows) == 1
+    assert call not in memory_cache
+
+
+def test_bad_rows_are_skipped():
+    bus = InvalidationBus({})
+    table = CacheStatusTable()
+    table.reset("not json")
+    table.reset(cache_call("scenario", "get_apc_data_from_db", "package-a"), seconds_ago=1)
+    assert bus.poll(table.fetch_rows) == 1
+    assert bus.stats()["errors"] == 1
+    assert bus.poll(table.fetch_rows) == 0
+
+
+def test_first_poll_starts_at_the_latest_row():
+    memory_cache = MemoryCache(max_bytes=10 ** 6)
+    bus = InvalidationBus(memory_cache, overlap=datetime.timedelta(seconds=60))
+    table = CacheStatusTable()
+    old_call = cache_call("scenario", "get_apc_data_from_db", "package-a")
+    recent_call = cache_call("scenario", "get_apc_data_from_db", "package-b")
+    table.reset(old_call, seconds_ago=3600)
+    table.reset(recent_call, seconds_ago=30)
+    fetch_latest = lambda: max(table.rows.values()) if table.rows else None
+
+    # cached after those resets, by a worker that's just started
+    memory_cache[old_call] = "fresh"
+    memory_cache[recent_call] = "fresh"
+    assert bus.poll(table.fetch_rows, fetch_latest) == 0
+    assert bus.last_updated == table.now - datetime.timedelta(seconds=30)
+
+    table.tick(10)
+    assert bus.poll(table.fetch_rows, fetch_latest) == 0
+    assert memory_cache[old_call] == "fresh"
+    assert memory_cache[recent_call] == "fresh"
+
+    # a reset after it started is evicted
+    table.reset(old_call)
+    assert bus.poll(table.fetch_rows, fetch_latest) == 1
+    assert old_call not in memory_cache
+
+
+def test_first_poll_waits_for_the_latest_row():
+    bus = InvalidationBus(MemoryCache(max_bytes=10 ** 6))
+    table = CacheStatusTable()
+    table.reset(cache_call("scenario", "get_apc_data_from_db", "package-a"))
+    # couldn't read it, so nothing is replayed and the next poll tries again
+    assert bus.poll(table.fetch_rows, lambda: None) == 0
+    assert bus.last_updated is None
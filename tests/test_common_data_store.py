@@ -0,0 +1,166 @@
+import datetime
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from common_data_store import CommonDataStore
+from common_data_store import ensure_local_file
+from common_data_store import oa_keys
+from common_data_store import write_common_data_store
+from scenario_engine import ScenarioEngine
+from scenario_engine import get_download_curves
+
+
+class Settings(object):
+    include_submitted_version = True
+    include_bronze = True
+    include_social_networks = True
+    cost_content_fee_percent = 5.7
+    cost_alacart_increase = 8
+    cost_ill = 17
+    ill_request_percent_of_delayed = 5
+    weight_citation = 10
+    weight_authorship = 100
+
+
+now = datetime.datetime(2022, 6, 1)
+
+
+def common_data():
+    rnd = np.random.RandomState(0)
+    issn_ls = ["{:04d}-{:04d}".format(i, i * 7 % 10000) for i in range(1, 60)]
+    unpaywall = {}
+    num_papers = {}
+    for issn_l in issn_ls[:50]:
+        downloads = sorted(rnd.randint(10, 500, size=5).tolist(), reverse=True)
+        unpaywall[issn_l] = dict([("issn_l", issn_l), ("num_papers_2021", int(rnd.randint(1, 200))), ("downloads_total", float(sum(downloads)))] +
+                                 [("downloads_{}y".format(age), downloads[age]) for age in range(5)])
+        num_papers[issn_l] = dict((year, int(rnd.randint(1, 100))) for year in range(2014, 2022))
+    unpaywall[issn_ls[0]]["downloads_4y"] = None
+    num_papers[issn_ls[1]] = {2016: 5, 2019: 7}
+    oa = {}
+    for key in oa_keys:
+        oa[key] = {}
+        for issn_l in issn_ls[5:40]:
+            oa[key][issn_l] = [{"issn_l": issn_l, "fresh_oa_status": status, "year_int": year, "count": int(rnd.randint(0, 30))}
+                               for status in ["green", "bronze", "hybrid"] for year in range(2016, 2022)]
+    data = {
+        "embargo_dict": dict((issn_l, 12) for issn_l in issn_ls[::3]),
+        "unpaywall_downloads_dict_raw": unpaywall,
+        "social_networks": dict((issn_l, float(rnd.rand()) / 10) for issn_l in issn_ls[10:55]),
+        "oa": oa,
+        "society": dict((issn_l, "YES" if i % 2 else "NO") for (i, issn_l) in enumerate(issn_ls[20:])),
+        "num_papers": num_papers,
+    }
+    data["social_networks"][issn_ls[12]] = None
+    data["download_curves"] = get_download_curves(unpaywall, num_papers, now=now)
+    return data
+
+
+def sort_rows(oa_lookup):
+    return dict((issn_l, sorted(rows, key=lambda row: (row["fresh_oa_status"], row["year_int"]))) for (issn_l, rows) in oa_lookup.items())
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "common.store")
+    write_common_data_store(common_data(), path)
+    return CommonDataStore(path)
+
+
+def test_round_trip(store):
+    data = common_data()
+    views = store.to_common_data_dict()
+    for name in ["embargo_dict", "unpaywall_downloads_dict_raw", "social_networks", "society", "num_papers"]:
+        assert dict(views[name]) == data[name]
+    for key in oa_keys:
+        assert sort_rows(views["oa"][key]) == sort_rows(data["oa"][key])
+    curves = views["download_curves"]
+    assert curves["num_papers_years"] == data["download_curves"]["num_papers_years"]
+    assert set(curves["issn_ls"]) == set(data["download_curves"]["issn_ls"])
+    assert dict(curves["curves"]) == json.loads(json.dumps(data["download_curves"]["curves"]))
+
+    assert "9999-9999" not in views["embargo_dict"]
+    assert views["embargo_dict"].get("9999-9999", None) is None
+    assert views["embargo_dict"].get(None, None) is None
+    with pytest.raises(KeyError):
+        views["society"]["0001-0007"]
+
+
+def test_subset(store):
+    data = common_data()
+    views = store.to_common_data_dict()
+    issn_ls = sorted(data["unpaywall_downloads_dict_raw"])[::4] + ["9999-9999", "0001-0007-x", "", None]
+    for name in ["embargo_dict", "unpaywall_downloads_dict_raw", "social_networks", "society", "num_papers"]:
+        subset = views[name].subset(issn_ls)
+        expected = dict((issn_l, value) for (issn_l, value) in data[name].items() if issn_l in issn_ls)
+        assert dict(subset) == expected
+        assert len(subset) == len(expected)
+        assert "9999-9999" not in subset
+    outside = sorted(data["oa"][oa_keys[0]])[-1]
+    oa_subset = views["oa"][oa_keys[0]].subset(issn_ls)
+    assert outside not in oa_subset
+    assert oa_subset.get(outside, []) == []
+    assert views["oa"][oa_keys[0]].subset([]) == {}
+
+
+def test_oa_counts(store):
+    data = common_data()
+    oa_lookup = store.to_common_data_dict()["oa"][oa_keys[1]]
+    issn_l = sorted(data["oa"][oa_keys[1]])[3]
+    expected = dict((status, dict((row["year_int"], row["count"]) for row in data["oa"][oa_keys[1]][issn_l] if row["fresh_oa_status"] == status))
+                    for status in ["green", "bronze", "hybrid"])
+    assert oa_lookup.counts_by_status(issn_l) == expected
+    assert oa_lookup.counts_by_status("9999-9999") == {}
+
+    (statuses, counts) = oa_lookup.subset([issn_l]).counts_by_year([issn_l, "9999-9999"], [2014, 2017, 2020])
+    assert counts.shape == (2, len(statuses), 3)
+    assert counts[0, statuses.index("green")].tolist() == [0, expected["green"][2017], expected["green"][2020]]
+    assert not counts[1].any()
+
+
+def test_arrays_are_read_only_maps(store):
+    assert np.all(store.issn_ls[:-1] < store.issn_ls[1:])
+    assert isinstance(store.mapped, np.memmap)
+    for array in store.arrays.values():
+        assert not array.flags.writeable
+
+
+def test_same_engine_from_store(store):
+    data = common_data()
+    views = store.to_common_data_dict()
+    issn_ls = sorted(data["unpaywall_downloads_dict_raw"])[:30] + ["0000-0000"]
+
+    def engine(common):
+        scenario_data = dict(common)
+        scenario_data["unpaywall_downloads_dict"] = dict((issn_l, common["unpaywall_downloads_dict_raw"].get(issn_l, None)) for issn_l in issn_ls)
+        scenario_data["prices"] = dict((issn_l, 1000) for issn_l in issn_ls)
+        scenario_data["perpetual_access"] = {}
+        scenario_data["package-test"] = {"counter_dict": dict((issn_l, 500) for issn_l in issn_ls)}
+        return ScenarioEngine(issn_ls, scenario_data, Settings(), "package-test", now=now)
+
+    from_dicts = engine(data)
+    from_store = engine(views)
+    for name in ["num_green_historical_by_year", "num_hybrid_historical_by_year", "num_bronze_historical_by_year",
+                 "use_total", "use_oa", "use_social_networks", "use_backfile", "subscription_cost", "downloads_by_age"]:
+        assert np.allclose(getattr(from_store, name), getattr(from_dicts, name), equal_nan=True)
+
+
+def test_ensure_local_file_builds_once(tmp_path):
+    source = str(tmp_path / "source.store")
+    write_common_data_store(common_data(), source)
+    path = str(tmp_path / "copy.store")
+    builds = []
+
+    def build(temp_path):
+        builds.append(temp_path)
+        shutil.copyfile(source, temp_path)
+
+    assert ensure_local_file(path, build) == path
+    assert ensure_local_file(path, build) == path
+    assert len(builds) == 1
+    assert not os.path.exists(builds[0])
+    assert dict(CommonDataStore(path).to_common_data_dict()["embargo_dict"]) == common_data()["embargo_dict"]
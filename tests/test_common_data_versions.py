@@ -0,0 +1,177 @@
+import copy
+import io
+import os
+import shutil
+import threading
+
+import pytest
+
+from common_data_store import oa_keys
+from common_data_versions import CommonDataHolder
+from common_data_versions import CommonDataNotLoaded
+from common_data_versions import fetch_common_data_version
+from common_data_versions import load_common_data
+from common_data_versions import prune_common_data_versions
+from common_data_versions import publish_common_data
+from common_data_versions import read_manifest
+from common_data_versions import refresh_common_data
+from common_data_versions import version_path
+from .test_common_data_store import common_data
+from .test_common_data_store import sort_rows
+
+
+class LocalBucket(object):
+    # just what the versions code uses of an S3 client, on local disk
+    class exceptions(object):
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.uploaded = []
+        self.num_downloads = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key.replace("/", "__"))
+
+    def get_object(self, Bucket, Key):
+        if not os.path.exists(self.path(Key)):
+            raise self.exceptions.NoSuchKey(Key)
+        with open(self.path(Key), "rb") as f:
+            return {"Body": io.BytesIO(f.read())}
+
+    def put_object(self, Bucket, Key, Body):
+        with open(self.path(Key), "wb") as f:
+            f.write(Body)
+
+    def upload_file(self, Filename, Bucket, Key):
+        self.uploaded.append(Key)
+        shutil.copyfile(Filename, self.path(Key))
+
+    def download_file(self, Bucket, Key, Filename):
+        self.num_downloads += 1
+        shutil.copyfile(self.path(Key), Filename)
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    (tmp_path / "bucket").mkdir()
+    return LocalBucket(str(tmp_path / "bucket"))
+
+
+def changed_common_data():
+    data = copy.deepcopy(common_data())
+    issn_ls = sorted(data["unpaywall_downloads_dict_raw"])
+    data["embargo_dict"][issn_ls[1]] = 6
+    del data["society"][sorted(data["society"])[0]]
+    data["social_networks"]["7777-7777"] = 0.2
+    data["oa"][oa_keys[0]][issn_ls[10]] = data["oa"][oa_keys[0]][issn_ls[10]][:2]
+    return data
+
+
+def same_data(views, data):
+    for name in ["embargo_dict", "unpaywall_downloads_dict_raw", "social_networks", "society", "num_papers"]:
+        if dict(views[name]) != data[name]:
+            return False
+    return all(sort_rows(views["oa"][key]) == sort_rows(data["oa"][key]) for key in oa_keys)
+
+
+def test_publish_snapshot_then_delta(bucket, tmp_path):
+    builder_dir = tmp_path / "builder"
+    builder_dir.mkdir()
+    first = publish_common_data(bucket, "unsub-cache", common_data(), str(builder_dir), version="20260101000000")
+    assert first["snapshot"]["version"] == "20260101000000"
+    assert first["deltas"] == []
+
+    second = publish_common_data(bucket, "unsub-cache", changed_common_data(), str(builder_dir), version="20260102000000")
+    assert second["version"] == "20260102000000"
+    assert second["snapshot"] == first["snapshot"]
+    assert [delta["base_version"] for delta in second["deltas"]] == ["20260101000000"]
+    assert bucket.uploaded[-1].endswith(".delta.store")
+    assert read_manifest(bucket, "unsub-cache") == second
+    # just the changed issns go up
+    assert os.path.getsize(bucket.path(bucket.uploaded[-1])) < os.path.getsize(bucket.path(bucket.uploaded[0])) / 2
+
+    # a worker starting from scratch gets the snapshot with the delta applied
+    worker_dir = tmp_path / "worker"
+    worker_dir.mkdir()
+    store = fetch_common_data_version(bucket, "unsub-cache", second, str(worker_dir))
+    assert store.meta["data_version"] == "20260102000000"
+    assert same_data(store.to_common_data_dict(), changed_common_data())
+
+
+def test_big_change_is_a_snapshot(bucket, tmp_path):
+    publish_common_data(bucket, "unsub-cache", common_data(), str(tmp_path), version="20260101000000")
+    data = common_data()
+    data["unpaywall_downloads_dict_raw"] = dict((issn_l, dict(row, downloads_total=1.0))
+                                                for (issn_l, row) in data["unpaywall_downloads_dict_raw"].items())
+    data["num_papers"] = dict((issn_l, {2020: 1}) for issn_l in data["num_papers"])
+    manifest = publish_common_data(bucket, "unsub-cache", data, str(tmp_path), version="20260102000000")
+    assert manifest["snapshot"]["version"] == "20260102000000"
+    assert manifest["deltas"] == []
+
+
+def test_refresh_swaps_new_versions(bucket, tmp_path):
+    holder = CommonDataHolder()
+    worker_dir = str(tmp_path / "worker")
+    os.mkdir(worker_dir)
+    assert not refresh_common_data(holder, bucket, "unsub-cache", worker_dir)
+    with pytest.raises(CommonDataNotLoaded):
+        holder.get(timeout=0)
+
+    publish_common_data(bucket, "unsub-cache", common_data(), str(tmp_path), version="20260101000000")
+    assert refresh_common_data(holder, bucket, "unsub-cache", worker_dir)
+    (version, data) = holder.get()
+    assert version == "20260101000000"
+
+    num_downloads = bucket.num_downloads
+    assert not refresh_common_data(holder, bucket, "unsub-cache", worker_dir)
+    assert bucket.num_downloads == num_downloads
+
+    publish_common_data(bucket, "unsub-cache", changed_common_data(), str(tmp_path), version="20260102000000")
+    assert refresh_common_data(holder, bucket, "unsub-cache", worker_dir)
+    assert holder.version == "20260102000000"
+    assert same_data(holder.get()[1], changed_common_data())
+    # whoever still has the old version keeps reading it
+    assert same_data(data, common_data())
+
+
+def test_load_retries_until_it_works():
+    holder = CommonDataHolder()
+    attempts = []
+
+    def fetch():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise IOError("S3 is down")
+        return ("20260101000000", {"embargo_dict": {}})
+
+    assert load_common_data(holder, fetch, retry_seconds=0.001)
+    assert len(attempts) == 3
+    assert holder.get(timeout=0) == ("20260101000000", {"embargo_dict": {}})
+    assert holder.last_error is None
+
+
+def test_get_says_why_it_isnt_loaded():
+    holder = CommonDataHolder()
+    stop = threading.Event()
+
+    def fetch():
+        stop.set()
+        raise IOError("the db is down too")
+
+    assert not load_common_data(holder, fetch, retry_seconds=0.001, stop=stop)
+    with pytest.raises(CommonDataNotLoaded, match="the db is down too"):
+        holder.get(timeout=0.01)
+
+
+def test_prune_keeps_current_snapshot_and_newer(tmp_path):
+    directory = str(tmp_path)
+    for version in ["20260101000000", "20260102000000", "20260103000000", "20260104000000", "20260105000000"]:
+        with open(version_path(directory, version), "wb") as f:
+            f.write(b"store")
+    manifest = {"version": "20260104000000", "snapshot": {"version": "20260102000000", "key": "k"}, "deltas": []}
+
+    assert prune_common_data_versions(directory, manifest) == ["20260101000000", "20260103000000"]
+    assert sorted(os.listdir(directory)) == ["common_data_20260102000000.store", "common_data_20260104000000.store",
+                                             "common_data_20260105000000.store"]
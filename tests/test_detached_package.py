@@ -0,0 +1,116 @@
+import threading
+from time import sleep
+
+import pytest
+from sqlalchemy import Boolean, Column, Float, Text, create_engine
+from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker
+from sqlalchemy.orm.exc import DetachedInstanceError
+
+from detached_package import DetachedPackage
+from single_flight import SingleFlight
+
+Base = declarative_base()
+
+
+class Record(object):
+    def __init__(self, issn_l, issns):
+        self.issn_l = issn_l
+        self.issns = issns
+
+
+class StandInPackage(Base):
+    """The jump_account_package columns DetachedPackage reads, without the app behind Package."""
+    __tablename__ = "jump_account_package"
+    package_id = Column(Text, primary_key=True)
+    institution_id = Column(Text)
+    publisher = Column(Text)
+    package_name = Column(Text)
+    consortium_package_id = Column(Text)
+    is_demo = Column(Boolean)
+    big_deal_cost = Column(Float)
+    big_deal_cost_increase = Column(Float)
+    currency = Column(Text)
+
+    @property
+    def unique_issns(self):
+        return ["0000-0019", "0000-0027"]
+
+    @property
+    def journal_metadata(self):
+        return {"0000-0019": Record("0000-0019", ["0000-0019", "1111-1111"])}
+
+    @property
+    def journal_metadata_flat(self):
+        return {"0000-0019": self.journal_metadata["0000-0019"], "1111-1111": self.journal_metadata["0000-0019"]}
+
+
+@pytest.fixture
+def session(tmp_path):
+    # a file, so the threads below see the same database
+    engine = create_engine("sqlite:///{}".format(tmp_path / "packages.db"))
+    Base.metadata.create_all(engine)
+    session = scoped_session(sessionmaker(bind=engine))
+    session.add(StandInPackage(package_id="package-a", institution_id="institution-a", publisher="Elsevier",
+                               package_name="Elsevier 2023", is_demo=False, big_deal_cost=1000000.0,
+                               big_deal_cost_increase=5.0, currency="USD"))
+    session.commit()
+    session.remove()
+    return session
+
+
+def test_copies_what_a_scenario_reads(session):
+    my_package = DetachedPackage(session.query(StandInPackage).get("package-a"))
+    session.remove()
+
+    assert my_package.package_id == "package-a"
+    assert my_package.currency == "USD"
+    assert my_package.big_deal_cost == 1000000.0
+    assert my_package.unique_issns == ["0000-0019", "0000-0027"]
+    assert my_package.get_journal_metadata("1111-1111").issn_l == "0000-0019"
+    assert not my_package.is_demo_account
+
+
+def test_follower_reads_after_the_leaders_session_is_removed(session):
+    single_flight = SingleFlight()
+    follower_waiting = threading.Event()
+    leader_done = threading.Event()
+    orm_packages = []
+    results = {}
+
+    def build():
+        package = session.query(StandInPackage).get("package-a")
+        orm_packages.append(package)
+        my_package = DetachedPackage(package)
+        follower_waiting.wait(5)
+        # the leader's request ends: its session commits and is removed, so the ORM object is detached
+        session.commit()
+        session.remove()
+        return my_package
+
+    def leader():
+        results["leader"] = single_flight.do("package-a", build)
+        leader_done.set()
+
+    def follower():
+        results["follower"] = single_flight.do("package-a", build)
+        leader_done.wait(5)
+        results["follower_reads"] = (results["follower"].package_name, results["follower"].currency,
+                                     results["follower"].is_demo, results["follower"].unique_issns)
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    while not orm_packages:
+        sleep(0.001)
+    follower_thread = threading.Thread(target=follower)
+    follower_thread.start()
+    while single_flight.stats()["coalesced"] < 1:
+        sleep(0.001)
+    follower_waiting.set()
+    leader_thread.join(5)
+    follower_thread.join(5)
+
+    assert results["follower"] is results["leader"]
+    assert results["follower_reads"] == ("Elsevier 2023", "USD", False, ["0000-0019", "0000-0027"])
+    # what the scenario would have hit if it had kept the ORM object
+    with pytest.raises(DetachedInstanceError):
+        orm_packages[0].package_name
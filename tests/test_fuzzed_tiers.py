@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fuzzed_tiers import fuzzed_tiers
+from fuzzed_tiers import rank_first
+
+
+def pandas_tiers(column):
+    ranked = pd.Series(column).rank(method="first", na_option="keep")
+    return pd.qcut(ranked, 3, labels=["low", "medium", "high"]).tolist()
+
+
+def same(a, b):
+    return all(x == y or (x != x and y != y) for (x, y) in zip(a, b))
+
+
+@pytest.mark.parametrize("num_journals", [2, 3, 4, 5, 7, 10, 100, 301, 3000])
+def test_matches_pandas_rank_and_qcut(num_journals):
+    rnd = np.random.RandomState(num_journals)
+    # lots of ties, and some nans
+    values = rnd.randint(0, max(2, num_journals // 3), size=(num_journals, 4)).astype(float)
+    values[rnd.rand(num_journals, 4) < 0.1] = np.nan
+    values[:2, 3] = [1, 2]
+
+    ranks = rank_first(values)
+    tiers = fuzzed_tiers(values)
+    for column in range(values.shape[1]):
+        expected_ranks = pd.Series(values[:, column]).rank(method="first", na_option="keep").values
+        assert np.array_equal(ranks[:, column], expected_ranks, equal_nan=True)
+        if np.sum(~np.isnan(values[:, column])) >= 2:
+            assert same(tiers[:, column].tolist(), pandas_tiers(values[:, column]))
+
+
+def test_too_few_values():
+    values = np.array([[np.nan, 1.0, 3.0], [np.nan, np.nan, 3.0]])
+    tiers = fuzzed_tiers(values)
+    assert tiers[:, 0].tolist() == ["-", "-"]
+    assert tiers[:, 1].tolist() == ["-", "-"]
+    assert tiers[:, 2].tolist() == ["low", "high"]
+    assert fuzzed_tiers(np.array([[5.0]])).tolist() == [["-"]]
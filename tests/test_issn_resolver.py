@@ -0,0 +1,61 @@
+from issn_resolver import IssnResolver, clean_issn, is_valid_issn
+
+
+def make_resolver():
+    return IssnResolver.from_rows([
+        ("0266-6731", "0266-6731"),
+        ("1026-597X", "0266-6731"),
+        ("0028-0836", "0028-0836"),
+        ("1476-4687", "0028-0836"),
+        (None, "0028-0836"),
+    ])
+
+
+def test_clean_issn():
+    assert clean_issn("issn:0266 6731") == "0266-6731"
+    assert clean_issn("1026597x") == "1026-597X"
+    assert clean_issn("0266-673") is None
+    assert clean_issn("") is None
+    assert clean_issn(None) is None
+
+
+def test_is_valid_issn():
+    assert is_valid_issn("0266-6731")
+    assert is_valid_issn("1026-597x")
+    assert is_valid_issn("0028-0836")
+    assert not is_valid_issn("0266-6732")
+    assert not is_valid_issn("not an issn")
+
+
+def test_membership():
+    resolver = make_resolver()
+    assert "1026-597X" in resolver
+    assert "1026597x" in resolver
+    assert "1234-5679" not in resolver
+    assert len(resolver) == 4
+
+
+def test_issn_l():
+    resolver = make_resolver()
+    assert resolver.issn_l("1476-4687") == "0028-0836"
+    assert resolver.issn_l("issn:1476 4687") == "0028-0836"
+    assert resolver.issn_l("1234-5679") is None
+    assert resolver.issn_l("1234-5679", "default") == "default"
+
+
+def test_issn_l_is_its_own_issn():
+    resolver = IssnResolver({"1026-597X": "0266-6731"})
+    assert "0266-6731" in resolver
+    assert resolver.issn_l("0266-6731") == "0266-6731"
+    assert resolver.issn_ls == {"0266-6731"}
+
+
+def test_resolve_keeps_order():
+    resolver = make_resolver()
+    assert resolver.resolve(["1476-4687", "1234-5679", "1026597X"]) == ["0028-0836", None, "0266-6731"]
+    assert resolver.resolve([]) == []
+
+
+def test_resolve_dict_skips_unknown():
+    resolver = make_resolver()
+    assert resolver.resolve_dict(["1476-4687", "1234-5679"]) == {"1476-4687": "0028-0836"}
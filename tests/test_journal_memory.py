@@ -0,0 +1,41 @@
+import tracemalloc
+
+from journal import Journal
+from scenario_engine import ScenarioEngine
+from subscription_state import SubscriptionState
+from tests.test_scenario_engine import Settings, now, scenario_data
+
+
+def test_journal_memory():
+    # journals are slotted views onto the scenario's engine, so a 3000 title package
+    # costs a few hundred bytes per journal on top of the engine, not tens of KB
+    data = scenario_data()
+    issn_ls = ["1000-{:04d}".format(index) for index in range(3000)]
+    for issn_l in issn_ls:
+        for name in ["unpaywall_downloads_dict", "num_papers", "social_networks", "prices", "perpetual_access"]:
+            data[name][issn_l] = data[name]["0000-0001"]
+        for key in data["oa"]:
+            data["oa"][key][issn_l] = data["oa"][key]["0000-0001"]
+        data["package-test"]["counter_dict"][issn_l] = 2000
+    engine = ScenarioEngine(issn_ls, data, Settings(), "package-test", now=now)
+    state = SubscriptionState(engine)
+    names = ["use_total", "cpu", "use_instant_by_year", "use_actual", "downloads_by_age", "subscription_cost_by_year",
+             "use_oa_percent_by_year", "downloads_obs_pub", "perpetual_access_years"]
+    for name in names:
+        getattr(engine, name, None)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    journals = [Journal(issn_l) for issn_l in issn_ls]
+    for index, journal in enumerate(journals):
+        journal.set_scenario_data(data)
+        journal.set_engine(engine, index, state)
+        for name in names:
+            getattr(journal, name)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    bytes_per_journal = sum(stat.size_diff for stat in after.compare_to(before, "filename")) / float(len(journals))
+    assert not hasattr(journals[0], "__dict__")
+    assert bytes_per_journal < 1000, "{} bytes per journal, over the 1000 byte bound".format(round(bytes_per_journal))
+
@@ -0,0 +1,102 @@
+import csv
+import datetime
+
+import pandas as pd
+
+from journal_metadata_compute import (StageReport, compute_journal_metadata, computed_columns, last_doi_columns,
+                                      pricing_columns, raw_columns, write_csv)
+
+now = datetime.datetime(2022, 7, 1, 12, 0)
+
+
+def raw_row(issn_l, issn=None, is_oa=None, is_in_doaj=None, publisher="Elsevier", counts_by_year=None,
+            display_name=None):
+    return (issn_l, issn if issn is not None else '["{}"]'.format(issn_l), display_name or "Journal {}".format(issn_l),
+            is_oa, is_in_doaj, publisher, counts_by_year)
+
+
+def compute(raw_rows, last_doi_rows=(), pricing_rows=()):
+    computed = compute_journal_metadata(
+        pd.DataFrame(raw_rows, columns=raw_columns),
+        pd.DataFrame(list(last_doi_rows), columns=last_doi_columns),
+        pd.DataFrame(list(pricing_rows), columns=pricing_columns),
+        now, 2021)
+    return dict((row["issn_l"], row) for row in computed.to_dict("records"))
+
+
+def test_currently_publishing_from_last_doi():
+    computed = compute(
+        [raw_row("0000-0001"), raw_row("0000-0002"), raw_row("0000-0003", counts_by_year='[{"year": 2021, "works_count": 5}]')],
+        last_doi_rows=[("0000-0001", "2022-03-01"), ("0000-0002", "2020-01-01"), ("0000-0003", None)])
+    assert computed["0000-0001"]["is_currently_publishing"]
+    assert not computed["0000-0002"]["is_currently_publishing"]
+    # a last DOI row with no date means not publishing, whatever counts_by_year says
+    assert not computed["0000-0003"]["is_currently_publishing"]
+
+
+def test_currently_publishing_from_counts_by_year():
+    computed = compute([
+        raw_row("0000-0001", counts_by_year='[{"year": 2021, "works_count": 5}, {"year": 2020, "works_count": 0}]'),
+        raw_row("0000-0002", counts_by_year="[{'year': 2021, 'works_count': 0}]"),
+        raw_row("0000-0003"),
+        raw_row("0036-8733"),
+    ])
+    assert computed["0000-0001"]["is_currently_publishing"]
+    assert not computed["0000-0002"]["is_currently_publishing"]
+    assert not computed["0000-0003"]["is_currently_publishing"]
+    assert computed["0036-8733"]["is_currently_publishing"]
+
+
+def test_gold_and_current_subscription():
+    publishing = '[{"year": 2021, "works_count": 5}]'
+    computed = compute([
+        raw_row("0000-0001", counts_by_year=publishing),
+        raw_row("0000-0002", is_oa=True, counts_by_year=publishing),
+        raw_row("0000-0003", is_oa=False, is_in_doaj=True, counts_by_year=publishing),
+        raw_row("0000-0004", is_oa=False, is_in_doaj=None, counts_by_year=publishing),
+    ])
+    assert computed["0000-0001"]["is_current_subscription_journal"]
+    assert not computed["0000-0001"]["is_gold_journal_in_most_recent_year"]
+    assert computed["0000-0002"]["is_gold_journal_in_most_recent_year"]
+    assert not computed["0000-0002"]["is_current_subscription_journal"]
+    assert computed["0000-0003"]["is_gold_journal_in_most_recent_year"]
+    assert computed["0000-0004"]["is_current_subscription_journal"]
+
+
+def test_prices_publishers_and_titles():
+    computed = compute(
+        [raw_row("0000-0001", display_name="Nature's Child"), raw_row("2058-5276", publisher="Nature"),
+         raw_row("0000-0003", publisher=None)],
+        pricing_rows=[("0000-0001", 100.0, 80.0, None, None), ("0000-0001", 200.0, 160.0, 3000.0, None)])
+    assert computed["0000-0001"]["subscription_price_usd"] == 200.0
+    assert computed["0000-0001"]["apc_price_usd"] == 3000.0
+    assert pd.isna(computed["2058-5276"]["subscription_price_usd"])
+    assert computed["2058-5276"]["publisher"] == "Springer Nature"
+    # escaped the way the old execute_values insert escaped them
+    assert computed["0000-0001"]["title"] == "Nature''s Child"
+    assert computed["0000-0003"]["publisher"] == "null"
+    assert computed["0000-0001"]["created"] == now.isoformat()
+
+
+def test_journals_without_issns_are_left_out():
+    computed = compute([raw_row("0000-0001", issn="[]"), raw_row("0000-0002", issn=""), raw_row("0000-0003")])
+    assert list(computed) == ["0000-0003"]
+
+
+def test_write_csv(tmp_path):
+    computed = compute([raw_row("0000-0001", issn='["0000-0001", "1111-1111"]')])
+    df = pd.DataFrame(list(computed.values()), columns=computed_columns)
+    with open(write_csv(df, str(tmp_path / "computed.csv"))) as f:
+        rows = list(csv.reader(f))
+    assert len(rows) == 1
+    row = dict(zip(computed_columns, rows[0]))
+    assert row["issns_string"] == '["0000-0001", "1111-1111"]'
+    assert row["is_currently_publishing"] == "false"
+    assert row["subscription_price_usd"] == ""
+
+
+def test_stage_report():
+    stages = StageReport()
+    stages.done("compute", 1000, 0)
+    assert stages.summary()[0]["stage"] == "compute"
+    assert stages.summary()[0]["rows"] == 1000
@@ -0,0 +1,105 @@
+import pytest
+
+from journal_metadata_store import JournalMetadataStore, parse_issns
+
+
+def make_row(issn_l, issns_string, publisher="Elsevier", **kwargs):
+    row = {
+        "issn_l": issn_l,
+        "issns_string": issns_string,
+        "title": "Journal {}".format(issn_l),
+        "publisher": publisher,
+        "is_current_subscription_journal": True,
+        "is_gold_journal_in_most_recent_year": False,
+        "is_currently_publishing": True,
+        "subscription_price_usd": None,
+        "subscription_price_gbp": None,
+        "apc_price_usd": None,
+        "apc_price_gbp": None,
+    }
+    row.update(kwargs)
+    return row
+
+
+def make_store():
+    return JournalMetadataStore.from_rows([
+        make_row("0266-6731", '["0266-6731", "1026-597X"]', subscription_price_usd=1200, apc_price_gbp=2000),
+        make_row("0028-0836", "['0028-0836', '1476-4687']", publisher="Springer Nature",
+                 is_gold_journal_in_most_recent_year=True),
+        make_row("1234-5679", "[]"),
+    ], version="2022-07-01 00:00:00")
+
+
+def test_parse_issns():
+    assert parse_issns('["0266-6731", "1026-597X"]') == ["0266-6731", "1026-597X"]
+    assert parse_issns("['0266-6731']") == ["0266-6731"]
+    assert parse_issns(None) == []
+
+
+def test_lookups():
+    store = make_store()
+    assert len(store) == 2
+    assert "1234-5679" not in store
+    assert store.get("0266-6731").title == "Journal 0266-6731"
+    assert store.get_by_issn("1476-4687").issn_l == "0028-0836"
+    assert store.get_by_issn("1234-5679", {}) == {}
+    assert store.issn_to_issn_l()["1026-597X"] == "0266-6731"
+
+
+def test_records_act_like_journal_metadata():
+    store = make_store()
+    record = store.get("0266-6731")
+    assert record.issns == ["0266-6731", "1026-597X"]
+    assert record.display_issns == "0266-6731,1026-597X"
+    assert record.display_issn_l == "issn:0266-6731"
+    assert record.is_hybrid
+    assert record.get_subscription_price("USD") == 1200.0
+    assert record.get_subscription_price("GBP") is None
+    assert record.get_subscription_price("GBP", use_high_price_if_unknown=True) == 3775
+    assert record.get_apc_price("GBP") == 2000.0
+    assert store.get("0028-0836").publisher_code == "SpringerNature"
+    assert not store.get("0028-0836").is_hybrid
+    with pytest.raises(AttributeError):
+        record.some_new_attribute = 1
+
+
+def test_publishers_are_shared():
+    store = JournalMetadataStore.from_rows([
+        make_row("0266-6731", '["0266-6731"]', publisher="".join(["Else", "vier"])),
+        make_row("0028-0836", '["0028-0836"]', publisher="".join(["Elsev", "ier"])),
+    ])
+    assert store.get("0266-6731").publisher is store.get("0028-0836").publisher
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = make_store()
+    path = str(tmp_path / "journal_metadata.pickle")
+    store.write_snapshot(path)
+
+    loaded = JournalMetadataStore.read_snapshot(path)
+    assert loaded.version == "2022-07-01 00:00:00"
+    assert sorted(loaded) == sorted(store)
+    assert loaded.get_by_issn("1026-597X").get_subscription_price("USD") == 1200.0
+    assert loaded.get("0028-0836").publisher == "Springer Nature"
+
+
+def test_missing_or_broken_snapshot(tmp_path):
+    assert JournalMetadataStore.read_snapshot(str(tmp_path / "nope.pickle")) is None
+    path = tmp_path / "broken.pickle"
+    path.write_bytes(b"not a pickle")
+    assert JournalMetadataStore.read_snapshot(str(path)) is None
+
+
+def test_current_subscription_journals():
+    store = JournalMetadataStore.from_rows([
+        make_row("0266-6731", '["0266-6731"]'),
+        make_row("0028-0836", '["0028-0836"]', is_current_subscription_journal=False),
+        make_row("1026-597X", '["1026-597X"]', is_current_subscription_journal=None),
+        make_row("1476-4687", '["1476-4687"]'),
+    ])
+    issn_ls = ["1476-4687", "0028-0836", "9999-9999", "1026-597X", "0266-6731"]
+    journal_metadata = store.current_subscription_journals(issn_ls)
+    assert list(journal_metadata) == ["1476-4687", "0266-6731"]
+    assert journal_metadata["0266-6731"] is store.get("0266-6731")
+    assert store.current_subscription_journals([]) == {}
+    assert list(store.positions_of(["9999-9999", "0028-0836"])) == [-1, 1]
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import memory_cache
+from memory_cache import MemoryCache
+from memory_cache import approximate_size
+
+
+def test_approximate_size():
+    small = approximate_size({"a": [1, 2, 3]})
+    big = approximate_size({"a": list(range(10000))})
+    assert 0 < small < big
+    assert approximate_size(np.zeros(100000)) >= 800000
+    # views don't own their data
+    array = np.zeros(100000)
+    assert approximate_size(array[::2]) < 1000
+    shared = "x" * 100000
+    assert approximate_size([shared, shared]) < 2 * len(shared)
+
+
+def test_lru_eviction_by_size():
+    cache = MemoryCache(max_bytes=3 * approximate_size("x" * 1000) + 10)
+    for key in ["a", "b", "c"]:
+        cache.set(key, "x" * 1000, group="strings")
+    assert cache.get("a") is not None
+    cache.set("d", "y" * 1000)
+    # b was the least recently used
+    assert "b" not in cache
+    assert all(key in cache for key in ["a", "c", "d"])
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["entries"] == 3
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["by_function"]["strings"]["entries"] == 2
+
+    cache.set("huge", "z" * 100000)
+    assert "huge" not in cache
+    assert cache.stats()["too_big"] == 1
+
+
+def test_ttl_and_counters(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memory_cache, "time", lambda: now[0])
+    cache = MemoryCache(max_bytes=10 ** 6, ttl=60)
+    cache["key"] = {"value": 1}
+    assert cache["key"] == {"value": 1}
+    now[0] += 61
+    assert cache.get("key") is None
+    with pytest.raises(KeyError):
+        cache["key"]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"]) == (1, 2, 1)
+    assert stats["hit_rate"] == round(1 / 3.0, 4)
+
+
+def test_keys_are_hashed():
+    cache = MemoryCache(max_bytes=10 ** 6)
+    long_key = '["scenario", "get_common_package_data_for", [{}]]'.format(", ".join(['"0000-0000"'] * 5000))
+    cache.set(long_key, 1)
+    assert long_key in cache
+    assert all(len(key) == 40 for key in cache.entries)
+    assert cache.pop(long_key) == 1
+    assert cache.pop(long_key, "gone") == "gone"
+    assert cache.stats()["bytes"] == 0
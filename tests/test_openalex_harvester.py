@@ -0,0 +1,189 @@
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from openalex_harvester import Checkpoint, HarvestError, date_shards, harvest, source_row
+
+date_start = datetime.datetime(2023, 5, 1)
+date_end = datetime.datetime(2023, 5, 2)
+next_date_end = datetime.datetime(2023, 5, 3)
+
+
+def make_record(issn_l):
+    return {"id": "https://openalex.org/S{}".format(issn_l), "issn_l": issn_l, "issn": [issn_l], "display_name": issn_l,
+            "is_oa": False, "is_in_doaj": False, "host_organization_name": "Elsevier", "counts_by_year": [],
+            "x_concepts": [], "updated_date": "2023-05-01T10:00:00"}
+
+
+class StubOpenalex(object):
+    """/sources over http, a few pages per updated date shard, failing requests on demand."""
+
+    def __init__(self, num_shards, pages_per_shard=3, per_page=2):
+        self.pages = {}
+        shards = date_shards(date_start, date_end, num_shards) + date_shards(date_end, next_date_end, num_shards)
+        for (i, (from_date, to_date)) in enumerate(shards):
+            self.pages[from_date] = [[make_record("{:04d}-{:02d}{:02d}".format(i, page, n)) for n in range(per_page)]
+                                     for page in range(pages_per_shard)]
+        self.requests = []
+        self.failures = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_address[1])
+
+    def handle(self, handler):
+        query = parse_qs(urlparse(handler.path).query)
+        filters = dict(part.split(":", 1) for part in query["filter"][0].split(","))
+        cursor = query["cursor"][0]
+        with self.lock:
+            self.requests.append((filters["from_updated_date"], cursor))
+            failure = self.failures.pop(0) if self.failures else None
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        if failure:
+            handler.send_response(failure)
+            if failure == 429:
+                handler.send_header("Retry-After", "0")
+            handler.end_headers()
+            return
+
+        pages = self.pages[filters["from_updated_date"]]
+        page_number = 0 if cursor == "*" else int(cursor)
+        next_cursor = str(page_number + 1) if page_number + 1 < len(pages) else None
+        body = json.dumps({"meta": {"next_cursor": next_cursor}, "results": pages[page_number]}).encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def all_issn_ls(self, start=date_start, end=date_end):
+        from_dates = set(from_date for (from_date, to_date) in date_shards(start, end, 4))
+        return sorted(record["issn_l"] for (from_date, pages) in self.pages.items() if from_date in from_dates
+                      for page in pages for record in page)
+
+
+@pytest.fixture
+def stub():
+    stub = StubOpenalex(num_shards=4)
+    stub.thread.start()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+def run_harvest(stub, checkpoint_path, write_batch, start=date_start, end=date_end, **kwargs):
+    return harvest("sources", write_batch, str(checkpoint_path), "issn_l:!null", start, end, num_shards=4,
+                   base_url=stub.url, backoff_seconds=0.001, **kwargs)
+
+
+def test_date_shards():
+    shards = date_shards(date_start, date_end, 4)
+    assert shards[0] == ("2023-05-01T00:00:00Z", "2023-05-01T06:00:00Z")
+    assert shards[-1] == ("2023-05-01T18:00:00Z", "2023-05-02T00:00:00Z")
+
+
+def test_source_row():
+    row = source_row(make_record("0266-6731"))
+    assert row["publisher"] == "Elsevier"
+    assert row["issn"] == "['0266-6731']"
+
+
+def test_harvests_every_page_of_every_shard(stub, tmp_path):
+    batches = []
+    num_records = run_harvest(stub, tmp_path / "checkpoint.json", batches.append, concurrency=2, per_page=2)
+
+    assert num_records == 24
+    assert len(batches) == 12
+    assert stub.max_in_flight == 2
+    assert sorted(record["issn_l"] for batch in batches for record in batch) == stub.all_issn_ls()
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    assert not checkpoint.load()
+    assert sum(checkpoint.counts.values()) == 24
+
+
+def test_retries_with_backoff(stub, tmp_path):
+    stub.failures = [503, 429, 502]
+    batches = []
+    assert run_harvest(stub, tmp_path / "checkpoint.json", batches.append) == 24
+    assert len(stub.requests) == 12 + 3
+
+
+def test_gives_up_after_max_retries(stub, tmp_path):
+    stub.failures = [503] * 10
+    with pytest.raises(HarvestError):
+        run_harvest(stub, tmp_path / "checkpoint.json", lambda records: None, concurrency=1, max_retries=2)
+
+
+def test_does_not_retry_client_errors(stub, tmp_path):
+    stub.failures = [400]
+    with pytest.raises(HarvestError):
+        run_harvest(stub, tmp_path / "checkpoint.json", lambda records: None, concurrency=1)
+    assert len(stub.requests) == 1
+
+
+def test_resumes_from_checkpoint(stub, tmp_path):
+    written = []
+
+    def write_batch_then_die(records):
+        if len(written) == 10:
+            raise RuntimeError("database went away")
+        written.extend(records)
+
+    with pytest.raises(RuntimeError):
+        run_harvest(stub, tmp_path / "checkpoint.json", write_batch_then_die, concurrency=1)
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    assert checkpoint.load()
+    requests_before = list(stub.requests)
+
+    run_harvest(stub, tmp_path / "checkpoint.json", written.extend, concurrency=1)
+
+    assert sorted(record["issn_l"] for record in written) == stub.all_issn_ls()
+    # nothing already written was fetched again, except the page whose write failed
+    resumed_requests = stub.requests[len(requests_before):]
+    assert len(resumed_requests) == 12 - len(requests_before) + 1
+
+
+def test_resumed_run_then_harvests_the_new_window(stub, tmp_path):
+    written = []
+
+    def write_batch_then_die(records):
+        if len(written) == 10:
+            raise RuntimeError("dyno restarted")
+        written.extend(records)
+
+    with pytest.raises(RuntimeError):
+        run_harvest(stub, tmp_path / "checkpoint.json", write_batch_then_die, concurrency=1)
+
+    # the next day's run, for the next day's window
+    num_records = run_harvest(stub, tmp_path / "checkpoint.json", written.extend, start=date_end, end=next_date_end,
+                              concurrency=1)
+
+    assert num_records == 24 - 10 + 24
+    assert sorted(record["issn_l"] for record in written) == sorted(
+        stub.all_issn_ls() + stub.all_issn_ls(date_end, next_date_end))
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.json"))
+    assert not checkpoint.load()
+    assert checkpoint.run.startswith("sources {}".format(date_end.isoformat()))
@@ -28,6 +28,7 @@ def test_normalize_issn():
         {'issn': '\nfs34-\n5123x\t',        'warning': ParseWarning.bad_issn},
         {'issn': 'RT34-\n123x\t',           'warning': ParseWarning.bundle_issn},
         {'issn': 'FS34-\n123y\t',           'warning': ParseWarning.bad_issn},
+        {'issn': '0266-6732',               'warning': ParseWarning.invalid_issn},
     ]
 
     for i in invalid_issns:
@@ -36,6 +37,12 @@ def test_normalize_issn():
     assert PackageInput.normalize_issn('') == None
     assert PackageInput.normalize_issn('', warn_if_blank=True) == ParseWarning.no_issn
 
+def test_normalize_issns():
+    issns = ['0266-6731', '  02666731', '0266-6732', 'RT34-\n123x\t', '']
+    assert PackageInput.normalize_issns(issns) == [PackageInput.normalize_issn(issn) for issn in issns]
+    assert PackageInput.normalize_issns(issns, warn_if_blank=True)[-1] == ParseWarning.no_issn
+    assert PackageInput.normalize_issns([]) == []
+
 def test_normalize_date():
     assert PackageInput.normalize_date('1955-11-05') == datetime.datetime(1955, 11, 5).isoformat()
     assert PackageInput.normalize_date('October 26 1985') == datetime.datetime(1985, 10, 26).isoformat()
@@ -132,8 +139,9 @@ def test_reject_unknown_issn():
 
     test_file = write_to_tempfile("""
 issn,int
-3333-3333,1
+3333-3335,1
 0024-3205,2
+3333-3333,3
     """.strip())
 
     rows, warnings = TestIssnFormat().normalize_rows(file_name=test_file)
@@ -151,13 +159,24 @@ issn,int
                 'int': {'value': '1', 'error': None},
                 'row_id': {'value': 2, 'error': None},
                 'issn': {
-                    'value': '3333-3333',
+                    'value': '3333-3335',
                     'error': {
                         'message': u"This looks like an ISSN, but it isn't one we recognize.",
                         'label': 'unknown_issn'
                     }
                 },
             },
+            {
+                'int': {'value': '3', 'error': None},
+                'row_id': {'value': 4, 'error': None},
+                'issn': {
+                    'value': '3333-3333',
+                    'error': {
+                        'message': u"This looks like an ISSN, but its check digit is wrong. Is it mistyped?",
+                        'label': 'invalid_issn'
+                    }
+                },
+            },
         ] == warnings['rows']
 
 def test_required_field():
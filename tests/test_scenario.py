@@ -77,6 +77,67 @@ def test_scenario_details(fetch_jwt):
         ScenarioDetailsSchema().load({"_stuff": 5})
 
 
+def test_scenario_frontier(fetch_jwt):
+    res = requests.get(
+        url_base + f"/scenario/{scenario_id}/frontier",
+        headers={"Authorization": "Bearer " + fetch_jwt(os.environ["UNSUB_USER1_PWD"], os.environ["UNSUB_USER1_EMAIL"])},
+    )
+    data = res.json()
+    assert res.status_code == 200
+
+    class FrontierPointSchema(Schema):
+        issn_l = fields.Str(allow_none=True)
+        num_journals_subscribed = fields.Integer()
+        cost = fields.Number()
+        cost_percent = fields.Number()
+        use_instant_percent = fields.Number()
+
+    class ScenarioFrontierSchema(Schema):
+        frontier = fields.List(fields.Nested(FrontierPointSchema))
+        cost_bigdeal_projected = fields.Number()
+        num_journals_total = fields.Integer()
+        _timing = fields.List(fields.Str)
+        _settings = fields.Dict()
+
+    out = ScenarioFrontierSchema().load(data)
+    assert out["frontier"][0]["issn_l"] is None
+    assert out["frontier"][-1]["num_journals_subscribed"] == out["num_journals_total"]
+    use_instant_percents = [point["use_instant_percent"] for point in out["frontier"]]
+    assert use_instant_percents == sorted(use_instant_percents)
+
+
+def test_scenario_optimize(fetch_jwt):
+    headers = {"Authorization": "Bearer " + fetch_jwt(os.environ["UNSUB_USER1_PWD"], os.environ["UNSUB_USER1_EMAIL"])}
+    res = requests.get(url_base + f"/scenario/{scenario_id}/optimize?spend=50", headers=headers)
+    data = res.json()
+    assert res.status_code == 200
+
+    class ScenarioOptimizeSchema(Schema):
+        spend = fields.Number()
+        cost_bigdeal_projected = fields.Number()
+        subrs = fields.List(fields.Str())
+        num_journals_subscribed = fields.Integer()
+        cost = fields.Number()
+        cost_percent = fields.Number()
+        use_instant_percent = fields.Number()
+        use_instant_percent_upper_bound = fields.Number()
+        optimality_gap = fields.Number()
+        is_optimal = fields.Boolean()
+        is_feasible = fields.Boolean()
+        method = fields.Str()
+        _timing = fields.List(fields.Str)
+        _settings = fields.Dict()
+
+    out = ScenarioOptimizeSchema().load(data)
+    assert len(out["subrs"]) == out["num_journals_subscribed"]
+    assert out["use_instant_percent"] <= out["use_instant_percent_upper_bound"]
+    if out["is_feasible"]:
+        assert out["cost_percent"] <= 50
+
+    res = requests.get(url_base + f"/scenario/{scenario_id}/optimize?spend=lots", headers=headers)
+    assert res.status_code == 400
+
+
 # FIXME: this route depends on current state, so need to do account for that somehow
 #   If run without doing so, it ends up inserting a `null` into scenario_json field
 #   in jump_scenario_details_paid table
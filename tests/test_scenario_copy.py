@@ -0,0 +1,62 @@
+import gc
+from time import time
+
+from journal import Journal
+from scenario import Scenario
+from scenario_engine import ScenarioEngine
+from subscription_state import SubscriptionState
+from tests.test_scenario_engine import Settings, now, scenario_data
+
+
+def make_scenario():
+    # a Scenario put together by hand, the way Scenario.__init__ does it after reading the db
+    issn_ls = ["0000-0001", "0000-0002"]
+    scenario = Scenario.__new__(Scenario)
+    scenario.timing_messages = []
+    scenario.section_time = time()
+    scenario.package_id = "package-test"
+    scenario.settings = Settings()
+    scenario.data = scenario_data()
+    scenario.engine = ScenarioEngine(issn_ls, scenario.data, scenario.settings, "package-test", now=now)
+    scenario.subscription_state = SubscriptionState(scenario.engine)
+    scenario.journals = [Journal(issn_l) for issn_l in issn_ls]
+    for index, journal in enumerate(scenario.journals):
+        journal.set_scenario(scenario)
+        journal.set_scenario_data(scenario.data)
+        journal.set_engine(scenario.engine, index, scenario.subscription_state)
+    return scenario
+
+
+def test_copy_outlives_the_original():
+    original = make_scenario()
+    original.journals_sorted_cpu
+    my_copy = original.copy_for_request()
+    original_journals = original.journals
+    del original
+    gc.collect()
+
+    # journals only hold a weak reference to their scenario, so these would raise ReferenceError
+    # if they still pointed at the original
+    assert all(journal.settings is my_copy.settings for journal in my_copy.journals)
+    assert [journal.cpu_fuzzed for journal in my_copy.journals]
+    assert all(journal not in original_journals for journal in my_copy.journals_sorted_cpu)
+
+
+def test_copies_keep_their_own_state():
+    original = make_scenario()
+    original.log_timing("build")
+    first = original.copy_for_request()
+    second = original.copy_for_request()
+
+    first.log_timing("to dict")
+    first.data["concepts"] = {"0000-0001": {"best": "Biology"}}
+    assert len(first.timing_messages) == 2
+    assert len(second.timing_messages) == 1
+    assert "concepts" not in second.data
+    assert "concepts" not in original.data
+
+    # sorting makes a new list, so the order of journals stays engine order
+    issn_ls = [journal.issn_l for journal in first.journals]
+    first.journals_sorted_use_total
+    first.journals_sorted_cpu
+    assert [journal.issn_l for journal in first.journals] == issn_ls
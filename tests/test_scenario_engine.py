@@ -0,0 +1,172 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from scenario_engine import ScenarioEngine
+from scenario_engine import default_download_by_age
+from scenario_engine import get_download_curves
+from scenario_engine import get_scenario_engine_base
+
+
+class Settings(object):
+    include_submitted_version = True
+    include_bronze = True
+    include_social_networks = True
+    cost_content_fee_percent = 5.7
+    cost_alacart_increase = 8
+    cost_ill = 17
+    ill_request_percent_of_delayed = 5
+    weight_citation = 10
+    weight_authorship = 100
+
+
+now = datetime.datetime(2022, 6, 1)
+
+
+def scenario_data():
+    oa_rows = [{"year_int": 2020, "fresh_oa_status": "green", "count": 10},
+               {"year_int": 2021, "fresh_oa_status": "bronze", "count": 20}]
+    return {
+        "unpaywall_downloads_dict": {
+            "0000-0001": {"num_papers_2021": 100, "downloads_total": 1000.0,
+                          "downloads_0y": 400, "downloads_1y": 150, "downloads_2y": 100, "downloads_3y": 80, "downloads_4y": 60},
+            "0000-0002": None,
+        },
+        "num_papers": {"0000-0001": {"2016": 100, "2017": 0, "2018": 100, "2019": 100, "2020": 100}},
+        "oa": {key: {"0000-0001": oa_rows} for key in ["with_submitted_with_bronze", "with_submitted_no_bronze",
+                                                        "no_submitted_with_bronze", "no_submitted_no_bronze"]},
+        "embargo_dict": {},
+        "social_networks": {"0000-0001": 0.1},
+        "prices": {"0000-0001": 1000, "0000-0002": 500},
+        "perpetual_access": {"0000-0001": {"start_date": datetime.datetime(2010, 1, 1), "end_date": datetime.datetime(2020, 6, 1)}},
+        "package-test": {
+            "counter_dict": {"0000-0001": 2000, "0000-0002": 50},
+            "citation_dict": {"0000-0001": {2017: 5, 2018: 5, 2019: 5, 2020: 5, 2021: 5}},
+            "authorship_dict": {"0000-0001": {"2021": 1}},
+        },
+    }
+
+
+@pytest.fixture
+def engine():
+    return ScenarioEngine(["0000-0001", "0000-0002"], scenario_data(), Settings(), "package-test", now=now)
+
+
+def test_inputs(engine):
+    assert engine.downloads_counter_multiplier.tolist() == [2.0, 50.0]
+    assert engine.num_citations.tolist() == [5.0, 0.0]
+    assert engine.num_authorships.tolist() == [0.2, 0.0]
+    assert engine.raw_num_papers_historical_by_year[0].tolist() == [100, 0, 100, 100, 100]
+    assert engine.num_green_historical_by_year[0].tolist() == [0, 0, 0, 10, 0]
+    assert engine.num_bronze_historical_by_year[0].tolist() == [0, 0, 0, 0, 20]
+    assert engine.perpetual_access_years[0] == list(range(2012, 2021))
+    assert engine.perpetual_access_years[1] == []
+
+
+def test_default_download_curve(engine):
+    # a year with no papers means the curve fit isn't trusted
+    assert engine.use_default_download_curve.tolist() == [True, True]
+    assert engine.curve_fit_for_downloads(0) == {}
+    expected = np.array(default_download_by_age) * 790 * 2.0
+    assert np.allclose(engine.downloads_by_age[0], expected)
+    assert engine.downloads_by_age[1].tolist() == [0, 0, 0, 0, 0]
+
+
+def test_usage_adds_up(engine):
+    use_total = engine.use_total
+    growth = round(100 / 101.0, 4)
+    assert use_total[0] == pytest.approx(engine.downloads_total[0] + (10 * 5.0 + 100 * 0.2) * growth, abs=0.001)
+    assert np.allclose(engine.use_free_instant + engine.use_paywalled, use_total, atol=0.001)
+    assert np.allclose(engine.use_ill + engine.use_other_delayed, engine.use_paywalled)
+    assert np.all(engine.use_backfile >= 0)
+    assert engine.downloads_backfile_by_year[1].tolist() == [0, 0, 0, 0, 0]
+
+
+def test_costs(engine):
+    assert engine.subscription_cost_by_year[0].tolist() == [1057, 1142, 1233, 1332, 1438]
+    assert engine.ill_cost_by_year[0].tolist() == pytest.approx((engine.downloads_ill_by_year[0] * 17).tolist(), abs=0.0001)
+    assert engine.cpu[0] == pytest.approx(engine.cost_subscription_minus_ill[0] / engine.use_paywalled[0], abs=0.000001)
+    assert np.isnan(engine.cpu[1])
+
+
+def test_obs_pub_matrices(engine):
+    assert engine.downloads_obs_pub.shape == (2, 5, 15)
+    assert engine.pub_years[0] == 2012
+    assert engine.perpetual_access_pub_mask[0].tolist() == [True] * 9 + [False] * 6
+    assert engine.perpetual_access_half_pub_mask[0].tolist() == [False] * 9 + [True] + [False] * 5
+    not_oa = engine.downloads_obs_pub[0] - engine.oa_obs_pub[0]
+    assert engine.backfile_obs_pub[0, :, :9].tolist() == np.maximum(not_oa[:, :9], 0).tolist()
+    assert engine.backfile_obs_pub[0, :, 9].tolist() == np.rint(np.maximum(0.5 * not_oa[:, 9], 0)).tolist()
+    assert not engine.backfile_obs_pub[0, :, 10:].any()
+    assert engine.downloads_oa_by_year.tolist() == engine.oa_obs_pub.sum(axis=2).tolist()
+
+
+def test_precomputed_download_curves():
+    data = scenario_data()
+    data["num_papers"]["0000-0001"]["2017"] = 100
+    fitted_here = ScenarioEngine(["0000-0001", "0000-0002"], data, Settings(), "package-test", now=now)
+    assert not fitted_here.use_default_download_curve[0]
+
+    data["download_curves"] = get_download_curves(data["unpaywall_downloads_dict"], data["num_papers"], now=now)
+    assert list(data["download_curves"]["curves"].keys()) == ["0000-0001"]
+    from_common_data = ScenarioEngine(["0000-0001", "0000-0002"], data, Settings(), "package-test", now=now)
+    assert from_common_data.downloads_by_age.tolist() == fitted_here.downloads_by_age.tolist()
+    assert from_common_data.curve_fit_for_downloads(0) == fitted_here.curve_fit_for_downloads(0)
+
+    # scaled by this package's counter multiplier
+    data["download_curves"]["curves"]["0000-0001"]["y_fit"] = [5, 4, 3, 2, 1]
+    from_common_data = ScenarioEngine(["0000-0001", "0000-0002"], data, Settings(), "package-test", now=now)
+    assert from_common_data.downloads_by_age[0].tolist() == [10, 8, 6, 4, 2]
+
+    # curves fit in an earlier year get refit
+    next_year = ScenarioEngine(["0000-0001", "0000-0002"], data, Settings(), "package-test", now=datetime.datetime(2023, 6, 1))
+    assert next_year.downloads_by_age[0].tolist() != [10, 8, 6, 4, 2]
+
+
+class OtherSettings(Settings):
+    include_bronze = False
+    include_social_networks = False
+    cost_alacart_increase = 3
+    cost_ill = 25
+    weight_citation = 0
+
+
+def test_engines_share_a_base():
+    data = scenario_data()
+    base = get_scenario_engine_base(["0000-0001", "0000-0002"], data, "package-test", now=now)
+    for settings in [Settings(), OtherSettings()]:
+        shared = ScenarioEngine(["0000-0001", "0000-0002"], data, settings, "package-test", base=base)
+        fresh = ScenarioEngine(["0000-0001", "0000-0002"], scenario_data(), settings, "package-test", now=now)
+        for name in ["num_bronze_historical_by_year", "downloads_social_networks_by_year", "use_total_by_year",
+                     "use_paywalled", "subscription_cost_by_year", "ill_cost", "cpu"]:
+            assert np.allclose(getattr(shared, name), getattr(fresh, name), equal_nan=True)
+        assert shared.downloads_by_age is base.downloads_by_age
+
+
+def test_engine_base_cache():
+    data = scenario_data()
+    data["package_data_versions"] = {"package-test": 1}
+    base = get_scenario_engine_base(["0000-0001", "0000-0002"], data, "package-test", now=now)
+    assert get_scenario_engine_base(["0000-0001", "0000-0002"], data, "package-test", now=now) is base
+    assert get_scenario_engine_base(["0000-0001"], data, "package-test", now=now) is not base
+
+    # the package's data is keyed by its version, not read for the key
+    data["package-test"] = scenario_data()["package-test"]
+    assert get_scenario_engine_base(["0000-0001", "0000-0002"], data, "package-test", now=now) is base
+
+    # an upload bumps the version
+    data["package-test"]["counter_dict"]["0000-0001"] = 3000
+    data["package_data_versions"] = {"package-test": 2}
+    changed = get_scenario_engine_base(["0000-0001", "0000-0002"], data, "package-test", now=now)
+    assert changed is not base
+    assert changed.downloads_counter_multiplier[0] == 3.0
+
+    # so does new perpetual access, which comes from the cache as a new object
+    data["perpetual_access"] = dict(data["perpetual_access"])
+    assert get_scenario_engine_base(["0000-0001", "0000-0002"], data, "package-test", now=now) is not changed
+    changed = get_scenario_engine_base(["0000-0001", "0000-0002"], data, "package-test", now=now)
+
+    # reloaded common data is new objects, so a new base
+    data["oa"] = dict(data["oa"])
+    assert get_scenario_engine_base(["0000-0001", "0000-0002"], data, "package-test", now=now) is not changed
@@ -0,0 +1,106 @@
+import multiprocessing
+
+import pytest
+
+from shared_cache import RedisSharedCache
+from shared_cache import SqliteSharedCache
+from shared_cache import TieredStore
+from shared_cache import shared_cache_from_url
+
+
+class DictRedis(object):
+    # just what RedisSharedCache uses of a redis-py client
+    def __init__(self):
+        self.values = {}
+        self.expiries = {}
+
+    def get(self, key):
+        return self.values.get(key, None)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.expiries[key] = ex
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def shared_cache(request, tmp_path):
+    if request.param == "sqlite":
+        return SqliteSharedCache(str(tmp_path / "shared.sqlite"))
+    return RedisSharedCache(DictRedis(), ttl=60)
+
+
+def test_round_trip(shared_cache):
+    value = {"counter_dict": {"0000-0000": 12.0}, "rows": [(1, "a"), (2, "b")]}
+    assert shared_cache.get("key") is None
+    shared_cache.set("key", value)
+    assert shared_cache.get("key") == value
+    shared_cache.delete("key")
+    assert shared_cache.get("key", "missing") == "missing"
+    stats = shared_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["sets"], stats["errors"]) == (1, 2, 1, 0)
+
+
+def test_unpicklable_values_are_not_stored(shared_cache):
+    shared_cache.set("key", lambda: None)
+    assert shared_cache.get("key") is None
+    assert shared_cache.stats()["errors"] == 1
+
+
+def read_in_child(path, queue):
+    queue.put(SqliteSharedCache(path).get("key"))
+
+
+def test_sqlite_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "shared.sqlite")
+    SqliteSharedCache(path).set("key", [1, 2, 3])
+    queue = multiprocessing.get_context("fork").Queue()
+    child = multiprocessing.get_context("fork").Process(target=read_in_child, args=(path, queue))
+    child.start()
+    child.join()
+    assert queue.get(timeout=5) == [1, 2, 3]
+
+
+def test_sqlite_ttl_and_prune(tmp_path, monkeypatch):
+    import shared_cache
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache, "time", lambda: now[0])
+    cache = SqliteSharedCache(str(tmp_path / "shared.sqlite"), ttl=60, max_bytes=2000, prune_every=10)
+    cache.set("old", "x")
+    now[0] += 61
+    assert cache.get("old") is None
+
+    for i in range(20):
+        now[0] += 1
+        cache.set(str(i), bytes(bytearray(range(256))) * 2)
+    (num_entries,) = cache.connection().execute("select count(*) from cache").fetchone()
+    assert num_entries < 20
+    cache.prune()
+    (num_bytes,) = cache.connection().execute("select sum(length(value)) from cache").fetchone()
+    assert num_bytes <= 2000
+    # the newest stay
+    assert cache.get("19") is not None
+
+
+def test_tiered_store(tmp_path):
+    shared = SqliteSharedCache(str(tmp_path / "shared.sqlite"))
+    first = TieredStore(shared)
+    second = TieredStore(shared)
+    first["key"] = {"a": 1}
+    # another worker finds it in the shared tier
+    assert second["key"] == {"a": 1}
+    assert "key" in second.local
+    second.pop("key")
+    with pytest.raises(KeyError):
+        TieredStore(shared)["key"]
+
+
+def test_shared_cache_from_url(tmp_path):
+    assert shared_cache_from_url("none") is None
+    assert shared_cache_from_url("") is None
+    cache = shared_cache_from_url("sqlite:///" + str(tmp_path / "shared.sqlite"), ttl=10)
+    assert cache.path == str(tmp_path / "shared.sqlite")
+    with pytest.raises(ValueError):
+        shared_cache_from_url("memcached://localhost")
@@ -0,0 +1,76 @@
+import threading
+from time import sleep
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def run_concurrently(single_flight, key, func, num_callers):
+    results = [None] * num_callers
+    errors = [None] * num_callers
+
+    def call(i):
+        try:
+            results[i] = single_flight.do(key, func)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(num_callers)]
+    for thread in threads:
+        thread.start()
+    return (threads, results, errors)
+
+
+def test_concurrent_calls_share_one_execution():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def build():
+        executions.append(1)
+        release.wait(5)
+        return object()
+
+    (threads, results, errors) = run_concurrently(single_flight, ("scenario-a", 3), build, 5)
+    # let the waiters pile up behind the first caller
+    while single_flight.stats()["coalesced"] < 4:
+        sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(executions) == 1
+    assert all(result is results[0] for result in results)
+    stats = single_flight.stats()
+    assert (stats["calls"], stats["executions"], stats["coalesced"], stats["in_flight"]) == (5, 1, 4, 0)
+
+    # done calls aren't kept
+    assert single_flight.do(("scenario-a", 3), lambda: "again") == "again"
+
+
+def test_waiters_get_the_error():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def build():
+        release.wait(5)
+        raise ValueError("no such scenario")
+
+    (threads, results, errors) = run_concurrently(single_flight, "scenario-b", build, 3)
+    while single_flight.stats()["coalesced"] < 2:
+        sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert single_flight.stats()["errors"] == 1
+
+
+def test_different_keys_run_separately():
+    single_flight = SingleFlight()
+    assert single_flight.do("a", lambda: 1) == 1
+    assert single_flight.do("b", lambda: 2) == 2
+    assert single_flight.stats()["coalesced"] == 0
+    with pytest.raises(KeyError):
+        single_flight.do("c", lambda: {}["missing"])
@@ -0,0 +1,60 @@
+import itertools
+from time import time
+
+import numpy as np
+import pytest
+
+from subscription_optimizer import optimize_subscriptions
+
+
+def brute_force(weights, values, capacity):
+    best = None
+    for mask in itertools.product([False, True], repeat=len(weights)):
+        mask = np.array(mask)
+        if np.sum(weights[mask]) <= capacity + 1e-9:
+            if best is None or np.sum(values[mask]) > best:
+                best = np.sum(values[mask])
+    return best
+
+
+@pytest.mark.parametrize("max_dp_cells", [10 * 1000 * 1000, 0])
+def test_matches_brute_force(max_dp_cells):
+    rnd = np.random.RandomState(0)
+    for trial in range(50):
+        n = rnd.randint(1, 11)
+        weights = rnd.normal(800, 900, n).round(2)
+        values = rnd.uniform(0, 500, n)
+        budget = 5000 + rnd.uniform(-500, np.sum(np.abs(weights)))
+
+        result = optimize_subscriptions(weights, values, budget, base_cost=5000.0, base_use_instant=10.0, max_dp_cells=max_dp_cells)
+        best = brute_force(weights, values, budget - 5000)
+        if best is None:
+            assert not result["is_feasible"]
+            continue
+        assert result["cost"] <= budget + 1e-6
+        assert result["use_instant"] == pytest.approx(10.0 + best)
+        assert result["upper_bound"] >= result["use_instant"] - 1e-6
+        assert result["is_optimal"]
+        assert result["optimality_gap"] == 0
+
+
+def test_cheaper_than_ill_always_subscribed():
+    result = optimize_subscriptions([-10.0, 50.0, 60.0], [1.0, 100.0, 200.0], budget=1000.0 - 10 + 60, base_cost=1000.0)
+    assert result["subscribed"].tolist() == [True, False, True]
+    assert result["cost"] == 1050.0
+
+    result = optimize_subscriptions([-10.0, 50.0], [1.0, 100.0], budget=900.0, base_cost=1000.0)
+    assert not result["is_feasible"]
+    assert result["subscribed"].tolist() == [True, False]
+
+
+def test_large_package_within_time_limit():
+    rnd = np.random.RandomState(1)
+    weights = rnd.uniform(100, 5000, 4000).round(2)
+    values = weights + 100  # strongly correlated, the hard case
+    start = time()
+    result = optimize_subscriptions(weights, values, 0.5 * np.sum(weights), time_limit=1.0)
+    assert time() - start < 2
+    assert result["cost"] <= 0.5 * np.sum(weights)
+    assert 0 <= result["optimality_gap"] < 0.001
+    assert result["upper_bound"] >= result["use_instant"]
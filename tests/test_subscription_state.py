@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from scenario_engine import ScenarioEngine
+from subscription_state import SubscriptionState
+from tests.test_scenario_engine import Settings
+from tests.test_scenario_engine import now
+from tests.test_scenario_engine import scenario_data
+
+
+@pytest.fixture
+def engine():
+    return ScenarioEngine(["0000-0001", "0000-0002"], scenario_data(), Settings(), "package-test", now=now)
+
+
+def masked_sum(engine, name, mask):
+    return np.sum(getattr(engine, name)[mask], axis=0)
+
+
+def test_starts_unsubscribed(engine):
+    state = SubscriptionState(engine)
+    assert state.num_subscribed == 0
+    assert state.total("subscription_cost") == 0
+    assert state.total("ill_cost") == pytest.approx(np.sum(engine.ill_cost))
+    assert state.actual_by_year("subscription") == [0, 0, 0, 0, 0]
+    assert state.actual_by_year("ill") == pytest.approx(list(np.sum(engine.use_ill_by_year, axis=0)))
+
+
+def test_toggles_match_a_rescan(engine):
+    state = SubscriptionState(engine)
+    state.set_subscribed([0], bulk=True)
+    state.set_subscribed([0, 1], custom=True)
+    state.set_subscribed([0], custom=False)
+    state.set_subscribed([1], bulk=False)
+
+    subscribed = np.array([True, True])
+    assert state.subscribed.tolist() == subscribed.tolist()
+    assert state.num_subscribed == 2
+    for name in SubscriptionState.if_subscribed:
+        assert state.total(name) == pytest.approx(masked_sum(engine, name, subscribed))
+    for name in SubscriptionState.if_not_subscribed:
+        assert state.total(name) == pytest.approx(masked_sum(engine, name, ~subscribed), abs=1e-9)
+
+    state.set_subscribed([0, 1], bulk=False, custom=False)
+    assert state.num_subscribed == 0
+    assert state.total("subscription_cost") == pytest.approx(0, abs=1e-9)
+    assert state.total("use_other_delayed") == pytest.approx(np.sum(engine.use_other_delayed))
+
+
+def test_unconditional_groups(engine):
+    state = SubscriptionState(engine)
+    before = state.actual_by_year("backfile", prefix="downloads")
+    state.set_subscribed([0, 1], bulk=True)
+    assert state.actual_by_year("backfile", prefix="downloads") == before == list(np.sum(engine.downloads_backfile_by_year, axis=0))
@@ -19,6 +19,7 @@ from psycopg2.extras import execute_values
 
 import os
 import sys
+import hashlib
 import simplejson as json
 from collections import defaultdict
 from time import sleep
@@ -55,10 +56,16 @@ from saved_scenario import save_raw_scenario_to_db
 from saved_scenario import save_raw_member_institutions_included_to_db
 from saved_scenario import save_feedback_on_member_institutions_included_to_db
 from saved_scenario import get_latest_scenario_raw
+from saved_scenario import get_latest_scenario_updated
+from saved_scenario import scenario_builds
 from scenario import get_common_package_data
 from scenario import get_clean_package_id
+from scenario import get_package_data_versions_for
+from package_data_version import bump_package_data_version
+from package_data_version import versions_cache_key
 from consortium import get_consortium_ids
 from consortium import Consortium
+from consortium import consortium_data_loads
 from user import User, default_password
 
 from util import jsonify_fast
@@ -75,6 +82,8 @@ from app import logger
 
 from app import DEMO_PACKAGE_ID
 from app import s3_client
+from app import common_data
+from app import invalidation_bus
 
 
 def s3_cache_get(url):
@@ -189,6 +198,7 @@ def error_timeout(e):
 def base_endpoint():
     return jsonify_fast({
         "version": "0.0.1",
+        "common_data_version": common_data.version,
         "msg": "Don't panic"
     })
 
@@ -752,7 +762,7 @@ def authorize_institution(auth_institution, required_permission):
     return auth_user.has_permission(auth_institution.id, required_permission)
 
 
-def get_saved_scenario(scenario_id, test_mode=False, required_permission=None):
+def get_saved_scenario(scenario_id, test_mode=False, required_permission=None, set_live=True):
     my_saved_scenario = SavedScenario.query.get(scenario_id)
 
     if not my_saved_scenario:
@@ -769,11 +779,43 @@ def get_saved_scenario(scenario_id, test_mode=False, required_permission=None):
                 )
             )
 
-    my_saved_scenario.set_live_scenario(None)
+    if set_live:
+        my_saved_scenario.set_live_scenario(None)
 
     return my_saved_scenario
 
 
+def scenario_etag(my_saved_scenario):
+    """
+    A weak ETag for this request on a scenario, from what the response is computed from: the saved
+    scenario, the data versions of its packages and the common data version, and who's asking.
+    None when that's not all of it (feedback scenarios) or the common data isn't in yet.
+    """
+    if my_saved_scenario.is_feedback_scenario or common_data.version is None:
+        return None
+    etag_parts = [
+        my_saved_scenario.scenario_id,
+        get_latest_scenario_updated(my_saved_scenario.scenario_id),
+        versions_cache_key(get_package_data_versions_for(my_saved_scenario.package_id)),
+        common_data.version,
+        request.full_path,
+        get_jwt_identity(),
+    ]
+    return hashlib.sha1(json.dumps(etag_parts, default=str, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def etag_response(etag, build_response):
+    # 304 if the client has this etag already, else the response build_response() makes, tagged
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        response = build_response()
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @app.route("/account", methods=["GET"])
 @jwt_required()
 def live_account_get():
@@ -870,6 +912,7 @@ def update_publisher(publisher_id):
 
     db.session.merge(publisher)
     safe_commit(db)
+    bump_package_data_version(publisher_id)
 
     package_dict = publisher.to_package_dict()
     return jsonify_fast_no_sort(package_dict)
@@ -1282,11 +1325,27 @@ def member_institutions_consortial_scenarios_scenario_id_post(scenario_id):
 @app.route("/scenario/<scenario_id>/summary", methods=["GET"])
 @jwt_required()
 def scenario_id_summary_get(scenario_id):
-    my_timing = TimingMessages()
-    my_saved_scenario = get_saved_scenario(scenario_id)
-    my_timing.log_timing("after setting live scenario")
-    my_timing.log_timing("after to_dict()")
-    return jsonify_fast_no_sort(my_saved_scenario.live_scenario.to_dict_summary())
+    my_saved_scenario = get_saved_scenario(scenario_id, set_live=False)
+    return etag_response(scenario_etag(my_saved_scenario),
+                         lambda: jsonify_fast_no_sort(my_saved_scenario.set_live_scenario(None).to_dict_summary()))
+
+@app.route("/scenario/<scenario_id>/frontier", methods=["GET"])
+@jwt_required()
+def scenario_id_frontier_get(scenario_id):
+    my_saved_scenario = get_saved_scenario(scenario_id, required_permission=Permission.view(), set_live=False)
+    return etag_response(scenario_etag(my_saved_scenario),
+                         lambda: jsonify_fast_no_sort(my_saved_scenario.set_live_scenario(None).to_dict_frontier()))
+
+@app.route("/scenario/<scenario_id>/optimize", methods=["GET"])
+@jwt_required()
+def scenario_id_optimize_get(scenario_id):
+    try:
+        spend = float(request.args.get("spend"))
+    except (TypeError, ValueError):
+        return abort_json(400, "spend must be a number, the percent of the projected big deal cost to spend")
+    my_saved_scenario = get_saved_scenario(scenario_id, required_permission=Permission.view(), set_live=False)
+    return etag_response(scenario_etag(my_saved_scenario),
+                         lambda: jsonify_fast_no_sort(my_saved_scenario.set_live_scenario(None).to_dict_optimized(spend)))
 
 @app.route("/scenario/<scenario_id>/journals", methods=["GET"])
 @jwt_required()
@@ -1296,8 +1355,9 @@ def scenario_id_journals_get(scenario_id):
         my_consortium = Consortium(scenario_id)
         my_saved_scenario_dict = my_consortium.to_dict_journals()
     else:
-        my_saved_scenario = get_saved_scenario(scenario_id, required_permission=Permission.view())
-        my_saved_scenario_dict = my_saved_scenario.to_dict_journals()
+        my_saved_scenario = get_saved_scenario(scenario_id, required_permission=Permission.view(), set_live=False)
+        return etag_response(scenario_etag(my_saved_scenario),
+                             lambda: jsonify_fast_no_sort(my_saved_scenario.to_dict_journals()))
 
     response = jsonify_fast_no_sort(my_saved_scenario_dict)
     return response
@@ -1745,6 +1805,23 @@ def admin_accounts_get():
     return Response(contents, mimetype="text/text")
 
 
+@app.route("/admin/cache", methods=["GET"])
+def admin_cache_get():
+    key = request.args.get("key", "This is not the key you are looking for")
+    if key != os.getenv("OURRESEARCH_ADMIN_VIEW_KEY"):
+        return abort_json(401, "Must provide admin view key")
+
+    # just this worker's cache: each gunicorn worker has its own
+    response = app.my_memorycache_dict.stats()
+    response["pid"] = os.getpid()
+    response["common_data_version"] = common_data.version
+    response["invalidation"] = invalidation_bus.stats()
+    response["shared_cache"] = app.shared_cache.stats() if app.shared_cache is not None else None
+    response["scenario_builds"] = scenario_builds.stats()
+    response["consortium_data_loads"] = consortium_data_loads.stats()
+    return jsonify_fast_no_sort(response)
+
+
 @app.route("/publisher/<package_id>/sign-s3")
 @jwt_required()
 def sign_s3(package_id):